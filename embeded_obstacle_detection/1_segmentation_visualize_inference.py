@@ -2,44 +2,32 @@ import cv2
 import numpy as np
 import os
 import time
-from glob import glob
-import onnxruntime as ort
+from backends import make_backend
+from frame_source import FrameSource
 
 # --- CONFIGURATION ---
 # Point this to your exported ONNX file
 MODEL_PATH = 'massyl/seg_models/stdc813m_maxmiou_4.onnx' 
 MODEL_NAME = os.path.basename(MODEL_PATH)
+BACKEND = "ort"  # "ort" | "opencv" | "simulated" (backends.py)
 
 VIDEO_SOURCE = 'massyl/data/final_demo_2/*.jpg'
 # VIDEO_SOURCE = 'my_drive_video.mp4'
 
 # Must match the resolution used during ONNX export
 INPUT_SIZE = (1024, 512) 
+READ_AHEAD = 4  # Frames decoded ahead on a background thread (JPEGs at reduced size when INPUT_SIZE allows)
 
 class InferenceDemo:
     def __init__(self):
-        # 1. Load ONNX Model
+        # 1. Load ONNX Model (CUDA first when available, else CPU)
         print(f"Loading ONNX model from {MODEL_PATH}...")
-        
-        # Check available providers (Prioritize CUDA if available, else CPU)
-        available_providers = ort.get_available_providers()
-        providers = []
-        if 'CUDAExecutionProvider' in available_providers:
-            providers.append('CUDAExecutionProvider')
-        providers.append('CPUExecutionProvider')
-        
-        print(f"Inference Device: {providers[0]}")
-        
-        # Create Inference Session
         try:
-            self.session = ort.InferenceSession(MODEL_PATH, providers=providers)
+            self.backend = make_backend(BACKEND, MODEL_PATH, "seg")
         except Exception as e:
             print(f"Error loading model: {e}")
             raise
-
-        # Get Input/Output Metadata
-        self.input_name = self.session.get_inputs()[0].name
-        self.output_names = [o.name for o in self.session.get_outputs()]
+        print(f"Inference backend: {self.backend.describe()}")
 
         # 3. Class info
         self.class_names = ["Background", "Road"]
@@ -105,44 +93,29 @@ class InferenceDemo:
             y += line_height
 
     def run(self):
-        # File Loading Logic
-        if '*' in VIDEO_SOURCE:
-            files = sorted(glob(VIDEO_SOURCE))
-            print(f"Found {len(files)} images. Press 'q' to quit.")
-            is_video = False
-            if len(files) == 0:
+        # Frame Loading Logic (decoded on a background thread)
+        source = FrameSource(VIDEO_SOURCE, INPUT_SIZE, READ_AHEAD)
+        is_video = source.kind != "images"
+        if is_video:
+            print("Starting video. Press 'q' to quit.")
+        else:
+            print(f"Found {len(source)} images. Press 'q' to quit.")
+            if len(source) == 0:
                 print("No images found! Check VIDEO_SOURCE path.")
                 return
-        else:
-            cap = cv2.VideoCapture(VIDEO_SOURCE)
-            is_video = True
-            print("Starting video. Press 'q' to quit.")
 
-        idx = 0
-        while True:
+        for packet in source:
             start_time = time.time()
-
-            if is_video:
-                ret, frame = cap.read()
-                if not ret: break
-            else:
-                if idx >= len(files): break
-                frame = cv2.imread(files[idx])
-                idx += 1
-
-            if frame is None:
-                continue
+            frame = packet["frame"]
+            idx = packet["idx"] + 1
 
             # --- PREPROCESSING ---
             input_tensor, frame_resized = self.preprocess(frame)
 
             # --- INFERENCE (ONNX) ---
-            # Run session (Input dictionary -> Output list)
-            outputs = self.session.run(None, {self.input_name: input_tensor})
-            
-            # STDC/BiSeNet typically returns [output_map, aux_map_1, aux_map_2...]
-            # We take the first one [0]
-            raw_output = outputs[0] 
+            # STDC/BiSeNet typically returns [output_map, aux_map_1, aux_map_2...],
+            # the backend only returns the first one
+            raw_output = self.backend.run(input_tensor)[0]
             
             # Post-processing: Argmax on Channel dimension (axis 1)
             # Input was [1, 2, H, W] -> Output [1, H, W]
@@ -150,7 +123,7 @@ class InferenceDemo:
 
             # --- DEBUG INFO ---
             unique_classes = np.unique(prediction)
-            print(f"Frame {idx}: Classes found = {unique_classes}")
+            print(f"Frame {idx}: Classes found = {unique_classes} (decode {packet['decode_ms']:.1f} ms, off the loop)")
             
             total_pixels = prediction.size
             for c in unique_classes:
@@ -182,8 +155,8 @@ class InferenceDemo:
             if key == ord('q'):
                 break
 
-        if is_video:
-            cap.release()
+        source.close()
+        print(f"Frames: {source.summary()}")
         cv2.destroyAllWindows()
 
 if __name__ == "__main__":
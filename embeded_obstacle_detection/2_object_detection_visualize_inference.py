@@ -1,8 +1,10 @@
 import cv2
 import numpy as np
-import onnxruntime as ort
 import os
 import time
+from backends import make_backend
+from yolo_postprocess import postprocess_yolo
+from preprocess_engine import letterbox_params
 
 # --- CONFIGURATION ---
 MODEL_PATH = "massyl/od_models/yolov8s_best_2.onnx"
@@ -10,56 +12,43 @@ IMAGE_DIR = "massyl/data/lost_and_found_left_od_optimized/valid/images"
 CONF_THRESHOLD = 0.5
 IOU_THRESHOLD = 0.45
 IMG_SIZE = 640
+BACKEND = "ort"  # "ort" | "opencv" | "simulated" (backends.py)
 
 class YOLODetector:
     def __init__(self, model_path):
         print(f"Loading ONNX model from {model_path}...")
         
-        # Initialize ONNX Runtime
-        self.session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        self.backend = make_backend(BACKEND, model_path, "od", providers=['CPUExecutionProvider'])
+        print(f"Inference backend: {self.backend.describe()}")
         
         # Get model info
-        self.input_name = self.session.get_inputs()[0].name
-        self.output_name = self.session.get_outputs()[0].name
-        self.input_shape = self.session.get_inputs()[0].shape  # [1, 3, 640, 640]
-        self.img_size = self.input_shape[2] # Assuming square 640x640
+        self.input_shape = self.backend.get_inputs()[0].shape  # [1, 3, 640, 640] or [1, 3, 320, 640]
+        self.input_hw = (self.input_shape[2], self.input_shape[3])  # Square or rectangular export
 
         # Generate random colors for bounding boxes
         self.colors = np.random.uniform(0, 255, size=(100, 3))
 
     def preprocess(self, img):
         """
-        Resize image to 640x640 with "Letterboxing" (padding) to maintain aspect ratio.
+        Resize image to the model input (h, w) with "Letterboxing" (padding) to maintain aspect ratio.
         This matches exactly what Ultralytics YOLO does internally.
         """
-        shape = img.shape[:2]  # current shape [height, width]
-        new_shape = (self.img_size, self.img_size)
+        # Scale ratio, (dw, dh) half padding, unpadded size and border sizes
+        ratio, (dw, dh), new_unpad, (top, bottom, left, right) = letterbox_params(img.shape, self.input_hw)
 
-        # Scale ratio (new / old)
-        r = min(new_shape[0] / shape[0], new_shape[1] / shape[1])
-        
-        # Compute padding
-        ratio = r, r  # width, height ratios
-        new_unpad = int(round(shape[1] * r)), int(round(shape[0] * r))
-        dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]  # wh padding
-        dw /= 2  # divide padding into 2 sides
-        dh /= 2
-
-        if shape[::-1] != new_unpad:  # resize
+        if img.shape[1::-1] != new_unpad:  # resize
             img_resized = cv2.resize(img, new_unpad, interpolation=cv2.INTER_LINEAR)
         else:
             img_resized = img
 
         # Add border (padding)
-        top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
-        left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
         img_padded = cv2.copyMakeBorder(img_resized, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
 
         # HWC to CHW, BGR to RGB, Normalize
-        img_input = img_padded.transpose((2, 0, 1))[::-1]  # BGR to RGB, to 3x640x640
+        img_input = img_padded.transpose((2, 0, 1))[::-1]  # BGR to RGB, to 3xHxW
         img_input = np.ascontiguousarray(img_input)
         img_input = img_input.astype(np.float32) / 255.0
-        img_input = img_input[None]  # Add batch dimension: 1x3x640x640
+        img_input = img_input[None]  # Add batch dimension: 1x3xHxW
 
         return img_input, (ratio, (dw, dh))
 
@@ -67,89 +56,15 @@ class YOLODetector:
         """
         Parse raw YOLO output: [1, 4+classes, 8400]
         Apply NMS and rescale boxes to original image.
+        Returns a structured array with "box", "score" and "class_id" fields.
         """
-        # 1. Remove Batch Dimension
-        # output[0] is a list containing the result tensor. 
-        # The tensor shape is (1, 5, 8400). We need (5, 8400).
-        prediction = output[0][0]
-        
-        # 2. Transpose to (8400, 5) so each row is a detection
-        predictions = np.transpose(prediction, (1, 0))
-        
-        boxes = []
-        scores = []
-        class_ids = []
-
-        # Separate coordinates and scores
-        # Grid format: xc, yc, w, h, class_score...
-        pred_boxes = predictions[:, :4]
-        pred_scores = predictions[:, 4:]
-        
-        # Get max score and class ID for each anchor
-        max_scores = np.max(pred_scores, axis=1)
-        max_ids = np.argmax(pred_scores, axis=1)
-
-        # Filter by confidence threshold
-        mask = max_scores >= CONF_THRESHOLD
-        filtered_boxes = pred_boxes[mask]
-        filtered_scores = max_scores[mask]
-        filtered_ids = max_ids[mask]
-
-        if len(filtered_boxes) == 0:
-            return [], [], []
-
-        # Convert Center-x, Center-y, W, H -> Top-left X, Top-left Y, W, H
-        # This is required for cv2.dnn.NMSBoxes
-        nms_boxes = []
-        for box in filtered_boxes:
-            cx, cy, w, h = box
-            x = cx - (w / 2)
-            y = cy - (h / 2)
-            nms_boxes.append([x, y, w, h])
-
-        # Apply Non-Maximum Suppression (NMS)
-        indices = cv2.dnn.NMSBoxes(nms_boxes, filtered_scores.tolist(), CONF_THRESHOLD, IOU_THRESHOLD)
-        
-        final_boxes = []
-        final_scores = []
-        final_ids = []
-
-        if len(indices) > 0:
-            for i in indices.flatten():
-                # Get the box in 640x640 coords
-                x, y, w, h = nms_boxes[i]
-                
-                # Rescale back to original image
-                pad_w, pad_h = dwdh
-                scale_w, scale_h = ratio
-                
-                x_orig = (x - pad_w) / scale_w
-                y_orig = (y - pad_h) / scale_h
-                w_orig = w / scale_w
-                h_orig = h / scale_h
-                
-                # Convert to integer [x1, y1, x2, y2]
-                x1 = int(x_orig)
-                y1 = int(y_orig)
-                x2 = int(x_orig + w_orig)
-                y2 = int(y_orig + h_orig)
-                
-                # Clip to image bounds
-                x1 = max(0, x1)
-                y1 = max(0, y1)
-                x2 = min(orig_shape[1], x2)
-                y2 = min(orig_shape[0], y2)
-
-                final_boxes.append([x1, y1, x2, y2])
-                final_scores.append(filtered_scores[i])
-                final_ids.append(filtered_ids[i])
-
-        return final_boxes, final_scores, final_ids
-
-    def draw_detections(self, img, boxes, scores, class_ids):
-        for box, score, class_id in zip(boxes, scores, class_ids):
-            color = self.colors[class_id % len(self.colors)]
-            x1, y1, x2, y2 = box
+        return postprocess_yolo(output, ratio, dwdh, orig_shape, CONF_THRESHOLD, IOU_THRESHOLD)
+
+    def draw_detections(self, img, detections):
+        for det in detections:
+            x1, y1, x2, y2 = det["box"].tolist()
+            score = det["score"]
+            color = self.colors[det["class_id"] % len(self.colors)]
             
             # Draw Box
             cv2.rectangle(img, (x1, y1), (x2, y2), color, 2)
@@ -191,14 +106,14 @@ def main():
 
         # --- 2. INFERENCE ---
         # Run the model
-        outputs = detector.session.run([detector.output_name], {detector.input_name: input_tensor})
+        outputs = detector.backend.run(input_tensor)
         
         # --- 3. POSTPROCESS ---
-        boxes, scores, class_ids = detector.postprocess(outputs, params[1], params[0], frame.shape)
+        detections = detector.postprocess(outputs, params[1], params[0], frame.shape)
         t1 = time.time()
 
         # --- 4. VISUALIZE ---
-        detector.draw_detections(frame, boxes, scores, class_ids)
+        detector.draw_detections(frame, detections)
 
         inf_ms = (t1 - t0) * 1000
 
@@ -238,4 +153,4 @@ def main():
     cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
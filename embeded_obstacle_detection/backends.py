@@ -0,0 +1,345 @@
+import numpy as np
+import threading
+import time
+from collections import namedtuple
+from session_config import DEFAULT_PROVIDERS, ONNX_DTYPES, BoundSession, create_cached_session
+
+# Input/output description, same fields as an onnxruntime NodeArg
+TensorInfo = namedtuple("TensorInfo", ["name", "shape", "type"])
+
+BACKENDS = ("ort", "opencv", "simulated")  # make_backend() kinds (PyTorch modules: TorchBackend directly)
+
+# Simulated accelerators. Host<->device transfers are modelled at the NPU's
+# quantized I/O width (uint8 tensors), not at the float32 size of the host input.
+DEVICE_PRESETS = {
+    # Hailo-8L M.2 (AI HAT) on a Raspberry Pi 5, PCIe Gen 3 x1. The compute times are
+    # placeholders in the range of a small STDC / YOLOv8s HEF: replace them with the
+    # `hailortcli run <model>.hef` figures of the compiled models.
+    "hailo8l_pi5": {
+        "compute_ms": {"seg": 22.0, "od": 12.0},  # Per frame, per network, at the reference input size
+        "reference_elements": {"seg": 3 * 512 * 1024, "od": 3 * 640 * 640},  # Compute scales with input elements
+        "call_overhead_ms": 0.3,   # Driver + VDevice scheduling, per call
+        "context_switch_ms": 3.0,  # Loading the other network's context (two HEFs on one device)
+        "h2d_mbps": 800.0,         # Host to device MB/s (Gen 3 x1, after protocol overhead)
+        "d2h_mbps": 800.0,         # Device to host MB/s
+        "io_bytes_per_element": 1,
+        "jitter_ms": 0.3,          # Std of a half-normal latency noise
+    },
+    # Same device without network switching cost, e.g. both models compiled into one HEF
+    "hailo8l_pi5_joined": {
+        "compute_ms": {"seg": 22.0, "od": 12.0},
+        "reference_elements": {"seg": 3 * 512 * 1024, "od": 3 * 640 * 640},
+        "call_overhead_ms": 0.3,
+        "context_switch_ms": 0.0,
+        "h2d_mbps": 800.0,
+        "d2h_mbps": 800.0,
+        "io_bytes_per_element": 1,
+        "jitter_ms": 0.3,
+    },
+}
+
+
+def onnx_io(path):
+    """
+    (inputs, outputs) TensorInfo lists read from the ONNX graph, for backends
+    without their own metadata. Dynamic dimensions are their names (str), like onnxruntime.
+    """
+    import onnx
+    model = onnx.load(path, load_external_data=False)
+    initializers = {t.name for t in model.graph.initializer}
+
+    def info(value):
+        t = value.type.tensor_type
+        shape = [d.dim_value if d.HasField("dim_value") else (d.dim_param or None) for d in t.shape.dim]
+        dtype = f"tensor({onnx.helper.tensor_dtype_to_np_dtype(t.elem_type).name})".replace("float32", "float")
+        return TensorInfo(value.name, shape, dtype)
+
+    inputs = [info(v) for v in model.graph.input if v.name not in initializers]
+    return inputs, [info(v) for v in model.graph.output]
+
+
+def static_shape(shape, batch):
+    # Shape with the batch dimension set and any other dynamic dimension at 1
+    return [batch] + [d if isinstance(d, int) else 1 for d in shape[1:]]
+
+
+class Backend:
+    """
+    Single-input model behind the interface the pipeline uses:
+
+        backend = make_backend("ort", path, "seg", settings=profile["seg"])
+        backend.get_inputs()[0].shape, backend.get_inputs()[0].type
+        out = backend.run(x)[0]
+
+    run() takes the input array (NCHW float32 or NHWC uint8, as the model
+    expects) and returns a list holding the model's first output as a numpy
+    array. When `reuses_outputs` is True the returned array is a buffer that
+    the next run() overwrites (copy what must outlive it).
+    """
+    name = "backend"
+    reuses_outputs = False
+    cache_status = "off"  # session_config.create_cached_session status (onnxruntime backends)
+
+    def get_inputs(self):
+        return self.inputs
+
+    def get_outputs(self):
+        return self.outputs
+
+    def run(self, x):
+        raise NotImplementedError
+
+    def describe(self):
+        return self.name
+
+    def close(self):
+        pass
+
+
+class OrtBackend(Backend):
+    """
+    ONNX Runtime session (session_config): cached optimized model, per-model
+    session settings and IO binding.
+    """
+    name = "onnxruntime"
+
+    def __init__(self, path, settings=None, providers=DEFAULT_PROVIDERS, cache_dir=None, io_binding=True):
+        self.sess, self.cache_status = create_cached_session(path, settings or {}, providers, cache_dir)
+        self.runner = BoundSession(self.sess, [self.sess.get_outputs()[0].name], io_binding)
+        self.inputs = [TensorInfo(i.name, i.shape, i.type) for i in self.sess.get_inputs()]
+        self.outputs = [TensorInfo(o.name, o.shape, o.type) for o in self.sess.get_outputs()[:1]]
+
+    @property
+    def reuses_outputs(self):
+        return self.runner.buffers is not None
+
+    def run(self, x):
+        return self.runner.run(x)
+
+    def describe(self):
+        providers = ", ".join(p.replace("ExecutionProvider", "") for p in self.sess.get_providers())
+        return (f"onnxruntime ({providers}), IO binding {'on' if self.runner.bound else 'off'}, "
+                f"model cache {self.cache_status}")
+
+
+class OpenCVDnnBackend(Backend):
+    """
+    cv2.dnn network read from the ONNX file: no onnxruntime needed on the target,
+    OpenCV's own CPU kernels (or its OpenCL/CUDA targets when OpenCV was built with them).
+    Float exports only: cv2.dnn does not mix the uint8 input of the mask exports
+    (export_stdc.py --mode mask) with float layers.
+    """
+    name = "opencv-dnn"
+    TARGETS = {"cpu": "DNN_TARGET_CPU", "opencl": "DNN_TARGET_OPENCL", "cuda": "DNN_TARGET_CUDA"}
+
+    def __init__(self, path, target="cpu"):
+        import cv2
+        inputs, outputs = onnx_io(path)
+        if inputs[0].type != 'tensor(float)':
+            raise ValueError(f"{path}: {inputs[0].type} input, the opencv backend needs a float export")
+        self.inputs, self.outputs = inputs[:1], outputs[:1]
+        self.net = cv2.dnn.readNetFromONNX(path)
+        if target != "cpu":  # CPU is the default (OpenCV 5's graph engine warns on any explicit target)
+            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_CUDA if target == "cuda" else cv2.dnn.DNN_BACKEND_OPENCV)
+            self.net.setPreferableTarget(getattr(cv2.dnn, self.TARGETS[target]))
+        self.target = target
+        self.output_name = self.outputs[0].name
+
+    def run(self, x):
+        self.net.setInput(x)
+        return [self.net.forward(self.output_name)]
+
+    def describe(self):
+        return f"opencv-dnn ({self.target})"
+
+
+class TorchBackend(Backend):
+    """
+    PyTorch module, or a TorchScript file path, in inference mode. A module has
+    no input metadata: `input_shape` (e.g. [1, 3, 512, 1024]) and `input_type`
+    describe what run() is given. Numpy inputs are moved to the model's device,
+    only the first output is copied back.
+    """
+    name = "pytorch"
+
+    def __init__(self, model, input_shape=None, input_type='tensor(float)', device=None):
+        import torch
+        self.torch = torch
+        self.device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+        if isinstance(model, str):
+            model = torch.jit.load(model, map_location=self.device)
+        self.model = model.to(self.device).eval()
+        self.inputs = [TensorInfo("input", list(input_shape) if input_shape else None, input_type)]
+        self.outputs = [TensorInfo("output", None, 'tensor(float)')]
+
+    def run(self, x):
+        with self.torch.inference_mode():
+            if isinstance(x, np.ndarray):
+                x = self.torch.from_numpy(x)
+            out = self.model(x.to(self.device))
+        if isinstance(out, (list, tuple)):
+            out = out[0]  # Auxiliary heads (e.g. BiSeNet's) are not copied back
+        return [out.cpu().numpy()]
+
+    def describe(self):
+        return f"pytorch ({self.device})"
+
+
+class SimulatedDevice:
+    """
+    Latency model of one accelerator, shared by every SimulatedAcceleratorBackend
+    built on it. Like a single NPU, it runs one call at a time (calls from other
+    threads wait), and a call for another network than the last one pays the
+    context switch. A call occupies the device for
+
+        call_overhead + context switch + compute_ms[role] * input elements / reference_elements[role]
+        + input bytes / h2d + output bytes / d2h + jitter
+
+    Compute is linear in the input size: a band export with half the pixels costs
+    half, a batch of 4 frames four times.
+
+    The backends run the real model on the CPU while holding the device, then
+    sleep until that deadline, so the outputs are real and the timing is the
+    device's (as long as the CPU is faster than the modelled call, see overruns).
+    """
+    def __init__(self, preset="hailo8l_pi5", seed=0, **overrides):
+        if preset not in DEVICE_PRESETS:
+            raise ValueError(f"Unknown device preset {preset!r}, expected one of {sorted(DEVICE_PRESETS)}")
+        self.name = preset
+        self.config = dict(DEVICE_PRESETS[preset], **overrides)
+        self.lock = threading.Lock()
+        self.rng = np.random.default_rng(seed)
+        self.active = None  # Network whose context is loaded
+
+        # Metrics
+        self.calls = 0
+        self.switches = 0
+        self.overruns = 0
+        self.busy_s = 0.0
+        self.transfer_s = 0.0
+        self.switch_s = 0.0
+        self.wait_s = 0.0
+        self.t_first = None
+
+    def call_ms(self, role, n_in, n_out):
+        """
+        Modelled (total, transfer, switch) latency in ms of one call moving n_in
+        input and n_out output elements, context switch included when `role` is
+        not the loaded network.
+        """
+        c = self.config
+        if role not in c["compute_ms"]:
+            raise ValueError(f"Device preset {self.name!r} has no compute time for {role!r}")
+        bpe = c["io_bytes_per_element"]
+        transfer = n_in * bpe / (c["h2d_mbps"] * 1e3) + n_out * bpe / (c["d2h_mbps"] * 1e3)
+        compute = c["compute_ms"][role] * n_in / c["reference_elements"][role]
+        switch = c["context_switch_ms"] if self.active != role else 0.0
+        jitter = abs(self.rng.normal(0.0, c["jitter_ms"])) if c["jitter_ms"] else 0.0
+        total = c["call_overhead_ms"] + switch + compute + transfer + jitter
+        return total, transfer, switch
+
+    def execute(self, role, n_in, n_out, fn):
+        """
+        Runs fn() as one device call of `role` moving n_in input and n_out
+        output elements, and returns its result after the modelled latency.
+        """
+        t_request = time.perf_counter()
+        with self.lock:
+            t_start = time.perf_counter()
+            if self.t_first is None:
+                self.t_first = t_request
+            self.wait_s += t_start - t_request
+            total_ms, transfer_ms, switch_ms = self.call_ms(role, n_in, n_out)
+            self.active = role
+            result = fn()
+            remaining = total_ms / 1000 - (time.perf_counter() - t_start)
+            if remaining > 0:
+                time.sleep(remaining)
+            else:
+                self.overruns += 1  # The CPU run took longer than the device would
+            self.calls += 1
+            self.switches += switch_ms > 0
+            self.busy_s += time.perf_counter() - t_start
+            self.transfer_s += transfer_ms / 1000
+            self.switch_s += switch_ms / 1000
+        return result
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.t_first if self.t_first is not None else 0.0
+        n = self.calls
+        return {
+            "calls": n,
+            "context_switches": self.switches,
+            "overruns": self.overruns,
+            "utilization": self.busy_s / elapsed if elapsed else 0.0,
+            "call_ms_avg": self.busy_s / n * 1000 if n else 0.0,
+            "transfer_ms_avg": self.transfer_s / n * 1000 if n else 0.0,
+            "switch_ms_total": self.switch_s * 1000,
+            "queue_wait_ms_avg": self.wait_s / n * 1000 if n else 0.0,
+        }
+
+    def summary(self):
+        s = self.stats()
+        text = (f"{self.name}: {s['calls']} calls, {s['call_ms_avg']:.1f}ms avg "
+                f"(transfer {s['transfer_ms_avg']:.2f}ms) | {s['context_switches']} context switches "
+                f"({s['switch_ms_total']:.0f}ms) | utilization {s['utilization']*100:.0f}% | "
+                f"waited {s['queue_wait_ms_avg']:.1f}ms/call for the device")
+        if s["overruns"]:
+            text += f" | ⚠️ {s['overruns']} calls slower on CPU than modelled"
+        return text
+
+
+class SimulatedAcceleratorBackend(Backend):
+    """
+    ONNX model run on the CPU (onnxruntime) with the latency of a SimulatedDevice.
+    execute=False skips the CPU run and returns zero outputs: timing-only
+    simulation, e.g. of schedules faster than the CPU could run the models.
+    """
+    name = "simulated"
+
+    def __init__(self, path, role, device, execute=True, settings=None, cache_dir=None, io_binding=True):
+        self.role = role
+        self.device = device
+        self.execute = execute
+        # The CPU stands in for the device: no GPU provider
+        self.cpu = OrtBackend(path, settings, ['CPUExecutionProvider'], cache_dir, io_binding)
+        self.inputs, self.outputs = self.cpu.inputs, self.cpu.outputs
+        self.cache_status = self.cpu.cache_status
+        self.zeros = {}
+
+    @property
+    def reuses_outputs(self):
+        return self.cpu.reuses_outputs if self.execute else True
+
+    def zero_output(self, batch):
+        out = self.outputs[0]
+        if batch not in self.zeros:
+            self.zeros[batch] = [np.zeros(static_shape(out.shape, batch), dtype=ONNX_DTYPES[out.type])]
+        return self.zeros[batch]
+
+    def run(self, x):
+        batch = x.shape[0]
+        n_out = int(np.prod(static_shape(self.outputs[0].shape, batch)))
+        fn = (lambda: self.cpu.run(x)) if self.execute else (lambda: self.zero_output(batch))
+        return self.device.execute(self.role, x.size, n_out, fn)
+
+    def describe(self):
+        c = self.device.config
+        return (f"simulated {self.device.name} ({c['compute_ms'][self.role]:.1f}ms compute, "
+                f"{'outputs from CPU onnxruntime' if self.execute else 'timing only'})")
+
+
+def make_backend(kind, path, role, settings=None, providers=DEFAULT_PROVIDERS, cache_dir=None,
+                 io_binding=True, device=None, execute=True):
+    """
+    kind: "ort" | "opencv" | "simulated" (see BACKENDS). role ("seg" | "od")
+    picks the network's compute time on the simulated device.
+    """
+    if kind == "ort":
+        return OrtBackend(path, settings, providers, cache_dir, io_binding)
+    if kind == "opencv":
+        return OpenCVDnnBackend(path)
+    if kind == "simulated":
+        return SimulatedAcceleratorBackend(path, role, device or SimulatedDevice(), execute, settings, cache_dir,
+                                           io_binding)
+    raise ValueError(f"Unknown backend {kind!r}, expected one of {BACKENDS}")
@@ -0,0 +1,134 @@
+import cv2
+import numpy as np
+import os
+import shutil
+import time
+from glob import glob
+from mask_archive import MaskArchiveWriter, MaskArchiveReader
+
+# --- CONFIGURATION ---
+BENCH_DIR = "massyl/results/mask_bench"  # Put it on the target disk (SD card) for meaningful numbers
+MASK_PNG_GLOB = ""    # e.g. "massyl/results/flagged_masks/*.png" (previous PNG masks), synthetic if empty
+N_MASKS = 300
+MASK_SIZE = (512, 1024)    # (h, w) segmentation output
+FRAME_SIZE = (1024, 2048)  # (h, w) camera frame
+N_READS = 100
+
+
+def synthetic_masks(n, rng):
+    """
+    Road-like masks: a trapezoid from the hood to the horizon with ragged
+    borders and a few obstacle holes, drifting a little from frame to frame.
+    """
+    h, w = MASK_SIZE
+    masks = []
+    for i in range(n):
+        mask = np.zeros((h, w), dtype=np.uint8)
+        shift = int(40 * np.sin(i / 20))
+        top = int(h * 0.45)
+        poly = np.array([[w * 0.42 + shift, top], [w * 0.58 + shift, top], [w * 0.95, h], [w * 0.05, h]], np.int32)
+        cv2.fillPoly(mask, [poly], 1)
+        edge = cv2.dilate(mask, np.ones((9, 9), np.uint8)) - cv2.erode(mask, np.ones((9, 9), np.uint8))
+        mask[(edge > 0) & (rng.random((h, w)) < 0.5)] ^= 1
+        for _ in range(rng.integers(0, 4)):
+            cx, cy = rng.integers(w // 4, 3 * w // 4), rng.integers(top + 20, h - 20)
+            cv2.ellipse(mask, (int(cx), int(cy)), (int(rng.integers(5, 30)), int(rng.integers(5, 20))), 0, 0, 360, 0, -1)
+        masks.append(mask)
+    return masks
+
+
+def load_masks():
+    files = sorted(glob(MASK_PNG_GLOB))[:N_MASKS] if MASK_PNG_GLOB else []
+    if not files:
+        return synthetic_masks(N_MASKS, np.random.default_rng(0)), "synthetic"
+    masks = []
+    for f in files:
+        m = cv2.imread(f, cv2.IMREAD_GRAYSCALE)
+        masks.append((cv2.resize(m, MASK_SIZE[::-1], interpolation=cv2.INTER_NEAREST) > 127).view(np.uint8))
+    return masks, MASK_PNG_GLOB
+
+
+def upsample(mask):
+    return cv2.resize(mask, FRAME_SIZE[::-1], interpolation=cv2.INTER_NEAREST)
+
+
+def dir_size(path):
+    files = [os.path.join(path, f) for f in os.listdir(path)]
+    return sum(os.path.getsize(f) for f in files), len(files)
+
+
+def bench_png(masks, folder, full_frame):
+    """
+    Previous behaviour when full_frame: upsample to the frame and write an 8-bit PNG per mask.
+    """
+    os.makedirs(folder)
+    t0 = time.perf_counter()
+    for i, m in enumerate(masks):
+        img = upsample(m) if full_frame else m
+        cv2.imwrite(os.path.join(folder, f"mask_{i:06d}.png"), img * 255)
+    write_s = time.perf_counter() - t0
+
+    idx = np.random.default_rng(1).integers(0, len(masks), N_READS)
+    t0 = time.perf_counter()
+    for i in idx:
+        cv2.imread(os.path.join(folder, f"mask_{i:06d}.png"), cv2.IMREAD_GRAYSCALE)
+    read_s = time.perf_counter() - t0
+    size, n_files = dir_size(folder)
+    return write_s, read_s, size, n_files
+
+
+def bench_archive(masks, folder, compress):
+    os.makedirs(folder)
+    path = os.path.join(folder, "masks")
+    writer = MaskArchiveWriter(path, compress=compress)
+    t0 = time.perf_counter()
+    for i, m in enumerate(masks):
+        writer.append(f"frame_{i:06d}.png", "2000-01-01 00:00:00", m, FRAME_SIZE)
+    writer.close()
+    write_s = time.perf_counter() - t0
+
+    reader = MaskArchiveReader(path)
+    # Round trip check
+    for i in (0, len(masks) // 2, len(masks) - 1):
+        assert np.array_equal(reader[i], masks[i]) and np.array_equal(reader.full_mask(i), upsample(masks[i]))
+    idx = np.random.default_rng(1).integers(0, len(masks), N_READS)
+    t0 = time.perf_counter()
+    for i in idx:
+        reader[int(i)]
+    read_s = time.perf_counter() - t0
+    reader.close()
+    size, n_files = dir_size(folder)
+    return write_s, read_s, size, n_files
+
+
+def main():
+    masks, source = load_masks()
+    if os.path.exists(BENCH_DIR):
+        shutil.rmtree(BENCH_DIR)
+    os.makedirs(BENCH_DIR)
+    print(f"Mask storage benchmark: {len(masks)} masks ({source}), model {MASK_SIZE[1]}x{MASK_SIZE[0]}, "
+          f"frame {FRAME_SIZE[1]}x{FRAME_SIZE[0]}, in {BENCH_DIR}")
+
+    results = {
+        "png full frame (before)": bench_png(masks, os.path.join(BENCH_DIR, "png_full"), True),
+        "png model res": bench_png(masks, os.path.join(BENCH_DIR, "png_model"), False),
+        "archive packbits": bench_archive(masks, os.path.join(BENCH_DIR, "packbits"), False),
+        "archive packbits+zlib": bench_archive(masks, os.path.join(BENCH_DIR, "packbits_zlib"), True),
+    }
+    shutil.rmtree(BENCH_DIR)
+
+    print("=" * 90)
+    print(f"{'format':<24}{'files':>7}{'total KB':>11}{'KB/mask':>9}{'write masks/s':>15}{'ms/write':>10}{'ms/read':>9}")
+    for name, (write_s, read_s, size, n_files) in results.items():
+        n = len(masks)
+        print(f"{name:<24}{n_files:>7}{size / 1024:>11.0f}{size / 1024 / n:>9.1f}{n / write_s:>15.0f}"
+              f"{write_s / n * 1000:>10.2f}{read_s / N_READS * 1000:>9.2f}")
+    print("=" * 90)
+    base = results["png full frame (before)"]
+    for name in ("archive packbits", "archive packbits+zlib"):
+        r = results[name]
+        print(f"{name} vs png full frame: size x{r[2] / base[2]:.2f}, write throughput x{base[0] / r[0]:.1f}")
+
+
+if __name__ == "__main__":
+    main()
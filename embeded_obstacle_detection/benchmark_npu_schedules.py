@@ -0,0 +1,201 @@
+import numpy as np
+import time
+from concurrent.futures import ThreadPoolExecutor
+import main_embeded_obstacle_delection as online
+from backends import DEVICE_PRESETS, SimulatedDevice, make_backend
+from fusion_engine import RoadOverlap
+from preprocess_engine import FramePreprocessor
+
+# --- CONFIGURATION ---
+# Models are the pipeline's (main_embeded_obstacle_delection.py), run on a simulated accelerator (backends.py)
+DEVICE_PRESETS_TO_RUN = ["hailo8l_pi5", "hailo8l_pi5_joined"]
+EXECUTE = False        # False = timing-only device (zero outputs), True = real outputs from CPU onnxruntime
+                       # (the CPU must then be faster than the modelled device, see the overrun warnings)
+FRAME_SIZE = (1024, 2048)  # (h, w) synthetic camera frames
+N_FRAMES = 60
+OD_INPUT_SHAPE = (640, 640)  # (h, w) fallback for detection exports with a dynamic input size
+BATCH = 4              # Frames per device call in the "batched" schedule (needs --dynamic_batch exports with EXECUTE)
+SCHEDULES = ["sequential", "concurrent", "alternating", "batched", "pipelined"]
+
+
+class HostSide:
+    """
+    CPU work around the device calls, as in FusionPipeline: preprocessing into
+    both model inputs, then argmax + road overlap and YOLO postprocessing.
+    """
+    def __init__(self, seg, od, n_buffers):
+        seg_h, seg_w = online.FusionPipeline.seg_input_hw(seg)
+        self.seg_uint8 = seg.get_inputs()[0].type == 'tensor(uint8)'
+        od_hw = tuple(od.get_inputs()[0].shape[2:4])
+        if not all(isinstance(d, int) for d in od_hw):
+            od_hw = OD_INPUT_SHAPE
+        self.preprocessor = FramePreprocessor((seg_w, seg_h), od_hw, n_buffers, seg_uint8=self.seg_uint8)
+
+    def preprocess(self, frame):
+        return self.preprocessor.process(frame)
+
+    def postprocess(self, frame_shape, seg_out, od_out, od_params):
+        seg_map = seg_out if self.seg_uint8 else np.argmax(seg_out, axis=0).astype(np.uint8)
+        road = RoadOverlap(seg_map, frame_shape)
+        detections = online.postprocess_yolo([od_out[None]], od_params[0], od_params[1], frame_shape[:2],
+                                             online.CONF_THRESHOLD, online.IOU_THRESHOLD)
+        return road.overlap_ratios(detections["box"])
+
+
+def run_frame(seg, od, seg_in, od_in, od_first=False):
+    if od_first:
+        od_out = od.run(od_in)[0]
+        seg_out = seg.run(seg_in)[0]
+    else:
+        seg_out = seg.run(seg_in)[0]
+        od_out = od.run(od_in)[0]
+    return seg_out, od_out
+
+
+def owned(backend, out):
+    # Outputs handed to another thread must survive the backend's next run()
+    return out.copy() if backend.reuses_outputs else out
+
+
+def schedule_sequential(ctx, frames, od_first_odd=False):
+    latencies = []
+    for i, frame in enumerate(frames):
+        t0 = time.perf_counter()
+        seg_in, od_in, od_params = ctx.host.preprocess(frame)
+        seg_out, od_out = run_frame(ctx.seg, ctx.od, seg_in, od_in, od_first_odd and i % 2 == 1)
+        ctx.host.postprocess(frame.shape, seg_out[0], od_out[0], od_params)
+        latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def schedule_alternating(ctx, frames):
+    # seg, od | od, seg | seg, od ...: the network loaded at the end of a frame runs first on the next one
+    return schedule_sequential(ctx, frames, od_first_odd=True)
+
+
+def schedule_concurrent(ctx, frames):
+    # FusionPipeline with CONCURRENT_INFERENCE: both models submitted at once, the device serializes them
+    latencies = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for frame in frames:
+            t0 = time.perf_counter()
+            seg_in, od_in, od_params = ctx.host.preprocess(frame)
+            seg_future = executor.submit(ctx.seg.run, seg_in)
+            od_out = ctx.od.run(od_in)[0]
+            seg_out = seg_future.result()[0]
+            ctx.host.postprocess(frame.shape, seg_out[0], od_out[0], od_params)
+            latencies.append(time.perf_counter() - t0)
+    return latencies
+
+
+def schedule_batched(ctx, frames):
+    # BATCH frames per call: two context switches per batch, but a frame waits for its whole batch
+    latencies = []
+    for start in range(0, len(frames), BATCH):
+        group = frames[start:start + BATCH]
+        t0 = time.perf_counter()
+        inputs = []
+        for frame in group:
+            seg_in, od_in, od_params = ctx.host.preprocess(frame)
+            inputs.append((seg_in.copy(), od_in.copy(), od_params))
+        seg_out, od_out = run_frame(ctx.seg, ctx.od, np.concatenate([x[0] for x in inputs]),
+                                    np.concatenate([x[1] for x in inputs]))
+        for k, frame in enumerate(group):
+            ctx.host.postprocess(frame.shape, seg_out[k], od_out[k], inputs[k][2])
+        latencies += [time.perf_counter() - t0] * len(group)
+    return latencies
+
+
+def schedule_pipelined(ctx, frames):
+    """
+    Alternating order, with the preprocessing of the next frame and the
+    postprocessing of the previous one on host threads while the device runs.
+    """
+    latencies = [0.0] * len(frames)
+    t_start = [0.0] * len(frames)
+
+    def preprocess(i):
+        t_start[i] = time.perf_counter()
+        return ctx.host.preprocess(frames[i])
+
+    def postprocess(i, seg_out, od_out, od_params):
+        ctx.host.postprocess(frames[i].shape, seg_out[0], od_out[0], od_params)
+        latencies[i] = time.perf_counter() - t_start[i]
+
+    with ThreadPoolExecutor(max_workers=1) as pre_pool, ThreadPoolExecutor(max_workers=1) as post_pool:
+        next_input = pre_pool.submit(preprocess, 0)
+        pending = []
+        for i in range(len(frames)):
+            seg_in, od_in, od_params = next_input.result()
+            seg_in, od_in = seg_in.copy(), od_in.copy()  # The preprocessor's ring buffers are reused
+            if i + 1 < len(frames):
+                next_input = pre_pool.submit(preprocess, i + 1)
+            seg_out, od_out = run_frame(ctx.seg, ctx.od, seg_in, od_in, i % 2 == 1)
+            pending.append(post_pool.submit(postprocess, i, owned(ctx.seg, seg_out), owned(ctx.od, od_out),
+                                            od_params))
+        for future in pending:
+            future.result()
+    return latencies
+
+
+class Context:
+    def __init__(self, preset, seg_path, od_path):
+        self.device = SimulatedDevice(preset)
+        self.seg = make_backend("simulated", seg_path, "seg", device=self.device, execute=EXECUTE)
+        self.od = make_backend("simulated", od_path, "od", device=self.device, execute=EXECUTE)
+        self.host = HostSide(self.seg, self.od, n_buffers=2)
+
+
+def batch_supported(ctx):
+    if not EXECUTE:
+        return True
+    return all(not isinstance(b.get_inputs()[0].shape[0], int) for b in (ctx.seg, ctx.od))
+
+
+def host_ms(seg_path, od_path, frames):
+    # Host-side cost per frame alone (device call time excluded)
+    ctx = Context("hailo8l_pi5_joined", seg_path, od_path)
+    seg_in, od_in, _ = ctx.host.preprocess(frames[0])
+    seg_out, od_out = run_frame(ctx.seg, ctx.od, seg_in, od_in)
+    t0 = time.perf_counter()
+    for frame in frames[:10]:
+        _, _, od_params = ctx.host.preprocess(frame)
+        ctx.host.postprocess(frame.shape, seg_out[0], od_out[0], od_params)
+    return (time.perf_counter() - t0) / min(10, len(frames)) * 1000
+
+
+def main():
+    seg_path = online.ROI_SEG_MODEL_PATH if online.ROI_MODE and online.ROI_SEG_MODEL_PATH else online.SEG_MODEL_PATH
+    od_path = online.ROI_OD_MODEL_PATH if online.ROI_MODE and online.ROI_OD_MODEL_PATH else online.OD_MODEL_PATH
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, FRAME_SIZE + (3,), dtype=np.uint8) for _ in range(4)] * (N_FRAMES // 4)
+    print(f"NPU schedule benchmark: {len(frames)} frames {FRAME_SIZE[1]}x{FRAME_SIZE[0]}, "
+          f"{'CPU outputs' if EXECUTE else 'timing only'}")
+    print(f"  seg: {seg_path}\n  od : {od_path}")
+    print(f"  host pre+postprocessing: {host_ms(seg_path, od_path, frames):.1f}ms/frame on this CPU")
+
+    for preset in DEVICE_PRESETS_TO_RUN:
+        c = DEVICE_PRESETS[preset]
+        print("=" * 86)
+        print(f"{preset}: compute seg {c['compute_ms']['seg']}ms + od {c['compute_ms']['od']}ms, "
+              f"context switch {c['context_switch_ms']}ms, overhead {c['call_overhead_ms']}ms/call")
+        print(f"{'schedule':<13}{'FPS':>7}{'lat avg ms':>12}{'lat p95 ms':>12}{'device util':>13}"
+              f"{'switch/frame':>14}{'overruns':>10}")
+        for name in SCHEDULES:
+            ctx = Context(preset, seg_path, od_path)
+            if name == "batched" and not batch_supported(ctx):
+                print(f"{name:<13}  skipped: fixed-batch models (export with --dynamic_batch)")
+                continue
+            t0 = time.perf_counter()
+            latencies = globals()[f"schedule_{name}"](ctx, frames)
+            wall = time.perf_counter() - t0
+            s = ctx.device.stats()
+            print(f"{name:<13}{len(frames) / wall:>7.1f}{np.mean(latencies) * 1000:>12.1f}"
+                  f"{np.percentile(latencies, 95) * 1000:>12.1f}{s['utilization'] * 100:>12.0f}%"
+                  f"{s['context_switches'] / len(frames):>14.2f}{s['overruns']:>10}")
+    print("=" * 86)
+    print("Device util = share of the wall time the simulated device was busy (100% = device-bound schedule)")
+
+
+if __name__ == "__main__":
+    main()
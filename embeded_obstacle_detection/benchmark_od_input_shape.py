@@ -0,0 +1,107 @@
+import cv2
+import numpy as np
+import onnxruntime as ort
+import os
+import time
+from glob import glob
+from preprocess_engine import FramePreprocessor, letterbox_params
+from yolo_postprocess import postprocess_yolo
+from detection_metrics import load_yolo_labels, evaluate_map
+
+# --- CONFIGURATION ---
+# Same checkpoint exported twice with train_embeded_YOLO-OD/export_yolo.py:
+# RECT_IMG_SIZE = None (square) and RECT_IMG_SIZE = (320, 640) (rectangular)
+MODELS = {
+    "square 640x640": "massyl/od_models/yolov8s_best_2.onnx",
+    "rect 640x320":   "massyl/od_models/yolov8s_best_2_320x640.onnx",
+}
+VAL_DIR = "massyl/data/lost_and_found_left_od_optimized/valid"  # LAF validation split (images/ + labels/)
+
+EVAL_CONF = 0.001     # Low threshold for mAP (like `yolo val`)
+IOU_THRESHOLD = 0.45
+N_THREADS = 4
+
+
+def evaluate_model(model_path, image_files):
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = N_THREADS
+    sess = ort.InferenceSession(model_path, sess_options=opts, providers=['CPUExecutionProvider'])
+    input_name = sess.get_inputs()[0].name
+    output_name = sess.get_outputs()[0].name
+    od_shape = tuple(sess.get_inputs()[0].shape[2:4])
+
+    pre = FramePreprocessor(od_shape=od_shape)
+    od_tensor = pre.od_tensors[0]
+
+    predictions, ground_truths = [], []
+    pre_ms, infer_ms, post_ms = [], [], []
+    pad_fraction = None
+    for img_path in image_files:
+        frame = cv2.imread(img_path)
+        if frame is None: continue
+        h, w = frame.shape[:2]
+
+        t0 = time.perf_counter()
+        _, params = pre.process_od(frame, od_tensor)
+        t1 = time.perf_counter()
+        out = sess.run([output_name], {input_name: od_tensor})
+        t2 = time.perf_counter()
+        dets = postprocess_yolo(out, params[0], params[1], (h, w), EVAL_CONF, IOU_THRESHOLD, top_k=300, max_det=300)
+        t3 = time.perf_counter()
+
+        pre_ms.append((t1 - t0) * 1000)
+        infer_ms.append((t2 - t1) * 1000)
+        post_ms.append((t3 - t2) * 1000)
+
+        label_path = os.path.join(VAL_DIR, "labels", os.path.splitext(os.path.basename(img_path))[0] + ".txt")
+        predictions.append(dets)
+        ground_truths.append(load_yolo_labels(label_path, w, h))
+
+        if pad_fraction is None:
+            _, _, new_unpad, _ = letterbox_params(frame.shape, od_shape)
+            pad_fraction = 1 - (new_unpad[0] * new_unpad[1]) / (od_shape[0] * od_shape[1])
+
+    metrics = evaluate_map(predictions, ground_truths)
+    # Skip the first (warm-up) frame in the latency figures
+    metrics.update({
+        "input": f"{od_shape[1]}x{od_shape[0]}",
+        "pixels": od_shape[0] * od_shape[1],
+        "padding": pad_fraction or 0.0,
+        "pre_ms": float(np.mean(pre_ms[1:] or pre_ms)),
+        "infer_ms": float(np.mean(infer_ms[1:] or infer_ms)),
+        "post_ms": float(np.mean(post_ms[1:] or post_ms)),
+    })
+    return metrics
+
+
+def main():
+    image_files = sorted(glob(os.path.join(VAL_DIR, "images", "*.jpg")) + glob(os.path.join(VAL_DIR, "images", "*.png")))
+    if not image_files:
+        print(f"No validation images found in {VAL_DIR}/images")
+        return
+    print(f"Evaluating {len(image_files)} validation images ({N_THREADS} CPU threads)...")
+
+    results = {}
+    for name, path in MODELS.items():
+        if not os.path.exists(path):
+            print(f"⚠️ Skipping {name}: {path} not found")
+            continue
+        print(f"-> {name}: {path}")
+        results[name] = evaluate_model(path, image_files)
+
+    print("\n" + "=" * 92)
+    print(f"{'model':<16}{'input':>9}{'padding':>9}{'pre ms':>9}{'infer ms':>10}{'post ms':>9}{'mAP50':>9}{'mAP50-95':>10}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['input']:>9}{r['padding']*100:>8.0f}%{r['pre_ms']:>9.1f}{r['infer_ms']:>10.1f}"
+              f"{r['post_ms']:>9.1f}{r['map50']:>9.3f}{r['map50_95']:>10.3f}")
+    print("=" * 92)
+
+    if len(results) == 2:
+        (name_a, a), (name_b, b) = results.items()
+        print(f"{name_b} vs {name_a}: pixels x{b['pixels'] / a['pixels']:.2f}, "
+              f"inference {(b['infer_ms'] / a['infer_ms'] - 1) * 100:+.1f}%, "
+              f"mAP50 {b['map50'] - a['map50']:+.3f}, mAP50-95 {b['map50_95'] - a['map50_95']:+.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import argparse
+import json
+import numpy as np
+import os
+import platform
+import sys
+import tempfile
+import time
+from glob import glob
+import main_embeded_obstacle_delection as online
+from frame_source import FrameSource
+
+# --- CONFIGURATION ---
+# Models and pipeline settings are the pipeline's (main_embeded_obstacle_delection.py)
+FRAMES = "massyl/data/benchmark/*.jpg"  # Fixed frame set replayed at every run (commit it with the baseline)
+REPEAT = 3             # Passes over the frame set
+SKIP_FRAMES = 5        # First frames left out of the statistics (after the pipeline's own warm-up)
+RESULTS_PATH = "massyl/results/benchmark.json"
+BASELINE_PATH = "massyl/benchmark_baseline.json"
+TOLERANCE_PCT = 10.0   # A stage fails when a gated percentile grows by more than this
+MIN_DELTA_MS = 0.5     # ... and by more than this in absolute terms (sub-ms stages are mostly noise)
+GATED_PERCENTILES = ("p50", "p95")
+
+STAGES = ("decode", "preprocess", "inference", "postprocess", "fusion", "logging", "frame")
+PERCENTILES = {"p50": 50, "p95": 95, "p99": 99}
+
+
+class TimedBackend:
+    """
+    Backend proxy adding the wall time of every run() to the pipeline's
+    per-frame inference counter.
+    """
+    def __init__(self, backend, pipeline):
+        self.backend = backend
+        self.pipeline = pipeline
+
+    def run(self, x):
+        t0 = time.perf_counter_ns()
+        out = self.backend.run(x)
+        self.pipeline.inference_ns += time.perf_counter_ns() - t0
+        return out
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+
+class InstrumentedPipeline(online.FusionPipeline):
+    """
+    FusionPipeline with per-stage timers. Both models run one after the other
+    (no concurrent inference), so the stage times add up to the frame time:
+    postprocess = argmax, road overlap integral and NMS, i.e. run_models minus
+    the model calls.
+    """
+    def __init__(self):
+        super().__init__()
+        self.seg_backend = TimedBackend(self.seg_backend, self)
+        self.od_backend = TimedBackend(self.od_backend, self)
+        self.inference_ns = 0
+        self.logging_ns = 0
+
+    def log_flagged_frame(self, filename, road):
+        t0 = time.perf_counter_ns()
+        super().log_flagged_frame(filename, road)
+        self.logging_ns += time.perf_counter_ns() - t0
+
+    def time_frame(self, packet):
+        """
+        Runs one decoded packet through every step, returns {stage: ns}.
+        """
+        self.inference_ns = self.logging_ns = 0
+        t0 = time.perf_counter_ns()
+        packet = self.preprocess(packet)
+        t1 = time.perf_counter_ns()
+        packet = self.run_models(packet)
+        t2 = time.perf_counter_ns()
+        self.fuse(packet)
+        t3 = time.perf_counter_ns()
+        return {
+            "preprocess": t1 - t0,
+            "inference": self.inference_ns,
+            "postprocess": (t2 - t1) - self.inference_ns,
+            "fusion": (t3 - t2) - self.logging_ns,
+            "logging": self.logging_ns,
+        }
+
+
+def percentiles(samples_ns):
+    ms = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    stats = {"n": int(ms.size), "mean": float(ms.mean()), "max": float(ms.max())}
+    stats.update({name: float(np.percentile(ms, q)) for name, q in PERCENTILES.items()})
+    return stats
+
+
+def run_benchmark(files, repeat):
+    # Flagged frames go to a scratch folder, not to the drive's log
+    scratch = tempfile.mkdtemp(prefix="benchmark_")
+    online.MASK_OUTPUT_DIR = os.path.join(scratch, "masks")
+    online.LOG_FILE_PATH = os.path.join(scratch, "log.txt")
+    online.CONCURRENT_INFERENCE = False
+    online.PERF_REPORT_EVERY = 0  # No periodic report printed inside the timed frames
+    pipeline = InstrumentedPipeline()
+    pipeline.warm_up()
+    # Same decode path as the live pipeline (reduced JPEG decode), on this thread
+    source = FrameSource(files, pipeline.decode_target_size, reduced_decode=online.REDUCED_DECODE)
+
+    samples = {stage: [] for stage in STAGES}
+    n_timed = 0
+    wall_ns = 0
+    try:
+        for idx, path in enumerate(files * repeat):
+            t0 = time.perf_counter_ns()
+            frame = source.read_image(path)
+            decode_ns = time.perf_counter_ns() - t0
+            if frame is None: continue
+            source.decoded += 1
+            stage_ns = pipeline.time_frame({"idx": idx, "name": path, "frame": frame, "decode_ms": decode_ns / 1e6})
+            frame_ns = time.perf_counter_ns() - t0
+            if idx < SKIP_FRAMES:
+                continue
+            stage_ns.update(decode=decode_ns, frame=frame_ns)
+            for stage, ns in stage_ns.items():
+                # Logging only happens on flagged frames
+                if stage != "logging" or ns:
+                    samples[stage].append(ns)
+            n_timed += 1
+            wall_ns += frame_ns
+    finally:
+        if pipeline.executor is not None:
+            pipeline.executor.shutdown()
+        pipeline.writer.close()
+    if not n_timed:
+        raise RuntimeError(f"No frame timed: {len(files)} files x {repeat}, {SKIP_FRAMES} skipped")
+
+    return {
+        "machine": {"cpu_count": os.cpu_count(), "machine": platform.machine(), "python": platform.python_version()},
+        "config": {"backend": online.BACKEND, "seg": pipeline.seg_backend.describe(),
+                   "od": pipeline.od_backend.describe(), "roi_mode": online.ROI_MODE,
+                   "cascade": online.CASCADE_MODE, "seg_schedule": online.SEG_SCHEDULE,
+                   "frames": len(files), "repeat": repeat, "skipped": SKIP_FRAMES},
+        "frames": n_timed,
+        "throughput_fps": n_timed / (wall_ns / 1e9),
+        "stages": {stage: percentiles(ns) for stage, ns in samples.items() if ns},
+    }
+
+
+def compare(results, baseline, tolerance_pct, min_delta_ms):
+    """
+    Regressions of the gated percentiles (and of the throughput) against the
+    baseline, as printable lines. Empty list = pass.
+    """
+    failures = []
+    print(f"{'stage':<12}{'pct':>5}{'baseline ms':>13}{'now ms':>10}{'change':>9}")
+    for stage, base in baseline["stages"].items():
+        now = results["stages"].get(stage)
+        if now is None:
+            continue
+        for pct in GATED_PERCENTILES:
+            change = now[pct] / base[pct] - 1 if base[pct] else 0.0
+            failed = change * 100 > tolerance_pct and now[pct] - base[pct] > min_delta_ms
+            print(f"{stage:<12}{pct:>5}{base[pct]:>13.2f}{now[pct]:>10.2f}{change*100:>+8.1f}%"
+                  f"{'  ⚠️ REGRESSION' if failed else ''}")
+            if failed:
+                failures.append(f"{stage} {pct}: {base[pct]:.2f}ms -> {now[pct]:.2f}ms ({change*100:+.1f}%)")
+    fps_change = results["throughput_fps"] / baseline["throughput_fps"] - 1
+    print(f"{'throughput':<12}{'':>5}{baseline['throughput_fps']:>10.1f}FPS{results['throughput_fps']:>7.1f}FPS"
+          f"{fps_change*100:>+8.1f}%")
+    if -fps_change * 100 > tolerance_pct:
+        failures.append(f"throughput: {baseline['throughput_fps']:.1f} -> {results['throughput_fps']:.1f} FPS "
+                        f"({fps_change*100:+.1f}%)")
+    return failures
+
+
+def print_results(results):
+    print("=" * 78)
+    print(f"{results['frames']} frames | throughput {results['throughput_fps']:.1f} FPS | "
+          f"{results['config']['backend']}")
+    print(f"{'stage':<12}{'n':>6}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, s in results["stages"].items():
+        print(f"{stage:<12}{s['n']:>6}{s['mean']:>10.2f}{s['p50']:>10.2f}{s['p95']:>10.2f}{s['p99']:>10.2f}"
+              f"{s['max']:>10.2f}")
+    print("=" * 78)
+
+
+def write_json(data, path):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Headless per-stage latency benchmark with a baseline gate")
+    parser.add_argument("--frames", default=FRAMES, help="Image glob of the fixed frame set")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--out", default=RESULTS_PATH, help="Results JSON")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare against")
+    parser.add_argument("--update_baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE_PCT, help="Allowed regression in %%")
+    parser.add_argument("--min_delta_ms", type=float, default=MIN_DELTA_MS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    files = sorted(glob(args.frames))
+    if not files:
+        print(f"No frames match {args.frames}")
+        return 2
+    print(f"Benchmark: {len(files)} frames x {args.repeat}, headless, sequential stages")
+    results = run_benchmark(files, args.repeat)
+    print_results(results)
+    write_json(results, args.out)
+    print(f"✅ Results written to {args.out}")
+
+    if args.update_baseline:
+        write_json(results, args.baseline)
+        print(f"✅ Baseline updated: {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline} (run with --update_baseline to create it)")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("machine") != results["machine"]:
+        print(f"⚠️ Baseline recorded on {baseline.get('machine')}, this run on {results['machine']}")
+    failures = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    if failures:
+        print(f"⚠️ {len(failures)} regression(s) over {args.tolerance:.0f}%:")
+        for line in failures:
+            print(f"   {line}")
+        return 1
+    print(f"✅ No stage regressed by more than {args.tolerance:.0f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
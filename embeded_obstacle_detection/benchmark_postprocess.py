@@ -0,0 +1,116 @@
+import cv2
+import numpy as np
+import time
+from yolo_postprocess import postprocess_yolo
+
+# --- CONFIGURATION ---
+N_ANCHORS = 8400
+N_CLASSES = 1
+CONF_THRESHOLD = 0.5
+IOU_THRESHOLD = 0.45
+# Number of anchors above CONF_THRESHOLD (quiet highway -> cluttered city)
+CANDIDATE_COUNTS = [10, 100, 1000, 3000, 6000]
+N_RUNS = 50
+
+# Letterbox params of a 2048x1024 frame into 640x640
+ORIG_SHAPE = (1024, 2048)
+RATIO = (0.3125, 0.3125)
+DWDH = (0.0, 160.0)
+
+
+def legacy_postprocess(output, dwdh, ratio, orig_shape):
+    """
+    Previous FusionPipeline.postprocess_od: Python loops + cv2.dnn.NMSBoxes.
+    Kept here as the reference for speed and output comparison.
+    """
+    prediction = output[0][0]
+    predictions = np.transpose(prediction, (1, 0))
+
+    boxes, scores, class_ids = [], [], []
+    pred_boxes = predictions[:, :4]
+    pred_scores = predictions[:, 4:]
+    max_scores = np.max(pred_scores, axis=1)
+    max_ids = np.argmax(pred_scores, axis=1)
+
+    mask = max_scores >= CONF_THRESHOLD
+    filtered_boxes = pred_boxes[mask]
+    filtered_scores = max_scores[mask]
+    filtered_ids = max_ids[mask]
+
+    if len(filtered_boxes) == 0: return [], [], []
+
+    nms_boxes = []
+    for box in filtered_boxes:
+        cx, cy, w, h = box
+        nms_boxes.append([cx - w/2, cy - h/2, w, h])
+
+    indices = cv2.dnn.NMSBoxes(nms_boxes, filtered_scores.tolist(), CONF_THRESHOLD, IOU_THRESHOLD)
+
+    if len(indices) > 0:
+        pad_w, pad_h = dwdh
+        scale_w, scale_h = ratio
+        for i in indices.flatten():
+            x, y, w, h = nms_boxes[i]
+            x = (x - pad_w) / scale_w
+            y = (y - pad_h) / scale_h
+            w = w / scale_w
+            h = h / scale_h
+            x1 = max(0, int(x))
+            y1 = max(0, int(y))
+            x2 = min(orig_shape[1], int(x + w))
+            y2 = min(orig_shape[0], int(y + h))
+            boxes.append([x1, y1, x2, y2])
+            scores.append(filtered_scores[i])
+            class_ids.append(filtered_ids[i])
+
+    return boxes, scores, class_ids
+
+
+def make_output(n_candidates, rng):
+    """
+    Synthetic YOLOv8 head output (1, 4 + N_CLASSES, N_ANCHORS) with
+    `n_candidates` anchors above threshold, clustered like real detections.
+    """
+    pred = np.zeros((4 + N_CLASSES, N_ANCHORS), dtype=np.float32)
+    centers = rng.uniform([0, 160], [640, 480], size=(max(1, n_candidates // 20), 2))
+    owner = rng.integers(0, len(centers), N_ANCHORS)
+    pred[0:2] = (centers[owner] + rng.normal(0, 6, (N_ANCHORS, 2))).T
+    pred[2:4] = rng.uniform(15, 90, (2, N_ANCHORS))
+    pred[4:] = rng.uniform(0, CONF_THRESHOLD * 0.9, (N_CLASSES, N_ANCHORS))
+    hot = rng.choice(N_ANCHORS, n_candidates, replace=False)
+    pred[4 + rng.integers(0, N_CLASSES, n_candidates), hot] = rng.uniform(CONF_THRESHOLD, 1.0, n_candidates)
+    return [pred[None]]
+
+
+def time_ms(fn, *args):
+    fn(*args)  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(N_RUNS):
+        fn(*args)
+    return (time.perf_counter() - t0) / N_RUNS * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"YOLO postprocess benchmark ({N_ANCHORS} anchors, {N_CLASSES} class(es), {N_RUNS} runs)")
+    print(f"{'candidates':>10} | {'legacy ms':>9} | {'vector ms':>9} | {'speedup':>7} | {'kept (legacy/vector)':>20}")
+
+    for n in CANDIDATE_COUNTS:
+        output = make_output(n, rng)
+        legacy_ms = time_ms(legacy_postprocess, output, DWDH, RATIO, ORIG_SHAPE)
+        # top_k/max_det at their limits so that both sides see the same candidate set
+        vector_ms = time_ms(lambda o: postprocess_yolo(o, RATIO, DWDH, ORIG_SHAPE, CONF_THRESHOLD, IOU_THRESHOLD,
+                                                       top_k=N_ANCHORS, max_det=N_ANCHORS), output)
+        topk_ms = time_ms(lambda o: postprocess_yolo(o, RATIO, DWDH, ORIG_SHAPE, CONF_THRESHOLD, IOU_THRESHOLD),
+                          output)
+
+        legacy_boxes = legacy_postprocess(output, DWDH, RATIO, ORIG_SHAPE)[0]
+        dets = postprocess_yolo(output, RATIO, DWDH, ORIG_SHAPE, CONF_THRESHOLD, IOU_THRESHOLD,
+                                top_k=N_ANCHORS, max_det=N_ANCHORS)
+        kept = f"{len(legacy_boxes)}/{len(dets)}"
+        print(f"{n:>10} | {legacy_ms:>9.2f} | {vector_ms:>9.2f} | {legacy_ms / vector_ms:>6.1f}x | {kept:>20}"
+              f"   (top-300: {topk_ms:.2f} ms)")
+
+
+if __name__ == "__main__":
+    main()
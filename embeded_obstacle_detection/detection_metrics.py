@@ -0,0 +1,94 @@
+import os
+import numpy as np
+
+
+def load_yolo_labels(label_path, img_w, img_h):
+    """
+    YOLO txt labels (cls xc yc w h, normalized) -> (boxes [x1, y1, x2, y2] in pixels, class ids).
+    Missing file = no object.
+    """
+    if not os.path.exists(label_path):
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.int32)
+    rows = np.loadtxt(label_path, ndmin=2, dtype=np.float32)
+    if rows.size == 0:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.int32)
+    xc, yc, w, h = rows[:, 1] * img_w, rows[:, 2] * img_h, rows[:, 3] * img_w, rows[:, 4] * img_h
+    boxes = np.stack([xc - w / 2, yc - h / 2, xc + w / 2, yc + h / 2], axis=1)
+    return boxes, rows[:, 0].astype(np.int32)
+
+
+def box_iou(a, b):
+    """
+    IoU between (N, 4) and (M, 4) [x1, y1, x2, y2] boxes -> (N, M).
+    """
+    iw = np.clip(np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    ih = np.clip(np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = iw * ih
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter, dtype=np.float64), where=union > 0)
+
+
+def average_precision(recall, precision):
+    """
+    Area under the precision envelope (all-point interpolation).
+    """
+    mrec = np.concatenate(([0.0], recall, [1.0]))
+    mpre = np.concatenate(([1.0], precision, [0.0]))
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    idx = np.flatnonzero(mrec[1:] != mrec[:-1])
+    return float(np.sum((mrec[idx + 1] - mrec[idx]) * mpre[idx + 1]))
+
+
+def evaluate_map(predictions, ground_truths, iou_thresholds=np.linspace(0.5, 0.95, 10)):
+    """
+    predictions:   list (one per image) of DETECTION_DTYPE arrays (yolo_postprocess)
+    ground_truths: list (one per image) of (boxes, class_ids) from load_yolo_labels
+    Returns {"map50": ..., "map50_95": ..., "n_images": ..., "n_objects": ...}, averaged over classes.
+    """
+    classes = set()
+    for _, gt_cls in ground_truths:
+        classes.update(gt_cls.tolist())
+
+    ap = np.zeros((len(classes), len(iou_thresholds)))
+    for ci, cls in enumerate(sorted(classes)):
+        scores, matched = [], []
+        n_gt = 0
+        for dets, (gt_boxes, gt_cls) in zip(predictions, ground_truths):
+            gt = gt_boxes[gt_cls == cls]
+            d = dets[dets["class_id"] == cls]
+            d = d[np.argsort(-d["score"], kind="stable")]
+            n_gt += len(gt)
+            hit = np.zeros((len(d), len(iou_thresholds)), dtype=bool)
+            if len(d) and len(gt):
+                iou = box_iou(d["box"].astype(np.float64), gt.astype(np.float64))
+                for ti, thr in enumerate(iou_thresholds):
+                    taken = np.zeros(len(gt), dtype=bool)
+                    for di in range(len(d)):
+                        cand = np.where(~taken & (iou[di] >= thr), iou[di], -1.0)
+                        best = int(np.argmax(cand))
+                        if cand[best] >= 0:
+                            taken[best] = True
+                            hit[di, ti] = True
+            scores.append(d["score"])
+            matched.append(hit)
+
+        if n_gt == 0:
+            continue
+        scores = np.concatenate(scores)
+        matched = np.concatenate(matched)
+        order = np.argsort(-scores, kind="stable")
+        tp = np.cumsum(matched[order], axis=0)
+        fp = np.cumsum(~matched[order], axis=0)
+        for ti in range(len(iou_thresholds)):
+            recall = tp[:, ti] / n_gt
+            precision = tp[:, ti] / np.maximum(tp[:, ti] + fp[:, ti], 1)
+            ap[ci, ti] = average_precision(recall, precision)
+
+    return {
+        "map50": float(ap[:, 0].mean()) if len(classes) else 0.0,
+        "map50_95": float(ap.mean()) if len(classes) else 0.0,
+        "n_images": len(predictions),
+        "n_objects": int(sum(len(c) for _, c in ground_truths)),
+    }
@@ -0,0 +1,194 @@
+import cv2
+import numpy as np
+import onnxruntime as ort
+import time
+from glob import glob
+from fusion_engine import RoadOverlap
+from preprocess_engine import FramePreprocessor
+from seg_scheduler import SegScheduler, scene_thumbnail
+from yolo_postprocess import postprocess_yolo
+
+# --- CONFIGURATION ---
+SEG_MODEL_PATH = "massyl/seg_models/stdc813m_maxmiou_4.onnx"
+OD_MODEL_PATH  = "massyl/od_models/yolov8s_best_2.onnx"
+# Recorded drives, one glob per sequence (frames sorted by name = time order)
+SEQUENCES = [
+    "massyl/data/final_demo_4/*.jpg",
+]
+
+CONF_THRESHOLD = 0.5
+IOU_THRESHOLD  = 0.45
+ROAD_OVERLAP_THRESHOLD = 0.1
+N_THREADS = 4
+
+# Segmentation schedules compared against segmenting every frame: (every_n, scene diff threshold)
+SCHEDULES = [
+    (3, 12.0),
+    (5, 12.0),
+    (5, 6.0),
+    (10, 12.0),
+    (10, float("inf")),  # interval only
+]
+
+# Cascade validation (same decisions as FusionPipeline.run_cascade)
+HORIZON_LINE = 0.40
+HOOD_LINE    = 0.85
+MIN_ROAD_FRACTIONS = [0.0, 0.01, 0.02, 0.05]  # seg_first thresholds to validate
+
+
+class FullPipelineRunner:
+    """
+    Runs both models on every frame, the reference all schedules are compared to.
+    Same preprocessing, postprocessing and fusion code as FusionPipeline.
+    """
+    def __init__(self):
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = N_THREADS
+        providers = ['CPUExecutionProvider']
+        self.seg_sess = ort.InferenceSession(SEG_MODEL_PATH, sess_options=opts, providers=providers)
+        self.od_sess = ort.InferenceSession(OD_MODEL_PATH, sess_options=opts, providers=providers)
+        seg_inp = self.seg_sess.get_inputs()[0]
+        self.seg_mask_model = seg_inp.type == 'tensor(uint8)'
+        seg_h, seg_w = seg_inp.shape[1:3] if self.seg_mask_model else seg_inp.shape[2:4]
+        self.od_output_name = self.od_sess.get_outputs()[0].name
+        self.pre = FramePreprocessor((seg_w, seg_h), tuple(self.od_sess.get_inputs()[0].shape[2:4]),
+                                     seg_uint8=self.seg_mask_model)
+
+    def detect(self, od_in, od_params, frame_shape):
+        t0 = time.perf_counter()
+        out = self.od_sess.run([self.od_output_name], {self.od_sess.get_inputs()[0].name: od_in})
+        dets = postprocess_yolo(out, od_params[0], od_params[1], frame_shape[:2], CONF_THRESHOLD, IOU_THRESHOLD)
+        return dets, (time.perf_counter() - t0) * 1000
+
+    def segment(self, seg_in, frame_shape):
+        t0 = time.perf_counter()
+        out = self.seg_sess.run(None, {self.seg_sess.get_inputs()[0].name: seg_in})[0][0]
+        seg_map = out if self.seg_mask_model else np.argmax(out, axis=0).astype(np.uint8)
+        return RoadOverlap(seg_map, frame_shape), (time.perf_counter() - t0) * 1000
+
+
+def is_alert(road, detections):
+    # Same decision as FusionPipeline.fuse, before the cooldown
+    return bool(np.any(road.overlap_ratios(detections["box"]) > ROAD_OVERLAP_THRESHOLD))
+
+
+def precision_recall(pred, ref):
+    pred, ref = np.asarray(pred, dtype=bool), np.asarray(ref, dtype=bool)
+    tp = int(np.sum(pred & ref))
+    precision = tp / pred.sum() if pred.sum() else 1.0
+    recall = tp / ref.sum() if ref.sum() else 1.0
+    return precision, recall
+
+
+def evaluate_sequence(runner, files):
+    """
+    One pass over the sequence: full inference on every frame, while every
+    schedule decides on its own whether it would have segmented the frame or
+    reused its cached mask. Returns per-frame reference alerts, per-schedule
+    alerts/schedulers and per-frame cascade inputs:
+    (number of detections, guideline band road fraction, seg ms, od ms).
+    """
+    schedulers = [SegScheduler(n, diff) for n, diff in SCHEDULES]
+    cached = [None] * len(SCHEDULES)
+    cached_idx = [0] * len(SCHEDULES)
+    ref_alerts, alerts = [], [[] for _ in SCHEDULES]
+    cascade = []
+
+    for idx, path in enumerate(files):
+        frame = cv2.imread(path)
+        if frame is None: continue
+        seg_in, od_in, od_params = runner.pre.process(frame)
+        detections, od_ms = runner.detect(od_in, od_params, frame.shape)
+        road, seg_ms = runner.segment(seg_in, frame.shape)
+        ref_alerts.append(is_alert(road, detections))
+        h = frame.shape[0]
+        cascade.append((len(detections), road.road_fraction(int(h * HORIZON_LINE), int(h * HOOD_LINE)),
+                        seg_ms, od_ms))
+
+        thumb = scene_thumbnail(frame)
+        for i, sched in enumerate(schedulers):
+            if sched.decide(thumb) is not None:
+                cached[i], cached_idx[i] = road, idx
+            else:
+                sched.record_reuse(idx - cached_idx[i])
+            alerts[i].append(is_alert(cached[i], detections))
+
+    return ref_alerts, alerts, schedulers, cascade
+
+
+def print_cascade_report(ref, cascade):
+    """
+    Alerts of both cascade orders vs the full pipeline. A cascade only skips a
+    model when it proves the frame alert-free, so any mismatch is a bug (od_first)
+    or a too high MIN_ROAD_FRACTION (seg_first).
+    """
+    ref = np.asarray(ref, dtype=bool)
+    n_dets, road_frac, seg_ms, od_ms = (np.asarray(c) for c in zip(*cascade))
+    seg_mean = float(seg_ms[1:].mean() if len(seg_ms) > 1 else seg_ms.mean())
+    od_mean = float(od_ms[1:].mean() if len(od_ms) > 1 else od_ms.mean())
+
+    rows = [("od_first", "-", n_dets == 0, seg_mean)]
+    rows += [("seg_first", f"{t:.2f}", road_frac < t, od_mean) for t in MIN_ROAD_FRACTIONS]
+    print(f"\nCascade vs full pipeline ({len(ref)} frames, seg {seg_mean:.1f} ms, od {od_mean:.1f} ms)")
+    print("=" * 80)
+    print(f"{'order':>10}{'min road':>10}{'short-circuit':>15}{'saved ms/frame':>16}"
+          f"{'precision':>11}{'recall':>9}{'mismatch':>10}")
+    for order, thr, skip, skipped_ms in rows:
+        alerts = ref & ~skip
+        precision, recall = precision_recall(alerts, ref)
+        mismatch = int(np.sum(alerts != ref))
+        print(f"{order:>10}{thr:>10}{skip.mean()*100:>14.0f}%{skip.mean() * skipped_ms:>16.1f}"
+              f"{precision:>11.3f}{recall:>9.3f}{mismatch:>10}")
+    print("=" * 80)
+
+
+def main():
+    runner = FullPipelineRunner()
+    ref_all, alerts_all = [], [[] for _ in SCHEDULES]
+    totals = [{"frames": 0, "runs": 0, "stale_sum": 0, "reused": 0, "stale_max": 0} for _ in SCHEDULES]
+    cascade_all = []
+
+    for pattern in SEQUENCES:
+        files = sorted(glob(pattern))
+        if not files:
+            print(f"⚠️ Skipping {pattern}: no frames")
+            continue
+        print(f"-> {pattern}: {len(files)} frames")
+        ref, alerts, schedulers, cascade = evaluate_sequence(runner, files)
+        ref_all += ref
+        cascade_all += cascade
+        for i, sched in enumerate(schedulers):
+            alerts_all[i] += alerts[i]
+            t = totals[i]
+            t["frames"] += sched.frames
+            t["runs"] += sched.runs
+            t["stale_sum"] += sched.staleness_sum
+            t["reused"] += sched.reused
+            t["stale_max"] = max(t["stale_max"], sched.staleness_max)
+
+    if not ref_all:
+        print("No frames evaluated")
+        return
+
+    seg_ms_all = [c[2] for c in cascade_all]
+    seg_mean = float(np.mean(seg_ms_all[1:] or seg_ms_all))
+    print(f"\nReference (segment every frame): {len(ref_all)} frames, {sum(ref_all)} alert frames, "
+          f"seg {seg_mean:.1f} ms/frame")
+    print("=" * 96)
+    print(f"{'every_n':>8}{'diff':>7}{'skip':>8}{'stale avg':>11}{'stale max':>11}"
+          f"{'seg ms/frame':>14}{'precision':>11}{'recall':>9}{'mismatch':>10}")
+    for (every_n, diff), alerts, t in zip(SCHEDULES, alerts_all, totals):
+        skip = 1 - t["runs"] / t["frames"]
+        stale = t["stale_sum"] / t["reused"] if t["reused"] else 0.0
+        precision, recall = precision_recall(alerts, ref_all)
+        mismatch = int(np.sum(np.asarray(alerts) != np.asarray(ref_all)))
+        print(f"{every_n:>8}{diff:>7.1f}{skip*100:>7.0f}%{stale:>11.1f}{t['stale_max']:>11}"
+              f"{seg_mean * (1 - skip):>14.1f}{precision:>11.3f}{recall:>9.3f}{mismatch:>10}")
+    print("=" * 96)
+    print("precision/recall: frame-level alerts of the schedule vs the every-frame pipeline (before cooldown)")
+
+    print_cascade_report(ref_all, cascade_all)
+
+
+if __name__ == "__main__":
+    main()
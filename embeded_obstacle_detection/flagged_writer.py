@@ -0,0 +1,184 @@
+import cv2
+import os
+import threading
+import time
+from datetime import datetime
+from pipeline_engine import BoundedQueue, BLOCK, STOP
+from mask_archive import MaskArchiveWriter
+
+
+class FlaggedFrameWriter(threading.Thread):
+    """
+    Background writer for flagged frames: road mask + one line in the log file.
+
+    mask_format:
+      "archive": model-resolution mask, bit-packed into <mask_dir>/masks.bin/.idx (see mask_archive.py)
+      "png"    : one full-frame 8-bit PNG per flagged frame (mask_<name>)
+
+    The detection loop only enqueues (filename, timestamp, road); mask
+    upsampling/packing and disk I/O happen on this thread. The queue blocks when full instead of
+    dropping, so no flagged event is lost; the time spent blocked is the
+    backpressure metric to watch.
+
+    The log file stays open for the whole run. Masks, then log lines, are
+    flushed after each batch (queue drained), and the masks written since the
+    last sync, then the log, are fsync'ed every `fsync_interval` seconds (or
+    every `max_unsynced` masks, PNG or archive records) and on close(), so the
+    log never lists a mask that is not on disk. Each run starts a new log and
+    a new archive, so both describe the same frames.
+    """
+    def __init__(self, mask_dir, log_path, queue_size=16, fsync_interval=2.0, max_unsynced=32, png_compression=1,
+                 mask_format="archive"):
+        super().__init__(name="flagged-writer", daemon=True)
+        if mask_format not in ("archive", "png"):
+            raise ValueError(f"Unknown mask format '{mask_format}', expected 'archive' or 'png'")
+        self.mask_dir = mask_dir
+        self.mask_format = mask_format
+        self.fsync_interval = fsync_interval
+        self.max_unsynced = max_unsynced
+        self.png_params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+        self.queue = BoundedQueue("flagged", queue_size, BLOCK)
+
+        os.makedirs(mask_dir, exist_ok=True)
+        self.archive = (MaskArchiveWriter(os.path.join(mask_dir, "masks"), append=False)
+                        if mask_format == "archive" else None)
+        log_dir = os.path.dirname(log_path)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        self.log = open(log_path, "w")
+        self.log.write("Filename, Timestamp, Detection_Note\n")
+        self.log.flush()
+
+        self.unsynced = []  # PNG mask files written but not fsync'ed yet (kept open until the sync)
+        self.n_unsynced = 0  # Masks written since the last sync (PNG files or archive records)
+        self.t_last_sync = time.perf_counter()
+
+        # Metrics
+        self.written = 0
+        self.errors = 0
+        self.write_s = 0.0
+        self.write_max_s = 0.0
+        self.fsyncs = 0
+        self.fsync_s = 0.0
+        self.lock = threading.Lock()
+
+    def submit(self, filename, road):
+        """
+        Queues one flagged frame (road: fusion_engine.RoadOverlap of the frame).
+        Blocks while the queue is full.
+        """
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return self.queue.put((filename, timestamp, road))
+
+    def run(self):
+        while True:
+            item = self.queue.get(timeout=self.fsync_interval)
+            if item is STOP:
+                break
+            if item is not None:
+                self.write(*item)
+            # Batch boundary: nothing else waiting
+            if self.queue.stats()["depth"] == 0:
+                if self.archive is not None:
+                    self.archive.flush()
+                self.log.flush()
+                if time.perf_counter() - self.t_last_sync >= self.fsync_interval:
+                    self.sync()
+            if self.n_unsynced >= self.max_unsynced:
+                self.sync()
+        self.sync()
+
+    def write(self, filename, timestamp, road):
+        t_start = time.perf_counter()
+        try:
+            if self.archive is not None:
+                mask = road.seg_map == road.road_class
+                self.archive.append(filename, timestamp, mask, (road.frame_h, road.frame_w), (road.y0, road.y1))
+                self.n_unsynced += 1
+                self.log.write(f"{filename}, {timestamp}, Flagged\n")
+                self.record_write(t_start)
+                return
+            # Scale mask (0/1) to (0/255) for visibility
+            ok, png = cv2.imencode(".png", road.full_mask() * 255, self.png_params)
+            if not ok:
+                raise IOError("PNG encoding failed")
+            mask_path = os.path.join(self.mask_dir, f"mask_{os.path.basename(filename)}")
+            f = open(mask_path, "wb")
+            try:
+                f.write(png.tobytes())
+                f.flush()
+            except OSError:
+                f.close()
+                raise
+            self.unsynced.append(f)
+            self.n_unsynced += 1
+            self.log.write(f"{filename}, {timestamp}, Flagged\n")
+        except (OSError, IOError) as e:
+            self.errors += 1
+            print(f"⚠️ Flagged frame writer: {filename}: {e}")
+            return
+        self.record_write(t_start)
+
+    def record_write(self, t_start):
+        elapsed = time.perf_counter() - t_start
+        with self.lock:
+            self.written += 1
+            self.write_s += elapsed
+            self.write_max_s = max(self.write_max_s, elapsed)
+
+    def sync(self):
+        t_start = time.perf_counter()
+        # Masks first: a log line must never reach the disk before its mask
+        if self.archive is not None:
+            self.archive.fsync()
+        for f in self.unsynced:
+            os.fsync(f.fileno())
+            f.close()
+        self.unsynced = []
+        self.n_unsynced = 0
+        self.log.flush()
+        os.fsync(self.log.fileno())
+        now = time.perf_counter()
+        with self.lock:
+            self.fsyncs += 1
+            self.fsync_s += now - t_start
+        self.t_last_sync = now
+
+    def close(self, timeout=None):
+        """
+        Stops accepting events, writes everything still queued, fsyncs and closes the log.
+        """
+        pending = self.queue.stats()["depth"]
+        if pending:
+            print(f"Flagged frame writer: draining {pending} pending event(s)...")
+        self.queue.close()
+        self.join(timeout)
+        if not self.is_alive():
+            self.log.close()
+            if self.archive is not None:
+                self.archive.close()
+
+    def stats(self):
+        q = self.queue.stats()
+        with self.lock:
+            n = self.written
+            return {
+                "submitted": q["puts"],
+                "written": n,
+                "errors": self.errors,
+                "pending": q["depth"],
+                "high_water": q["high_water"],
+                "occupancy": q["occupancy"],
+                "blocked_s": q["blocked_s"],
+                "write_ms_avg": self.write_s / n * 1000 if n else 0.0,
+                "write_ms_max": self.write_max_s * 1000,
+                "fsyncs": self.fsyncs,
+                "fsync_ms_avg": self.fsync_s / self.fsyncs * 1000 if self.fsyncs else 0.0,
+            }
+
+    def print_stats(self):
+        s = self.stats()
+        print(f"[writer] {s['written']}/{s['submitted']} written ({s['errors']} errors, {s['pending']} pending) | "
+              f"write avg {s['write_ms_avg']:.1f}ms, max {s['write_ms_max']:.1f}ms | "
+              f"{s['fsyncs']} fsyncs, avg {s['fsync_ms_avg']:.1f}ms | "
+              f"queue hw {s['high_water']}/{self.queue.maxsize}, blocked {s['blocked_s']:.2f}s")
@@ -0,0 +1,195 @@
+import cv2
+import threading
+import time
+from glob import glob
+from pipeline_engine import BoundedQueue, BLOCK, STOP
+
+# JPEG DCT-domain downscaling: libjpeg decodes directly at 1/2, 1/4 or 1/8 size
+REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+REDUCED_EXTENSIONS = (".jpg", ".jpeg")
+
+
+def reduction_factor(frame_shape, target_size):
+    """
+    Largest decode reduction (1, 2, 4 or 8) that keeps the frame at least
+    target_size (w, h) in both dimensions. target_size may also be a function
+    frame shape -> (w, h), when the size needed depends on the frame's aspect ratio.
+    """
+    if target_size is None:
+        return 1
+    if callable(target_size):
+        target_size = target_size(frame_shape)
+    h, w = frame_shape[:2]
+    for factor, _ in REDUCED_FLAGS:
+        if w // factor >= target_size[0] and h // factor >= target_size[1]:
+            return factor
+    return 1
+
+
+class FrameSource:
+    """
+    Decodes frames on a background thread, `read_ahead` frames ahead of the consumer.
+
+        for packet in FrameSource("data/*.jpg", target_size=(1024, 512)):
+            packet["frame"], packet["name"], packet["idx"], packet["decode_ms"]
+
+    source: image glob, list of image paths, video file, or camera index (int or "0", "1", ...)
+    target_size: (w, h) the models need, or a function frame shape -> (w, h)
+                 (see reduction_factor()). JPEG frames are then decoded
+                 at 1/2, 1/4 or 1/8 size when that still covers it (IMREAD_REDUCED_COLOR_*);
+                 video/camera frames are downscaled on this thread instead.
+                 All downstream coordinates are then in the reduced frame's pixels.
+    paced_fps: replay an image glob at this rate, like a camera would deliver it.
+
+    Live sources (camera, paced replay) never wait for the consumer: when the
+    read-ahead queue is full the next frame is skipped *before* decoding
+    (image: not read at all, video/camera: grab() without retrieve()).
+    Files read as fast as the consumer allows are never skipped.
+    """
+    def __init__(self, source, target_size=None, read_ahead=4, paced_fps=None, reduced_decode=True):
+        self.source = source
+        self.target_size = target_size if reduced_decode else None
+        self.paced_fps = paced_fps
+        self.queue = BoundedQueue("read-ahead", read_ahead, BLOCK)
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        if isinstance(source, (list, tuple)):
+            self.kind = "images"
+            self.files = list(source)
+        elif isinstance(source, int) or (isinstance(source, str) and source.isdigit()):
+            self.kind = "camera"
+        elif '*' in source:
+            self.kind = "images"
+            self.files = sorted(glob(source))
+        else:
+            self.kind = "video"
+        self.live = self.kind == "camera" or paced_fps is not None
+
+        # Metrics
+        self.decoded = 0
+        self.skipped = 0
+        self.decode_s = 0.0
+        self.decode_max_s = 0.0
+        self.wait_s = 0.0
+        self.factor = 1
+
+    def __len__(self):
+        return len(self.files) if self.kind == "images" else 0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="frame-source", daemon=True)
+            self.thread.start()
+        return self
+
+    def __iter__(self):
+        self.start()
+        while True:
+            t0 = time.perf_counter()
+            item = self.queue.get()
+            self.wait_s += time.perf_counter() - t0
+            if item is STOP:
+                break
+            yield item
+
+    def close(self):
+        self.stop_event.set()
+        self.queue.close()
+        if self.thread is not None:
+            self.thread.join(2.0)
+
+    def run(self):
+        try:
+            if self.kind == "images":
+                self.run_images()
+            else:
+                self.run_capture()
+        except Exception as e:
+            print(f"⚠️ Frame source '{self.source}' failed: {e}")
+        finally:
+            self.queue.close()
+
+    def emit(self, idx, name, frame, t_start):
+        elapsed = time.perf_counter() - t_start
+        self.decoded += 1
+        self.decode_s += elapsed
+        self.decode_max_s = max(self.decode_max_s, elapsed)
+        packet = {"idx": idx, "name": name, "frame": frame, "decode_ms": elapsed * 1000}
+        return self.queue.put(packet, self.stop_event)
+
+    def read_image(self, path):
+        if self.factor > 1 and path.lower().endswith(REDUCED_EXTENSIONS):
+            return cv2.imread(path, dict(REDUCED_FLAGS)[self.factor])
+        frame = cv2.imread(path)
+        if frame is not None and self.target_size is not None and self.factor == 1 and self.decoded == 0:
+            # First frame decoded at full size gives the reduction for the rest of the sequence
+            self.factor = reduction_factor(frame.shape, self.target_size)
+            if self.factor > 1 and path.lower().endswith(REDUCED_EXTENSIONS):
+                return cv2.imread(path, dict(REDUCED_FLAGS)[self.factor])
+        return frame
+
+    def run_images(self):
+        period = 1.0 / self.paced_fps if self.paced_fps else 0.0
+        t_next = time.perf_counter()
+        for idx, path in enumerate(self.files):
+            if self.stop_event.is_set():
+                return
+            if period:
+                delay = t_next - time.perf_counter()
+                if delay > 0: time.sleep(delay)
+                t_next = max(t_next + period, time.perf_counter() - period)
+            if self.live and self.queue.full():
+                self.skipped += 1
+                continue
+            t_start = time.perf_counter()
+            frame = self.read_image(path)
+            if frame is None: continue
+            if not self.emit(idx, path, frame, t_start):
+                return
+
+    def run_capture(self):
+        cap = cv2.VideoCapture(int(self.source) if self.kind == "camera" else self.source)
+        idx = 0
+        try:
+            while not self.stop_event.is_set():
+                t_start = time.perf_counter()
+                if not cap.grab():
+                    break
+                if self.live and self.queue.full():
+                    # Frame consumed from the device/stream but not converted
+                    self.skipped += 1
+                else:
+                    ret, frame = cap.retrieve()
+                    if not ret: break
+                    if self.target_size is not None:
+                        if idx == 0:
+                            self.factor = reduction_factor(frame.shape, self.target_size)
+                        if self.factor > 1:
+                            h, w = frame.shape[:2]
+                            frame = cv2.resize(frame, (w // self.factor, h // self.factor),
+                                               interpolation=cv2.INTER_AREA)
+                    if not self.emit(idx, f"video_frame_{idx}.jpg", frame, t_start):
+                        break
+                idx += 1
+        finally:
+            cap.release()
+
+    def stats(self):
+        q = self.queue.stats()
+        n = self.decoded
+        return {
+            "decoded": n,
+            "skipped": self.skipped,
+            "decode_ms_avg": self.decode_s / n * 1000 if n else 0.0,
+            "decode_ms_max": self.decode_max_s * 1000,
+            "reduction": self.factor,
+            "read_ahead_hw": q["high_water"],
+            "consumer_wait_s": self.wait_s,
+        }
+
+    def summary(self):
+        s = self.stats()
+        return (f"{s['decoded']} frames at 1/{s['reduction']} size, {s['skipped']} skipped before decode | "
+                f"decode avg {s['decode_ms_avg']:.1f}ms, max {s['decode_ms_max']:.1f}ms | "
+                f"read-ahead hw {s['read_ahead_hw']}/{self.queue.maxsize}, consumer waited {s['consumer_wait_s']:.2f}s")
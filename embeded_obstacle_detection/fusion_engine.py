@@ -0,0 +1,122 @@
+import cv2
+import numpy as np
+
+
+class RoadOverlap:
+    """
+    Box-on-road overlap computed at the segmentation model resolution.
+
+    One summed-area table (integral image) of the road mask is built per frame,
+    then the road pixel count of any box is 4 lookups, whatever its size:
+
+        sum(box) = S[y2, x2] - S[y1, x2] - S[y2, x1] + S[y1, x1]
+
+    Boxes are given in full-frame coordinates and mapped to mask space in one go.
+    The full-resolution mask is only produced on demand (flagged frames, display).
+
+    `band` = (y0, y1) frame rows covered by the mask when segmentation only saw a
+    horizontal band of the frame (ROI mode). Rows outside the band are not road.
+    """
+    def __init__(self, seg_map, frame_shape, road_class=1, band=None):
+        self.seg_map = seg_map
+        self.road_class = road_class
+        self.frame_h, self.frame_w = frame_shape[:2]
+        self.mask_h, self.mask_w = seg_map.shape[:2]
+        self.y0, self.y1 = band if band is not None else (0, self.frame_h)
+
+        # Frame (band) -> mask scale factors
+        self.sx = self.mask_w / self.frame_w
+        self.sy = self.mask_h / (self.y1 - self.y0)
+
+        road = (seg_map == road_class).view(np.uint8)
+        self.integral = cv2.integral(road, sdepth=cv2.CV_32S)  # (mask_h + 1, mask_w + 1)
+        self._full_mask = None
+
+    def to_mask_coords(self, boxes):
+        """
+        (N, 4) full-frame [x1, y1, x2, y2] -> (N, 4) int mask coords, clipped.
+        The mapped box covers every mask cell touched by the original box.
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        mapped = np.empty(boxes.shape, dtype=np.int32)
+        mapped[:, 0] = np.floor(boxes[:, 0] * self.sx)
+        mapped[:, 1] = np.floor((boxes[:, 1] - self.y0) * self.sy)
+        mapped[:, 2] = np.ceil(boxes[:, 2] * self.sx)
+        mapped[:, 3] = np.ceil((boxes[:, 3] - self.y0) * self.sy)
+        np.clip(mapped[:, 0::2], 0, self.mask_w, out=mapped[:, 0::2])
+        np.clip(mapped[:, 1::2], 0, self.mask_h, out=mapped[:, 1::2])
+        return mapped
+
+    def road_pixels(self, mapped):
+        S = self.integral
+        x1, y1, x2, y2 = mapped[:, 0], mapped[:, 1], mapped[:, 2], mapped[:, 3]
+        return S[y2, x2] - S[y1, x2] - S[y2, x1] + S[y1, x1]
+
+    def overlap_ratios(self, boxes):
+        """
+        Fraction of each box covered by road, for all boxes in a single call.
+        Empty / degenerate boxes get 0.0. The part of a box outside the band
+        counts in its area (as non-road).
+        """
+        mapped = self.to_mask_coords(boxes)
+        if len(mapped) == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        area = (mapped[:, 2] - mapped[:, 0]) * (mapped[:, 3] - mapped[:, 1])
+        if self.y0 > 0 or self.y1 < self.frame_h:
+            # Full box height in mask rows, not only the part inside the band
+            area = (mapped[:, 2] - mapped[:, 0]) * np.ceil((boxes[:, 3] - boxes[:, 1]) * self.sy).astype(np.int32)
+        road = self.road_pixels(mapped)
+        ratios = np.zeros(len(mapped), dtype=np.float32)
+        valid = area > 0
+        ratios[valid] = road[valid] / area[valid]
+        return ratios
+
+    def road_fraction(self, y0=None, y1=None):
+        """
+        Fraction of road pixels in frame rows y0..y1 (default: all rows covered by the mask).
+        Rows outside the band count as non-road.
+        """
+        y0 = self.y0 if y0 is None else y0
+        y1 = self.y1 if y1 is None else y1
+        if y1 <= y0:
+            return 0.0
+        mapped = self.to_mask_coords([(0, y0, self.frame_w, y1)])
+        rows = np.ceil((y1 - y0) * self.sy)
+        return float(self.road_pixels(mapped)[0] / (rows * self.mask_w))
+
+    def box_mask(self, box):
+        """
+        Boolean road mask of one box at full-frame resolution (for drawing).
+        Only the box region is upsampled.
+        """
+        x1, y1, x2, y2 = box
+        if x2 <= x1 or y2 <= y1:
+            return np.zeros((max(0, y2 - y1), max(0, x2 - x1)), dtype=bool)
+        # Part of the box inside the band
+        by1, by2 = max(y1, self.y0), min(y2, self.y1)
+        if by2 <= by1:
+            return np.zeros((y2 - y1, x2 - x1), dtype=bool)
+        mx1, my1, mx2, my2 = self.to_mask_coords([(x1, by1, x2, by2)])[0]
+        crop = self.seg_map[my1:max(my2, my1 + 1), mx1:max(mx2, mx1 + 1)]
+        crop = cv2.resize(crop, (x2 - x1, by2 - by1), interpolation=cv2.INTER_NEAREST)
+        if (by1, by2) == (y1, y2):
+            return crop == self.road_class
+        mask = np.zeros((y2 - y1, x2 - x1), dtype=bool)
+        mask[by1 - y1:by2 - y1] = crop == self.road_class
+        return mask
+
+    def full_mask(self):
+        """
+        Road mask (0/1) upsampled to the frame size. Computed once, on demand.
+        """
+        if self._full_mask is None:
+            road = (self.seg_map == self.road_class).view(np.uint8)
+            if self.y0 == 0 and self.y1 == self.frame_h:
+                self._full_mask = cv2.resize(road, (self.frame_w, self.frame_h), interpolation=cv2.INTER_NEAREST)
+            else:
+                self._full_mask = np.zeros((self.frame_h, self.frame_w), dtype=np.uint8)
+                cv2.resize(road, (self.frame_w, self.y1 - self.y0), dst=self._full_mask[self.y0:self.y1],
+                           interpolation=cv2.INTER_NEAREST)
+        return self._full_mask
@@ -1,25 +1,88 @@
+import time
+STARTUP_T0 = time.perf_counter()  # Cold start reference (startup.py), taken before the heavy imports
 import cv2
 import numpy as np
-import onnxruntime as ort
 import os
-import time
-from datetime import datetime
+import signal
+from concurrent.futures import ThreadPoolExecutor
+from pipeline_engine import StreamingPipeline, DROP_OLDEST, BLOCK
+from fusion_engine import RoadOverlap
+from yolo_postprocess import postprocess_yolo, empty_detections
+from preprocess_engine import FramePreprocessor, letterbox_params
+from seg_scheduler import SegScheduler, scene_thumbnail
+from flagged_writer import FlaggedFrameWriter
+from frame_source import FrameSource
+from session_config import load_profile, describe
+from backends import make_backend, SimulatedDevice, BACKENDS
+from startup import StartupTimer
 
 # --- CONFIGURATION ---
 SEG_MODEL_PATH = "massyl/seg_models/stdc813m_maxmiou_4.onnx"
 OD_MODEL_PATH  = "massyl/od_models/yolov8s_best_2.onnx"
 VIDEO_SOURCE   = "massyl/data/final_demo_4/*.jpg" 
+READ_AHEAD     = 4     # Frames decoded ahead of the processing loop (frame_source.py)
+REDUCED_DECODE = True  # Decode JPEGs at 1/2, 1/4... size when the model inputs still fit
 
 # Output Settings
 LOG_FILE_PATH   = "massyl/results/flagged_frames.txt"
 MASK_OUTPUT_DIR = "massyl/results/flagged_masks"
+MASK_FORMAT     = "archive"  # "archive": bit-packed masks.bin/.idx in MASK_OUTPUT_DIR (mask_archive.py) | "png"
 TARGET_FPS      = 3  # The script will try to run at this speed
+WRITER_QUEUE_SIZE = 16  # Flagged frames waiting for the disk writer (the loop blocks, never drops, when full)
+FSYNC_INTERVAL    = 2.0  # Seconds between batched fsyncs of the log and masks
 
 # Model Settings
-SEG_INPUT_SIZE = (1024, 512)
-OD_INPUT_SIZE  = 640
+SEG_INPUT_SIZE = (1024, 512)  # Fallback when the segmentation model has a dynamic input size
+# Detector input (h, w): read from the ONNX model. Export it at the camera aspect ratio
+# (e.g. 320x640 for 2:1 frames, see export_yolo.py) to avoid letterbox padding.
 CONF_THRESHOLD = 0.5
 IOU_THRESHOLD  = 0.45
+NMS_TOP_K      = 300  # Candidates kept (by score) before NMS
+MAX_DETECTIONS = 100
+
+# Execution Settings
+CONCURRENT_INFERENCE = True  # Run segmentation and detection on the same frame at the same time
+SEG_THREADS = 2              # Intra-op thread budget of the segmentation session (when not in the profile)
+OD_THREADS  = 2              # Intra-op thread budget of the detection session (when not in the profile)
+SESSION_PROFILE = "massyl/session_profile.json"  # Per-model session settings (session_config.py), written by
+                                                 # tune_session_profile.py. Missing file = defaults + the budgets above
+IO_BINDING = True            # Run both models into output buffers allocated once (session_config.BoundSession)
+
+# Inference backend (backends.py)
+BACKEND = "ort"              # "ort" | "opencv" (cv2.dnn) | "simulated" (accelerator latency model, outputs from CPU)
+SIMULATED_DEVICE = "hailo8l_pi5"  # backends.DEVICE_PRESETS entry (simulated backend)
+SIMULATED_EXECUTE = True     # False = timing-only simulation, zero model outputs (no CPU inference)
+
+# Startup
+MODEL_CACHE_DIR = "massyl/model_cache"  # ORT-optimized models of previous starts, keyed by model hash + provider
+                                        # (None = optimize the graphs at every start)
+WARMUP_RUNS = 3              # Synthetic frames through both models before the first camera frame (0 = off)
+PERF_REPORT_EVERY = 30       # Print averaged timings every N frames (0 = only at the end)
+PIPELINE_MODE = "streaming"  # "streaming" (threaded stages + bounded queues) or "sync" (one loop)
+QUEUE_SIZE = 2               # Capacity of each inter-stage queue in streaming mode
+OVERLOAD_POLICY = DROP_OLDEST  # drop_oldest | drop_newest | block (see pipeline_engine.py)
+
+# Region of Interest (guidelines, fraction of the frame height)
+HORIZON_LINE = 0.40
+HOOD_LINE    = 0.85
+ROI_MODE = False            # Crop frames to the HORIZON_LINE..HOOD_LINE band before both models
+# Models exported for the band (export_stdc.py --height 256, export_yolo.py RECT_IMG_SIZE = (160, 640)).
+# None = feed the band to the full-frame model (same tensor size, higher vertical resolution).
+ROI_SEG_MODEL_PATH = None   # e.g. "massyl/seg_models/stdc813m_maxmiou_4_1024x256.onnx"
+ROI_OD_MODEL_PATH  = None   # e.g. "massyl/od_models/yolov8s_best_2_160x640.onnx" (RECT_IMG_SIZE = (160, 640))
+ROI_REPORT = True           # Time full-frame vs band models at startup (ROI mode only)
+
+# Cascade (sequential, the first model can make the second one unnecessary)
+CASCADE_MODE = None          # None | "od_first" | "seg_first" (overrides CONCURRENT_INFERENCE)
+MIN_ROAD_FRACTION = 0.02     # seg_first: skip detection below this road fraction of the guideline band
+
+# Segmentation Scheduling (reuse the cached road mask between runs, see seg_scheduler.py)
+SEG_SCHEDULE = False         # False = segment every frame
+SEG_EVERY_N = 5              # Max frames between two segmentation runs
+SCENE_DIFF_THRESHOLD = 12.0  # Mean abs diff (0-255) of grey thumbnails vs the last segmented frame
+# Heading change forcing a run. Inactive for now: no frame source sets packet["heading"] yet,
+# the trigger starts working once GPS headings are passed in with the frames.
+HEADING_CHANGE_DEG = 10.0
 
 # Decision Logic
 ROAD_OVERLAP_THRESHOLD = 0.1
@@ -27,9 +90,26 @@ ALERT_COOLDOWN = 12.0
 
 class FusionPipeline:
     def __init__(self):
+        self.startup = StartupTimer(STARTUP_T0)
+        self.startup.mark("imports")
         self.init_models()
+        self.startup.mark("sessions", f"cache seg {self.model_cache['seg']}, od {self.model_cache['od']}")
+        # Tensors stay referenced by queued packets in streaming mode, hence the ring size
+        n_buffers = QUEUE_SIZE + 2 if PIPELINE_MODE == "streaming" else 1
+        self.preprocessor = FramePreprocessor(self.seg_input_size, self.od_input_shape, n_buffers,
+                                              seg_uint8=self.seg_mask_model)
         self.setup_outputs()
+        self.startup.mark("outputs")
         self.last_alert_time = 0
+        self.perf = {"frames": 0, "seg_ms": 0.0, "od_ms": 0.0, "frame_ms": 0.0,
+                     "single": 0, "single_frame_ms": 0.0}
+        self.cascade = {"frames": 0, "skips": 0, "saved_ms": 0.0,
+                        "seg_n": 0, "seg_ms": 0.0, "od_n": 0, "od_ms": 0.0}
+
+        # Road mask reuse between segmentation runs
+        self.scheduler = SegScheduler(SEG_EVERY_N, SCENE_DIFF_THRESHOLD, HEADING_CHANGE_DEG) if SEG_SCHEDULE else None
+        self.cached_road = None
+        self.cached_road_idx = 0
         
         # Colors
         self.color_road_obs = (0, 255, 0)   # Green
@@ -37,119 +117,441 @@ class FusionPipeline:
         self.color_intrsct  = (255, 0, 255) # Purple (Intersection)
 
     def setup_outputs(self):
-        # 1. Create Output Directory for Masks
-        if not os.path.exists(MASK_OUTPUT_DIR):
-            print(f"Creating output directory: {MASK_OUTPUT_DIR}")
-            os.makedirs(MASK_OUTPUT_DIR)
-        
-        # 2. Create/Clear Log File
-        # Ensure parent dir exists
-        log_dir = os.path.dirname(LOG_FILE_PATH)
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-            
-        # Initialize file with header
-        with open(LOG_FILE_PATH, "w") as f:
-            f.write("Filename, Timestamp, Detection_Note\n")
+        # Masks and log lines are written by a background thread (see flagged_writer.py),
+        # the log file stays open for the whole run
+        self.writer = FlaggedFrameWriter(MASK_OUTPUT_DIR, LOG_FILE_PATH, WRITER_QUEUE_SIZE, FSYNC_INTERVAL,
+                                         mask_format=MASK_FORMAT)
+        self.writer.start()
         print(f"Log file initialized: {LOG_FILE_PATH}")
 
+    @staticmethod
+    def seg_input_hw(sess):
+        # uint8 mask exports are NHWC, logits exports NCHW
+        inp = sess.get_inputs()[0]
+        hw = inp.shape[1:3] if inp.type == 'tensor(uint8)' else inp.shape[2:4]
+        if all(isinstance(d, int) for d in hw):
+            return tuple(hw)
+        return SEG_INPUT_SIZE[1], SEG_INPUT_SIZE[0]
+
     def init_models(self):
-        print("Initializing ONNX Sessions...")
-        providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
-        self.seg_sess = ort.InferenceSession(SEG_MODEL_PATH, providers=providers)
-        self.seg_input_name = self.seg_sess.get_inputs()[0].name
+        print(f"Initializing {BACKEND} backends...")
+        if BACKEND not in BACKENDS:
+            raise ValueError(f"BACKEND must be one of {BACKENDS}, got {BACKEND!r}")
+        # Each session gets its own core budget so that both models can run
+        # side by side without fighting over the same threads.
+        self.profile = load_profile(SESSION_PROFILE, SEG_THREADS, OD_THREADS)
+        # Both simulated backends share one device: calls are serialized and pay its context switches
+        self.device = SimulatedDevice(SIMULATED_DEVICE) if BACKEND == "simulated" else None
+        seg_path = ROI_SEG_MODEL_PATH if ROI_MODE and ROI_SEG_MODEL_PATH else SEG_MODEL_PATH
+        od_path = ROI_OD_MODEL_PATH if ROI_MODE and ROI_OD_MODEL_PATH else OD_MODEL_PATH
+        # A cache hit loads the graph optimized at a previous start (no graph optimization now)
+        self.seg_backend = self.make_backend(seg_path, "seg")
+        # Models exported with `export_stdc.py --mode mask` take uint8 NHWC frames
+        # and already output the uint8 road mask (no normalization, no argmax here)
+        self.seg_mask_model = self.seg_backend.get_inputs()[0].type == 'tensor(uint8)'
+        if self.seg_mask_model:
+            print("Segmentation model: uint8 mask export (in-graph normalization + argmax)")
+        seg_h, seg_w = self.seg_input_hw(self.seg_backend)
+        self.seg_input_size = (seg_w, seg_h)  # (w, h) like cv2.resize
+        print(f"Segmentation input: {seg_w}x{seg_h} | {describe(self.profile['seg'])}")
         
-        self.od_sess = ort.InferenceSession(OD_MODEL_PATH, providers=providers)
-        self.od_input_name = self.od_sess.get_inputs()[0].name
-        self.od_output_name = self.od_sess.get_outputs()[0].name
-
-    def preprocess_seg(self, frame):
-        img = cv2.resize(frame, SEG_INPUT_SIZE)
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0
-        mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
-        std = np.array([0.229, 0.224, 0.225], dtype=np.float32)
-        img = (img - mean) / std
-        input_tensor = img.transpose(2, 0, 1)[np.newaxis, :]
-        return input_tensor
-
-    def preprocess_od(self, frame):
-        shape = frame.shape[:2]
-        new_shape = (OD_INPUT_SIZE, OD_INPUT_SIZE)
-        r = min(new_shape[0] / shape[0], new_shape[1] / shape[1])
-        ratio = r, r
-        new_unpad = int(round(shape[1] * r)), int(round(shape[0] * r))
-        dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]
-        dw, dh = dw / 2, dh / 2
-
-        if shape[::-1] != new_unpad:
-            img = cv2.resize(frame, new_unpad, interpolation=cv2.INTER_LINEAR)
+        self.od_backend = self.make_backend(od_path, "od")
+        self.od_input_shape = tuple(self.od_backend.get_inputs()[0].shape[2:4])  # (h, w)
+        print(f"Detection input: {self.od_input_shape[1]}x{self.od_input_shape[0]} | {describe(self.profile['od'])}")
+        self.model_cache = {"seg": self.seg_backend.cache_status, "od": self.od_backend.cache_status}
+        print(f"Backend: seg {self.seg_backend.describe()} | od {self.od_backend.describe()} | "
+              f"profile: {self.profile.get('source', 'defaults')}")
+
+        if ROI_MODE:
+            print(f"ROI mode: rows {HORIZON_LINE*100:.0f}%..{HOOD_LINE*100:.0f}% of the frame")
+            if ROI_REPORT:
+                self.report_roi_savings()
+
+        # Every backend releases the GIL inside run(), so a worker thread is
+        # enough to get real parallelism between the two models.
+        concurrent = CONCURRENT_INFERENCE and not CASCADE_MODE
+        self.executor = ThreadPoolExecutor(max_workers=1) if concurrent else None
+        if CASCADE_MODE:
+            mode = f"cascade ({CASCADE_MODE})"
+            # Latency reference for the saved-time figure until the skipped model has run at least once
+            self.cascade_ref_ms = {"seg": self.time_session(self.seg_backend),
+                                   "od": self.time_session(self.od_backend)}
         else:
-            img = frame
-
-        top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
-        left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
-        img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+            threads = f"{self.profile['seg']['intra_op_threads']}+{self.profile['od']['intra_op_threads']}"
+            mode = f"concurrent ({threads} threads)" if concurrent else "sequential"
+        print(f"Inference mode: {mode}")
+
+    def make_backend(self, path, role):
+        return make_backend(BACKEND, path, role, self.profile[role], self.profile["providers"], MODEL_CACHE_DIR,
+                            IO_BINDING, self.device, SIMULATED_EXECUTE)
+
+    def time_session(self, backend, n_runs=10):
+        # Mean latency on a blank input of the backend's own shape and type
+        inp = backend.get_inputs()[0]
+        dtype = np.uint8 if inp.type == 'tensor(uint8)' else np.float32
+        shape = [d if isinstance(d, int) else 1 for d in inp.shape]
+        dummy = np.zeros(shape, dtype=dtype)
+        backend.run(dummy)  # warm-up
+        t_start = time.perf_counter()
+        for _ in range(n_runs):
+            backend.run(dummy)
+        return (time.perf_counter() - t_start) / n_runs * 1000
+
+    def warm_up(self, n_runs=WARMUP_RUNS):
+        """
+        Synthetic frames through the preprocessor and both backends, the same way
+        as run_models: kernel initialization, arena growth and thread pool start-up
+        happen here instead of on the first frames of the drive.
+        Returns the latency of the first and last warm-up frames in ms.
+        """
+        w = max(self.seg_input_size[0], self.od_input_shape[1])
+        h = max(self.seg_input_size[1], self.od_input_shape[0])
+        frame = np.random.default_rng(0).integers(0, 256, (h, w, 3), dtype=np.uint8)
+        y0, y1 = self.roi_rows(frame.shape)
+        times = []
+        for _ in range(n_runs):
+            t_start = time.perf_counter()
+            seg_in, od_in, _ = self.preprocessor.process(frame[y0:y1])
+            if self.executor is not None:
+                seg_future = self.executor.submit(self.seg_backend.run, seg_in)
+                self.od_backend.run(od_in)
+                seg_future.result()
+            else:
+                self.seg_backend.run(seg_in)
+                self.od_backend.run(od_in)
+            times.append((time.perf_counter() - t_start) * 1000)
+        return times[0], times[-1]
 
-        input_tensor = img.transpose((2, 0, 1))[::-1]
-        input_tensor = np.ascontiguousarray(input_tensor).astype(np.float32) / 255.0
-        input_tensor = input_tensor[None]
-        return input_tensor, (ratio, (dw, dh))
+    def report_roi_savings(self):
+        """
+        Pixel and latency savings of the band models against the full-frame models.
+        A full-frame model fed the band keeps its tensor size, so only band exports
+        save inference time.
+        """
+        band = HOOD_LINE - HORIZON_LINE
+        print(f"[roi] Source pixels processed: {band*100:.0f}% of the frame ({(1 - band)*100:.0f}% skipped)")
+        models = (("Seg", "seg", SEG_MODEL_PATH, ROI_SEG_MODEL_PATH, self.seg_backend),
+                  ("OD", "od", OD_MODEL_PATH, ROI_OD_MODEL_PATH, self.od_backend))
+        for name, role, full_path, band_path, band_backend in models:
+            inp = band_backend.get_inputs()[0]
+            band_hw = self.seg_input_hw(band_backend) if name == "Seg" else tuple(inp.shape[2:4])
+            band_ms = self.time_session(band_backend)
+            if band_path:
+                full_backend = self.make_backend(full_path, role)
+                full_hw = (self.seg_input_hw(full_backend) if name == "Seg"
+                           else tuple(full_backend.get_inputs()[0].shape[2:4]))
+                full_ms = self.time_session(full_backend)
+                full_backend.close()
+            else:
+                full_hw, full_ms = band_hw, band_ms
+            pixels = (band_hw[0] * band_hw[1]) / (full_hw[0] * full_hw[1])
+            print(f"[roi] {name}: input {full_hw[1]}x{full_hw[0]} -> {band_hw[1]}x{band_hw[0]} "
+                  f"({(1 - pixels)*100:.0f}% fewer pixels) | "
+                  f"{full_ms:.1f}ms -> {band_ms:.1f}ms ({(1 - band_ms / full_ms)*100:.0f}% saved)")
+            if not band_path:
+                print(f"[roi] {name}: no band export configured, same tensor size as the full frame")
+
+    def roi_rows(self, frame_shape):
+        """
+        (y0, y1) frame rows fed to the models: the guideline band in ROI mode, else the whole frame.
+        """
+        h = frame_shape[0]
+        if not ROI_MODE:
+            return 0, h
+        return int(h * HORIZON_LINE), int(h * HOOD_LINE)
 
     def postprocess_od(self, output, dwdh, ratio, orig_shape):
-        prediction = output[0][0]
-        predictions = np.transpose(prediction, (1, 0))
-
-        boxes, scores, class_ids = [], [], []
-        pred_boxes = predictions[:, :4]
-        pred_scores = predictions[:, 4:]
-        max_scores = np.max(pred_scores, axis=1)
-        max_ids = np.argmax(pred_scores, axis=1)
-
-        mask = max_scores >= CONF_THRESHOLD
-        filtered_boxes = pred_boxes[mask]
-        filtered_scores = max_scores[mask]
-        filtered_ids = max_ids[mask]
-
-        if len(filtered_boxes) == 0: return [], [], []
-
-        nms_boxes = []
-        for box in filtered_boxes:
-            cx, cy, w, h = box
-            nms_boxes.append([cx - w/2, cy - h/2, w, h])
-
-        indices = cv2.dnn.NMSBoxes(nms_boxes, filtered_scores.tolist(), CONF_THRESHOLD, IOU_THRESHOLD)
-
-        if len(indices) > 0:
-            pad_w, pad_h = dwdh
-            scale_w, scale_h = ratio
-            for i in indices.flatten():
-                x, y, w, h = nms_boxes[i]
-                x = (x - pad_w) / scale_w
-                y = (y - pad_h) / scale_h
-                w = w / scale_w
-                h = h / scale_h
-                x1 = max(0, int(x))
-                y1 = max(0, int(y))
-                x2 = min(orig_shape[1], int(x + w))
-                y2 = min(orig_shape[0], int(y + h))
-                boxes.append([x1, y1, x2, y2])
-                scores.append(filtered_scores[i])
-                class_ids.append(filtered_ids[i])
-        
-        return boxes, scores, class_ids
+        return postprocess_yolo(output, ratio, dwdh, orig_shape, CONF_THRESHOLD, IOU_THRESHOLD,
+                                top_k=NMS_TOP_K, max_det=MAX_DETECTIONS)
 
-    def check_road_overlap(self, box, road_mask):
-        x1, y1, x2, y2 = box
-        roi = road_mask[y1:y2, x1:x2]
-        if roi.size == 0: return 0.0, None
-        
-        intersection_mask = (roi == 1)
-        road_pixels = np.count_nonzero(intersection_mask)
-        total_pixels = roi.size
-        
-        return road_pixels / total_pixels, intersection_mask
+    def check_road_overlap(self, boxes, road):
+        """
+        Road overlap ratio of every box, from the integral image of the road
+        mask at model resolution (see fusion_engine.RoadOverlap).
+        """
+        return road.overlap_ratios(boxes)
+
+    def run_segmentation(self, seg_in, frame_shape, roi):
+        """
+        Segmentation branch: inference and argmax at model resolution.
+        Returns the road overlap engine for this frame and the wall time of the branch in ms.
+        `roi` = (y0, y1) frame rows the input was cropped to.
+        """
+        t_start = time.perf_counter()
+        seg_out = self.seg_backend.run(seg_in)
+        if self.seg_mask_model:
+            # A bound output buffer is overwritten by the next run, the road mask outlives it (cache, writer queue)
+            seg_map = seg_out[0][0].copy() if self.seg_backend.reuses_outputs else seg_out[0][0]
+        else:
+            seg_map = np.argmax(seg_out[0][0], axis=0).astype(np.uint8)
+        road = RoadOverlap(seg_map, frame_shape, band=roi)
+        return road, (time.perf_counter() - t_start) * 1000
+
+    def run_detection(self, od_in, od_params, frame_shape, roi):
+        """
+        Detection branch: inference and NMS.
+        Returns the detections (yolo_postprocess.DETECTION_DTYPE array) in full-frame
+        coordinates and the wall time of the branch in ms.
+        """
+        t_start = time.perf_counter()
+        w = frame_shape[1]
+        y0, y1 = roi
+        od_out = self.od_backend.run(od_in)
+        detections = self.postprocess_od(od_out, od_params[1], od_params[0], (y1 - y0, w))
+        if y0:
+            detections["box"][:, 1::2] += y0
+        return detections, (time.perf_counter() - t_start) * 1000
+
+    # --- PER-FRAME STEPS ---
+    # Each step takes and returns a frame "packet" (dict), so the same code
+    # runs in the synchronous loop and as a stage of the streaming pipeline.
+
+    def preprocess(self, packet):
+        # Both inputs from the same decoded frame, into reused buffers
+        y0, y1 = self.roi_rows(packet["frame"].shape)
+        packet["roi"] = (y0, y1)
+        band = packet["frame"][y0:y1]
+        run_seg = True
+        if self.scheduler is not None:
+            packet["seg_reason"] = self.scheduler.decide(scene_thumbnail(band), packet.get("heading"))
+            run_seg = packet["seg_reason"] is not None
+        packet["seg_in"], packet["od_in"], packet["od_params"] = self.preprocessor.process(band, seg=run_seg)
+        return packet
+
+    def reuse_road(self, packet):
+        """
+        Cached road mask of the last segmented frame, for frames the scheduler skipped.
+        """
+        staleness = packet["idx"] - self.cached_road_idx
+        if self.cached_road is None or staleness > SEG_EVERY_N:
+            # The frame scheduled for segmentation was dropped by the streaming pipeline
+            # (or skipped by the cascade)
+            self.scheduler.request_refresh()
+        if self.cached_road is None:
+            return self.empty_road(packet)
+        self.scheduler.record_reuse(staleness)
+        packet["mask_staleness"] = staleness
+        return self.cached_road
+
+    def empty_road(self, packet):
+        # No road anywhere: used when no mask has been computed yet
+        return RoadOverlap(np.zeros((1, 1), dtype=np.uint8), packet["frame"].shape, band=packet["roi"])
+
+    def run_cascade(self, packet, seg_in, od_in):
+        """
+        Sequential cascade, the first model can prove the frame alert-free:
+          od_first : no box above CONF_THRESHOLD -> no segmentation (no box can be on the road)
+          seg_first: road fraction of the guideline band under MIN_ROAD_FRACTION -> no detection
+        Returns (road, detections, seg_ms, od_ms), with None for the model that did not run.
+        """
+        shape, roi = packet["frame"].shape, packet["roi"]
+        seg_ms = od_ms = None
+        skipped = None
+        if CASCADE_MODE == "od_first":
+            detections, od_ms = self.run_detection(od_in, packet["od_params"], shape, roi)
+            if seg_in is None:
+                road = self.reuse_road(packet)
+            elif len(detections) == 0:
+                # Only drawn, never tested against boxes
+                road = self.cached_road if self.cached_road is not None else self.empty_road(packet)
+                skipped = "seg"
+            else:
+                road, seg_ms = self.run_segmentation(seg_in, shape, roi)
+        else:
+            if seg_in is None:
+                road = self.reuse_road(packet)
+            else:
+                road, seg_ms = self.run_segmentation(seg_in, shape, roi)
+            h = shape[0]
+            if road.road_fraction(int(h * HORIZON_LINE), int(h * HOOD_LINE)) < MIN_ROAD_FRACTION:
+                detections = empty_detections()
+                skipped = "od"
+            else:
+                detections, od_ms = self.run_detection(od_in, packet["od_params"], shape, roi)
+
+        self.record_cascade(seg_ms, od_ms, skipped)
+        packet["cascade_skip"] = skipped
+        return road, detections, seg_ms, od_ms
+
+    def record_cascade(self, seg_ms, od_ms, skipped):
+        c = self.cascade
+        c["frames"] += 1
+        if seg_ms is not None:
+            c["seg_n"] += 1
+            c["seg_ms"] += seg_ms
+        if od_ms is not None:
+            c["od_n"] += 1
+            c["od_ms"] += od_ms
+        if skipped:
+            # Saved time = running mean latency of the model that was skipped
+            n = c[f"{skipped}_n"]
+            c["skips"] += 1
+            c["saved_ms"] += c[f"{skipped}_ms"] / n if n else self.cascade_ref_ms[skipped]
+
+    def run_models(self, packet):
+        """
+        Runs both models on the same decoded frame.
+        In concurrent mode segmentation runs on the worker thread while detection
+        runs on the calling thread, and both are joined before the fusion step.
+        Frames without a segmentation input (skipped by the scheduler) reuse the cached road mask.
+        """
+        shape = packet["frame"].shape
+        roi = packet["roi"]
+        seg_in = packet.pop("seg_in")
+        od_in = packet.pop("od_in")
+        t_start = time.perf_counter()
+        if CASCADE_MODE:
+            road, detections, seg_ms, od_ms = self.run_cascade(packet, seg_in, od_in)
+        elif seg_in is None:
+            road, seg_ms = self.reuse_road(packet), None
+            detections, od_ms = self.run_detection(od_in, packet["od_params"], shape, roi)
+        elif self.executor is not None:
+            seg_future = self.executor.submit(self.run_segmentation, seg_in, shape, roi)
+            detections, od_ms = self.run_detection(od_in, packet["od_params"], shape, roi)
+            road, seg_ms = seg_future.result()
+        else:
+            road, seg_ms = self.run_segmentation(seg_in, shape, roi)
+            detections, od_ms = self.run_detection(od_in, packet["od_params"], shape, roi)
+        frame_ms = (time.perf_counter() - t_start) * 1000
+
+        if seg_ms is not None:
+            self.cached_road = road
+            self.cached_road_idx = packet["idx"]
+        both_ran = seg_ms is not None and od_ms is not None
+        seg_ms, od_ms = seg_ms or 0.0, od_ms or 0.0
+        self.record_timing(seg_ms, od_ms, frame_ms, both_ran=both_ran)
+        packet["road"] = road
+        packet["detections"] = detections
+        packet["timings"] = (seg_ms, od_ms, frame_ms)
+        return packet
+
+    def fuse(self, packet):
+        """
+        Road overlap of every box, alert decision (with cooldown) and logging.
+        """
+        road = packet["road"]
+        boxes = packet["detections"]["box"]
+
+        overlaps = self.check_road_overlap(boxes, road)
+        alert_triggered = bool(np.any(overlaps > ROAD_OVERLAP_THRESHOLD))
+
+        flagged = False
+        if alert_triggered:
+            # Check cooldown
+            if (time.time() - self.last_alert_time) > ALERT_COOLDOWN:
+                print(f"!!! FLAGGED FRAME: {os.path.basename(packet['name'])} !!!")
+                # The mask is packed (or upsampled for PNG) on the writer thread
+                self.log_flagged_frame(packet["name"], road)
+                self.last_alert_time = time.time()
+                flagged = True
+
+        packet["overlaps"] = overlaps
+        packet["alert"] = alert_triggered
+        packet["flagged"] = flagged
+        if self.startup.first_detection():
+            print(f"[startup] {self.startup.summary()}")
+        return packet
+
+    def process_frame(self, packet):
+        return self.fuse(self.run_models(self.preprocess(packet)))
+
+    def render(self, packet):
+        """
+        Draws guidelines, boxes, road overlay and timings. Returns the display frame.
+        """
+        frame = packet["frame"]
+        h, w = frame.shape[:2]
+        road = packet["road"]
+        boxes = packet["detections"]["box"].tolist()
+
+        # Guidelines
+        cv2.line(frame, (0, int(h * HORIZON_LINE)), (w, int(h * HORIZON_LINE)), (0, 255, 255), 1)
+        cv2.line(frame, (0, int(h * HOOD_LINE)), (w, int(h * HOOD_LINE)), (0, 0, 255), 2)
+
+        for box, overlap_ratio in zip(boxes, packet["overlaps"]):
+            if overlap_ratio > ROAD_OVERLAP_THRESHOLD:
+                color = self.color_road_obs
+                label = f"OBS: {overlap_ratio*100:.0f}%"
+
+                # Intersection Highlight
+                overlap_mask = road.box_mask(box)
+                roi_color = np.zeros((box[3]-box[1], box[2]-box[0], 3), dtype=np.uint8)
+                roi_color[overlap_mask] = self.color_intrsct 
+                frame_roi = frame[box[1]:box[3], box[0]:box[2]]
+                mask_bool = overlap_mask.astype(bool)
+                if mask_bool.any():
+                    frame_roi[mask_bool] = cv2.addWeighted(frame_roi[mask_bool], 0.5, roi_color[mask_bool], 0.5, 0)
+            else:
+                color = self.color_ignored
+                label = f"IGN: {overlap_ratio*100:.0f}%"
 
-    def draw_performance_bars(self, frame, seg_ms, od_ms):
+            cv2.rectangle(frame, (box[0], box[1]), (box[2], box[3]), color, 2)
+            cv2.putText(frame, label, (box[0], box[1]-5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
+
+        # Visual Indicator for flagged frames
+        if packet["flagged"]:
+            cv2.circle(frame, (30, 30), 15, (0, 0, 255), -1) 
+
+        # Overlay
+        color_mask = np.zeros_like(frame)
+        color_mask[road.full_mask() == 1] = [0, 255, 0]
+        frame = cv2.addWeighted(frame, 1.0, color_mask, 0.2, 0)
+
+        # Performance
+        self.draw_performance_bars(frame, *packet["timings"])
+        return frame
+
+    @staticmethod
+    def overlap_ratio(seg_ms, od_ms, frame_ms):
+        """
+        Fraction of the shorter model hidden behind the longer one.
+        1.0 means frame latency == max(seg, od), 0.0 means it is the sum of both.
+        """
+        shorter = min(seg_ms, od_ms)
+        if shorter <= 0: return 0.0
+        return max(0.0, min(1.0, (seg_ms + od_ms - frame_ms) / shorter))
+
+    def record_timing(self, seg_ms, od_ms, frame_ms, both_ran=True):
+        # Frames where only one model ran (cached mask, cascade short-circuit) are kept
+        # apart so that the seg/OD overlap figures only describe frames where both ran.
+        if both_ran:
+            self.perf["frames"] += 1
+            self.perf["seg_ms"] += seg_ms
+            self.perf["od_ms"] += od_ms
+            self.perf["frame_ms"] += frame_ms
+        else:
+            self.perf["single"] += 1
+            self.perf["single_frame_ms"] += frame_ms
+        n_total = self.perf["frames"] + self.perf["single"]
+        if PERF_REPORT_EVERY and n_total % PERF_REPORT_EVERY == 0:
+            self.print_perf_report()
+
+    def print_perf_report(self):
+        print(f"[startup] {self.startup.summary()}")
+        n = self.perf["frames"]
+        if n:
+            seg_ms = self.perf["seg_ms"] / n
+            od_ms = self.perf["od_ms"] / n
+            frame_ms = self.perf["frame_ms"] / n
+            overlap = self.overlap_ratio(seg_ms, od_ms, frame_ms)
+            print(f"[perf] {n} frames | Seg: {seg_ms:.1f}ms | OD: {od_ms:.1f}ms | "
+                  f"Frame: {frame_ms:.1f}ms (max: {max(seg_ms, od_ms):.1f}ms, sum: {seg_ms + od_ms:.1f}ms) | "
+                  f"Overlap: {overlap*100:.0f}%")
+        n_single = self.perf["single"]
+        if n_single:
+            print(f"[perf] {n_single} single-model frames | Frame: {self.perf['single_frame_ms'] / n_single:.1f}ms")
+        if self.scheduler is not None:
+            print(f"[sched] {self.scheduler.summary()}")
+        if self.device is not None:
+            print(f"[device] {self.device.summary()}")
+        c = self.cascade
+        if c["frames"]:
+            per_skip = c["saved_ms"] / c["skips"] if c["skips"] else 0.0
+            print(f"[cascade] {CASCADE_MODE}: {c['skips']}/{c['frames']} frames short-circuited "
+                  f"({c['skips'] / c['frames'] * 100:.0f}%) | saved {c['saved_ms'] / c['frames']:.1f}ms/frame "
+                  f"({per_skip:.1f}ms per skip)")
+
+    def draw_performance_bars(self, frame, seg_ms, od_ms, frame_ms=None):
         h, w = frame.shape[:2]
         bar_height = 8 
         max_width = 100
@@ -172,135 +574,142 @@ class FusionPipeline:
         cv2.putText(frame, f"OD: {od_ms:.0f}ms",  (start_x + max_width + 5, start_y_od + bar_height), 
                     cv2.FONT_HERSHEY_SIMPLEX, font_scale, (200, 200, 200), 1)
 
-    def log_flagged_frame(self, filename, seg_mask):
+        if frame_ms is not None:
+            overlap = self.overlap_ratio(seg_ms, od_ms, frame_ms)
+            cv2.putText(frame, f"Frame: {frame_ms:.0f}ms (overlap {overlap*100:.0f}%)", (start_x, start_y_seg - 8),
+                        cv2.FONT_HERSHEY_SIMPLEX, font_scale, (200, 200, 200), 1)
+
+    def log_flagged_frame(self, filename, road):
         """
-        Saves the mask and appends entry to the log file.
+        Queues the road mask and the log entry for the background writer.
         """
-        # 1. Save Mask
-        mask_filename = f"mask_{os.path.basename(filename)}"
-        save_path = os.path.join(MASK_OUTPUT_DIR, mask_filename)
-        # Scale mask (0/1) to (0/255) for visibility if needed, or keep raw
-        cv2.imwrite(save_path, seg_mask * 255) 
-        
-        # 2. Log to Text File
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open(LOG_FILE_PATH, "a") as f:
-            f.write(f"{filename}, {timestamp}, Flagged\n")
-            
-        print(f"-> Saved Flag info for {filename}")
+        if not self.writer.submit(filename, road):
+            print(f"⚠️ Flagged frame writer already closed: {filename} NOT saved")
+            return
+        print(f"-> Queued Flag info for {filename}")
 
-    def run(self):
-        if '*' in VIDEO_SOURCE:
-            from glob import glob
-            files = sorted(glob(VIDEO_SOURCE))
-            cap = None
-            print(f"Processing {len(files)} images at {TARGET_FPS} FPS...")
+    def decode_target_size(self, frame_shape):
+        """
+        Smallest size (w, h) a frame of this shape can be decoded at without either model
+        upsampling it: the segmentation resize needs its full input size, the letterbox only
+        the content it scales the frame to (a 2:1 frame fills 640x320 of a 640x640 input).
+        In ROI mode only the band reaches the models, so the frame needs proportionally more rows.
+        """
+        h, w = frame_shape[:2]
+        band = HOOD_LINE - HORIZON_LINE if ROI_MODE else 1.0
+        _, _, (od_w, od_h), _ = letterbox_params((h * band, w), self.od_input_shape)
+        need_w = max(self.seg_input_size[0], od_w)
+        need_h = max(self.seg_input_size[1], od_h)
+        return need_w, int(np.ceil(need_h / band))
+
+    def open_source(self, paced=False):
+        """
+        Frame packets from VIDEO_SOURCE (image glob, video file or camera index),
+        decoded on a background thread (see frame_source.py).
+        `paced` replays an image glob at TARGET_FPS, like a camera would deliver it.
+        """
+        self.frame_source = FrameSource(VIDEO_SOURCE, self.decode_target_size, READ_AHEAD,
+                                        paced_fps=TARGET_FPS if paced else None, reduced_decode=REDUCED_DECODE)
+        if self.frame_source.kind == "images":
+            print(f"Processing {len(self.frame_source)} images at {TARGET_FPS} FPS...")
         else:
-            cap = cv2.VideoCapture(VIDEO_SOURCE)
-            files = None
-            print("Processing video stream...")
-
-        idx = 0
-        wait_ms = int(1000 / TARGET_FPS)
+            print(f"Processing {self.frame_source.kind} stream...")
+        return self.frame_source
 
-        while True:
-            # Loop control for images
-            if not cap and idx >= len(files):
-                print("Finished processing all images.")
-                break
+    def start_source(self, paced=False):
+        """
+        Starts decoding, then warms the models up while the source thread opens
+        the camera/file and decodes the first frames.
+        """
+        source = self.open_source(paced).start()
+        self.startup.mark("source")
+        if WARMUP_RUNS:
+            first_ms, last_ms = self.warm_up()
+            self.startup.mark("warm-up", f"{WARMUP_RUNS} runs, {first_ms:.0f}ms -> {last_ms:.0f}ms")
+        return source
+
+    def show(self, frame, wait_ms):
+        cv2.imshow("Fusion ADAS Final Demo", frame)
+        # Press 'q' to quit early.
+        return cv2.waitKey(wait_ms) == ord('q')
 
-            # Read Frame
-            if cap:
-                ret, frame = cap.read()
-                if not ret: break
-                current_file = f"video_frame_{idx}.jpg"
+    def run(self):
+        # SIGTERM takes the same path as Ctrl+C, so the flagged frames still queued are written
+        signal.signal(signal.SIGTERM, raise_keyboard_interrupt)
+        self.frame_source = None
+        try:
+            if PIPELINE_MODE == "streaming":
+                self.run_streaming()
             else:
-                current_file = files[idx]
-                frame = cv2.imread(current_file)
-                idx += 1
-            
-            if frame is None: continue
-            
-            h, w = frame.shape[:2]
-            
-            # --- 1. SEGMENTATION ---
-            t_seg_start = time.time()
-            seg_in = self.preprocess_seg(frame)
-            seg_out = self.seg_sess.run(None, {self.seg_input_name: seg_in})
-            seg_map = np.argmax(seg_out[0][0], axis=0).astype(np.uint8)
-            seg_mask_full = cv2.resize(seg_map, (w, h), interpolation=cv2.INTER_NEAREST)
-            t_seg_end = time.time()
-
-            # --- 2. OBJECT DETECTION ---
-            t_od_start = time.time()
-            od_in, params = self.preprocess_od(frame)
-            od_out = self.od_sess.run([self.od_output_name], {self.od_input_name: od_in})
-            boxes, scores, classes = self.postprocess_od(od_out, params[1], params[0], (h, w))
-            t_od_end = time.time()
-
-            # --- 3. LOGIC & VISUALIZATION ---
-            alert_triggered = False
-            
-            # Guidelines
-            cv2.line(frame, (0, int(h * 0.40)), (w, int(h * 0.40)), (0, 255, 255), 1)
-            cv2.line(frame, (0, int(h * 0.85)), (w, int(h * 0.85)), (0, 0, 255), 2)
-            
-            for i, box in enumerate(boxes):
-                overlap_ratio, overlap_mask = self.check_road_overlap(box, seg_mask_full)
-                
-                if overlap_ratio > ROAD_OVERLAP_THRESHOLD:
-                    color = self.color_road_obs
-                    label = f"OBS: {overlap_ratio*100:.0f}%"
-                    alert_triggered = True
-                    
-                    # Intersection Highlight
-                    roi_color = np.zeros((box[3]-box[1], box[2]-box[0], 3), dtype=np.uint8)
-                    roi_color[overlap_mask] = self.color_intrsct 
-                    frame_roi = frame[box[1]:box[3], box[0]:box[2]]
-                    mask_bool = overlap_mask.astype(bool)
-                    if mask_bool.any():
-                        frame_roi[mask_bool] = cv2.addWeighted(frame_roi[mask_bool], 0.5, roi_color[mask_bool], 0.5, 0)
-                else:
-                    color = self.color_ignored
-                    label = f"IGN: {overlap_ratio*100:.0f}%"
-
-                cv2.rectangle(frame, (box[0], box[1]), (box[2], box[3]), color, 2)
-                cv2.putText(frame, label, (box[0], box[1]-5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, color, 1)
-
-            # --- 4. FLAGGING & SAVING LOGIC ---
-            if alert_triggered:
-                # Check cooldown
-                if (time.time() - self.last_alert_time) > ALERT_COOLDOWN:
-                    print(f"!!! FLAGGED FRAME: {os.path.basename(current_file)} !!!")
-                    
-                    # 1. Visual Indicator
-                    cv2.circle(frame, (30, 30), 15, (0, 0, 255), -1) 
-                    
-                    # 2. Log & Save Mask
-                    self.log_flagged_frame(current_file, seg_mask_full)
-                    
-                    self.last_alert_time = time.time()
-
-            # Overlay
-            color_mask = np.zeros_like(frame)
-            color_mask[seg_mask_full == 1] = [0, 255, 0]
-            frame = cv2.addWeighted(frame, 1.0, color_mask, 0.2, 0)
-
-            # Performance
-            seg_ms = (t_seg_end - t_seg_start) * 1000
-            od_ms  = (t_od_end - t_od_start) * 1000
-            self.draw_performance_bars(frame, seg_ms, od_ms)
-
-            cv2.imshow("Fusion ADAS Final Demo", frame)
-            
-            # --- AUTOMATIC 3 FPS ---
-            # Wait time in ms. Press 'q' to quit early.
-            if cv2.waitKey(wait_ms) == ord('q'):
+                self.run_sync()
+        except KeyboardInterrupt:
+            print("\nInterrupted, shutting down...")
+        finally:
+            try:
+                if self.frame_source is not None:
+                    self.frame_source.close()
+                if self.executor is not None:
+                    self.executor.shutdown()
+                cv2.destroyAllWindows()
+            finally:
+                # Drains the queued flagged frames even when the teardown above raises
+                # (destroyAllWindows() does on a headless OpenCV build)
+                self.writer.close()
+                self.print_perf_report()
+                if self.frame_source is not None:
+                    print(f"[source] {self.frame_source.summary()}")
+                self.writer.print_stats()
+
+    def run_sync(self):
+        # --- AUTOMATIC 3 FPS ---
+        # Wait time in ms between frames.
+        wait_ms = int(1000 / TARGET_FPS)
+        for packet in self.start_source():
+            packet = self.process_frame(packet)
+            if self.show(self.render(packet), wait_ms):
                 break
 
-        if cap: cap.release()
-        cv2.destroyAllWindows()
+    def run_streaming(self):
+        """
+        decode -> preprocess -> inference -> fusion -> sink (this thread).
+        Stages run on their own threads and are linked by bounded queues, so a
+        slow stage sheds frames (per OVERLOAD_POLICY) instead of building a backlog.
+        """
+        source = self.start_source(paced=True)
+
+        # The decode stage blocks on a full queue, so the backpressure reaches the
+        # frame source, which then skips frames before decoding them.
+        pipeline = StreamingPipeline(
+            ("decode", source),
+            [("preprocess", self.preprocess),
+             ("inference", self.run_models),
+             ("fusion", self.fuse)],
+            queue_size=QUEUE_SIZE,
+            policy=OVERLOAD_POLICY,
+            source_policy=BLOCK,
+        ).start()
+        print(f"Streaming pipeline started (queue size {QUEUE_SIZE}, policy {OVERLOAD_POLICY})")
+
+        n_sink = 0
+        try:
+            for packet in pipeline.results():
+                n_sink += 1
+                if self.show(self.render(packet), 1):
+                    break
+                if PERF_REPORT_EVERY and n_sink % PERF_REPORT_EVERY == 0:
+                    pipeline.print_stats()
+        finally:
+            # Unblocks the decode stage first, so stop() does not wait out its join timeout
+            source.close()
+            # No join timeout: a fusion call still running may flag a frame, which must be
+            # queued before run() closes the writer (the stages end once their current item is done)
+            pipeline.stop(timeout=None)
+            pipeline.print_stats()
+
+def raise_keyboard_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
 
 if __name__ == "__main__":
     pipeline = FusionPipeline()
-    pipeline.run()
\ No newline at end of file
+    pipeline.run()
@@ -0,0 +1,142 @@
+import cv2
+import numpy as np
+import os
+import zlib
+
+# Record encodings
+PACKBITS = "packbits"            # np.packbits, fixed size: h * w / 8 bytes
+PACKBITS_ZLIB = "packbits+zlib"  # the same bits, deflated (road masks are large uniform regions)
+
+INDEX_HEADER = "name,timestamp,offset,nbytes,encoding,mask_h,mask_w,frame_h,frame_w,y0,y1\n"
+
+
+def archive_paths(path):
+    # "results/flagged_masks" -> ("results/flagged_masks.bin", "results/flagged_masks.idx")
+    return path + ".bin", path + ".idx"
+
+
+class MaskArchiveWriter:
+    """
+    Append-only container for binary road masks, stored at model resolution.
+
+      <path>.bin : records back to back, one bit per mask pixel (optionally deflated)
+      <path>.idx : one CSV line per record (name, timestamp, offset, size, geometry)
+
+    The frame geometry (frame size and the ROI band rows) is kept in the index,
+    so a reader can rebuild the full-frame mask exactly like RoadOverlap.full_mask().
+    Both files are only ever appended to; an existing archive is continued
+    (append=False starts a new one instead).
+    """
+    def __init__(self, path, compress=True, level=1, append=True):
+        self.encoding = PACKBITS_ZLIB if compress else PACKBITS
+        self.level = level
+        bin_path, idx_path = archive_paths(path)
+        folder = os.path.dirname(bin_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        new_index = not append or not os.path.exists(idx_path)
+        self.data = open(bin_path, "ab" if append else "wb")
+        self.index = open(idx_path, "a" if append else "w")
+        if new_index:
+            self.index.write(INDEX_HEADER)
+        self.offset = self.data.tell()
+
+    def append(self, name, timestamp, mask, frame_shape=None, band=None):
+        """
+        mask: (h, w) bool/0-1 array at model resolution.
+        frame_shape: (h, w) of the camera frame (defaults to the mask size).
+        band: (y0, y1) frame rows covered by the mask (ROI mode), default all rows.
+        Returns the number of bytes written to the data file.
+        """
+        mask_h, mask_w = mask.shape[:2]
+        frame_h, frame_w = frame_shape[:2] if frame_shape is not None else (mask_h, mask_w)
+        y0, y1 = band if band is not None else (0, frame_h)
+
+        payload = np.packbits(mask.astype(bool, copy=False)).tobytes()
+        if self.encoding == PACKBITS_ZLIB:
+            payload = zlib.compress(payload, self.level)
+        self.data.write(payload)
+        # Names come from file paths: keep the CSV parseable
+        safe_name = str(name).replace(",", "_")
+        self.index.write(f"{safe_name},{timestamp},{self.offset},{len(payload)},{self.encoding},"
+                         f"{mask_h},{mask_w},{frame_h},{frame_w},{y0},{y1}\n")
+        self.offset += len(payload)
+        return len(payload)
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+    def fsync(self):
+        self.flush()
+        os.fsync(self.data.fileno())
+        os.fsync(self.index.fileno())
+
+    def close(self):
+        self.flush()
+        self.data.close()
+        self.index.close()
+
+
+class MaskArchiveReader:
+    """
+    Random access to the masks of an archive. The data file is memory-mapped,
+    so opening a drive's archive costs one index parse and nothing else; a mask
+    is only decoded when asked for.
+
+        reader = MaskArchiveReader("massyl/results/flagged_masks")
+        mask = reader["frame_000123.png"]   # or reader[i], (mask_h, mask_w) uint8 0/1
+        full = reader.full_mask(i)          # (frame_h, frame_w) uint8 0/1
+    """
+    def __init__(self, path):
+        bin_path, idx_path = archive_paths(path)
+        self.records = []
+        with open(idx_path) as f:
+            next(f)  # header
+            for line in f:
+                if not line.strip():
+                    continue
+                name, timestamp, offset, nbytes, encoding, *dims = line.rstrip("\n").split(",")
+                self.records.append((name, timestamp, int(offset), int(nbytes), encoding, *map(int, dims)))
+        self.by_name = {r[0]: i for i, r in enumerate(self.records)}
+        size = os.path.getsize(bin_path)
+        self.data = np.memmap(bin_path, dtype=np.uint8, mode="r") if size else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.records)
+
+    def names(self):
+        return [r[0] for r in self.records]
+
+    def timestamps(self):
+        return [r[1] for r in self.records]
+
+    def _record(self, key):
+        return self.records[self.by_name[key] if isinstance(key, str) else key]
+
+    def geometry(self, key):
+        """
+        (frame_h, frame_w, y0, y1) of a record: frame size and the rows covered by the mask.
+        """
+        return self._record(key)[7:]
+
+    def __getitem__(self, key):
+        _, _, offset, nbytes, encoding, mask_h, mask_w = self._record(key)[:7]
+        payload = self.data[offset:offset + nbytes]
+        if encoding == PACKBITS_ZLIB:
+            payload = np.frombuffer(zlib.decompress(payload), dtype=np.uint8)
+        return np.unpackbits(payload, count=mask_h * mask_w).reshape(mask_h, mask_w)
+
+    def full_mask(self, key):
+        """
+        Mask upsampled to the frame size, with the rows outside the ROI band at 0.
+        """
+        mask = self[key]
+        frame_h, frame_w, y0, y1 = self.geometry(key)
+        full = np.zeros((frame_h, frame_w), dtype=np.uint8)
+        cv2.resize(mask, (frame_w, y1 - y0), dst=full[y0:y1], interpolation=cv2.INTER_NEAREST)
+        return full
+
+    def close(self):
+        # Drop the mapping (needed on Windows before the file can be appended to again)
+        self.data = None
@@ -0,0 +1,282 @@
+import cv2
+import numpy as np
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob
+import main_embeded_obstacle_delection as online
+from fusion_engine import RoadOverlap
+from flagged_writer import FlaggedFrameWriter
+from frame_source import FrameSource
+from mask_archive import MaskArchiveWriter, MaskArchiveReader
+from preprocess_engine import FramePreprocessor
+from session_config import create_session
+from yolo_postprocess import postprocess_yolo
+
+# --- CONFIGURATION ---
+# Headless re-processing of an archived drive. Thresholds, ROI mode and the
+# outputs (flagged frame log + masks) are the ones of main_embeded_obstacle_delection.py.
+SOURCE = online.VIDEO_SOURCE  # Image glob, frames sorted by name = time order
+# Models exported with a dynamic batch axis (export_stdc.py --dynamic_batch, export_yolo.py DYNAMIC_BATCH = True).
+# None = the model FusionPipeline loads; a batch-1 model is then run frame by frame.
+BATCH_SEG_MODEL_PATH = None   # e.g. "massyl/seg_models/stdc813m_maxmiou_4_mask_batch.onnx"
+BATCH_OD_MODEL_PATH  = None   # e.g. "massyl/od_models/yolov8s_best_2_batch.onnx"
+OD_INPUT_SHAPE = (320, 640)   # (h, w) for a detector exported with dynamic height/width (Ultralytics dynamic=True)
+
+# Execution Settings
+BATCH_SIZE = 4                # Frames per session call. Full-resolution frames already fill the caches on CPU:
+                              # compare with 1 on the target before raising it (the cores come from N_WORKERS)
+THREADS_PER_WORKER = 1        # Intra-op threads of each worker's sessions (and OpenCV threads)
+N_WORKERS = max(1, (os.cpu_count() or 1) // THREADS_PER_WORKER)
+SHARDS_PER_WORKER = 4         # The file list is cut in N_WORKERS * SHARDS_PER_WORKER contiguous shards
+
+# Frames were recorded at TARGET_FPS: frame index / TARGET_FPS is the clock of the alert cooldown
+FRAME_PERIOD = 1.0 / online.TARGET_FPS
+
+
+def model_path(batch_path, path, roi_path):
+    if batch_path:
+        return batch_path
+    return roi_path if online.ROI_MODE and roi_path else path
+
+
+class BatchWorker:
+    """
+    Per-process state, built once by the pool initializer and reused for every shard:
+    both sessions, the preprocessor and the (BATCH_SIZE, ...) input tensors.
+
+    Attribute names follow FusionPipeline so that its roi_rows() and
+    decode_target_size() give the same band and decode size as online mode.
+    """
+    def __init__(self):
+        cv2.setNumThreads(THREADS_PER_WORKER)
+        settings = {"intra_op_threads": THREADS_PER_WORKER}
+        providers = ['CPUExecutionProvider']
+
+        seg_path = model_path(BATCH_SEG_MODEL_PATH, online.SEG_MODEL_PATH, online.ROI_SEG_MODEL_PATH)
+        self.seg_sess = create_session(seg_path, settings, providers)
+        seg_inp = self.seg_sess.get_inputs()[0]
+        self.seg_mask_model = seg_inp.type == 'tensor(uint8)'
+        seg_h, seg_w = online.FusionPipeline.seg_input_hw(self.seg_sess)
+        self.seg_input_size = (seg_w, seg_h)
+
+        od_path = model_path(BATCH_OD_MODEL_PATH, online.OD_MODEL_PATH, online.ROI_OD_MODEL_PATH)
+        self.od_sess = create_session(od_path, settings, providers)
+        od_inp = self.od_sess.get_inputs()[0]
+        od_hw = od_inp.shape[2:4]
+        self.od_input_shape = tuple(od_hw) if all(isinstance(d, int) for d in od_hw) else OD_INPUT_SHAPE
+        self.od_output_name = self.od_sess.get_outputs()[0].name
+
+        # A fixed first dimension (batch-1 export) means one call per frame
+        self.seg_batched = not isinstance(seg_inp.shape[0], int)
+        self.od_batched = not isinstance(od_inp.shape[0], int)
+
+        self.preprocessor = FramePreprocessor(self.seg_input_size, self.od_input_shape, seg_uint8=self.seg_mask_model)
+        if self.seg_mask_model:
+            self.seg_batch = np.empty((BATCH_SIZE, seg_h, seg_w, 3), dtype=np.uint8)
+        else:
+            self.seg_batch = np.empty((BATCH_SIZE, 3, seg_h, seg_w), dtype=np.float32)
+        self.od_batch = np.empty((BATCH_SIZE, 3, *self.od_input_shape), dtype=np.float32)
+
+    def decode_target_size(self, frame_shape):
+        return online.FusionPipeline.decode_target_size(self, frame_shape)
+
+    def infer(self, sess, batch, n, batched, output_names=None):
+        name = sess.get_inputs()[0].name
+        if batched:
+            return sess.run(output_names, {name: batch[:n]})[0]
+        return np.concatenate([sess.run(output_names, {name: batch[i:i + 1]})[0] for i in range(n)])
+
+    def process_batch(self, packets, offset, archive, alerts, timing):
+        """
+        Preprocesses the packets into the batch tensors, runs each model once on
+        the batch and applies the online decision (before the cooldown) per frame.
+        Alert frames get their mask appended to the shard archive.
+        """
+        n = len(packets)
+        geometry = []
+        for i, packet in enumerate(packets):
+            frame = packet["frame"]
+            y0, y1 = online.FusionPipeline.roi_rows(self, frame.shape)
+            band = frame[y0:y1]
+            self.preprocessor.process_seg(band, self.seg_batch[i:i + 1])
+            _, od_params = self.preprocessor.process_od(band, self.od_batch[i:i + 1])
+            geometry.append(((y0, y1), od_params))
+
+        t0 = time.perf_counter()
+        seg_out = self.infer(self.seg_sess, self.seg_batch, n, self.seg_batched)
+        t1 = time.perf_counter()
+        od_out = self.infer(self.od_sess, self.od_batch, n, self.od_batched, [self.od_output_name])
+        t2 = time.perf_counter()
+        timing["seg_s"] += t1 - t0
+        timing["od_s"] += t2 - t1
+
+        for i, (packet, ((y0, y1), (ratio, dwdh))) in enumerate(zip(packets, geometry)):
+            shape = packet["frame"].shape
+            seg_map = seg_out[i] if self.seg_mask_model else np.argmax(seg_out[i], axis=0).astype(np.uint8)
+            road = RoadOverlap(seg_map, shape, band=(y0, y1))
+            detections = postprocess_yolo((od_out[i:i + 1],), ratio, dwdh, (y1 - y0, shape[1]),
+                                          online.CONF_THRESHOLD, online.IOU_THRESHOLD,
+                                          top_k=online.NMS_TOP_K, max_det=online.MAX_DETECTIONS)
+            if y0:
+                detections["box"][:, 1::2] += y0
+            if np.any(road.overlap_ratios(detections["box"]) > online.ROAD_OVERLAP_THRESHOLD):
+                idx = offset + packet["idx"]
+                archive.append(packet["name"], f"{idx * FRAME_PERIOD:.3f}", seg_map == road.road_class,
+                               shape, (y0, y1))
+                alerts.append((idx, packet["name"], len(alerts)))
+
+    def run_shard(self, shard_id, offset, files, tmp_dir):
+        """
+        Decodes (read-ahead thread) and processes one contiguous slice of the file list.
+        Returns the shard stats and its alert frames: (global index, name, record in the shard archive).
+        """
+        t_start = time.perf_counter()
+        archive_path = os.path.join(tmp_dir, f"shard_{shard_id:05d}")
+        archive = MaskArchiveWriter(archive_path)
+        source = FrameSource(files, self.decode_target_size, read_ahead=2 * BATCH_SIZE,
+                             reduced_decode=online.REDUCED_DECODE)
+        alerts = []
+        timing = {"seg_s": 0.0, "od_s": 0.0}
+        packets = []
+        try:
+            for packet in source:
+                packets.append(packet)
+                if len(packets) == BATCH_SIZE:
+                    self.process_batch(packets, offset, archive, alerts, timing)
+                    packets = []
+            if packets:
+                self.process_batch(packets, offset, archive, alerts, timing)
+        finally:
+            source.close()
+            archive.close()
+        stats = source.stats()
+        return {
+            "shard": shard_id,
+            "pid": os.getpid(),
+            "frames": stats["decoded"],
+            "busy_s": time.perf_counter() - t_start,
+            "seg_s": timing["seg_s"],
+            "od_s": timing["od_s"],
+            "decode_s": stats["decode_ms_avg"] * stats["decoded"] / 1000,
+            "batched": (self.seg_batched, self.od_batched),
+            "archive": archive_path,
+            "alerts": alerts,
+        }
+
+
+worker_state = None
+
+
+def init_worker():
+    global worker_state
+    worker_state = BatchWorker()
+
+
+def run_shard(shard_id, offset, files, tmp_dir):
+    return worker_state.run_shard(shard_id, offset, files, tmp_dir)
+
+
+def make_shards(files, n_shards):
+    """
+    Contiguous (offset, files) slices, each a multiple of BATCH_SIZE frames (except the last).
+    """
+    size = -(-len(files) // n_shards)
+    size = max(BATCH_SIZE, -(-size // BATCH_SIZE) * BATCH_SIZE)
+    return [(start, files[start:start + size]) for start in range(0, len(files), size)]
+
+
+def write_flagged(results):
+    """
+    Cooldown over the alert frames of all shards in frame order, then the same
+    writer as online mode: flagged frame log + masks in MASK_OUTPUT_DIR.
+    """
+    candidates = sorted((idx, name, r["archive"], record) for r in results for idx, name, record in r["alerts"])
+    writer = FlaggedFrameWriter(online.MASK_OUTPUT_DIR, online.LOG_FILE_PATH, online.WRITER_QUEUE_SIZE,
+                                online.FSYNC_INTERVAL, mask_format=online.MASK_FORMAT)
+    writer.start()
+    readers = {}
+    last_alert_t = -np.inf
+    flagged = 0
+    try:
+        for idx, name, archive_path, record in candidates:
+            t = idx * FRAME_PERIOD
+            if t - last_alert_t <= online.ALERT_COOLDOWN:
+                continue
+            if archive_path not in readers:
+                readers[archive_path] = MaskArchiveReader(archive_path)
+            reader = readers[archive_path]
+            frame_h, frame_w, y0, y1 = reader.geometry(record)
+            road = RoadOverlap(reader[record], (frame_h, frame_w), band=(y0, y1))
+            print(f"!!! FLAGGED FRAME: {os.path.basename(name)} !!!")
+            writer.submit(name, road)
+            last_alert_t = t
+            flagged += 1
+    finally:
+        writer.close()
+        for reader in readers.values():
+            reader.close()
+    writer.print_stats()
+    return len(candidates), flagged
+
+
+def print_report(results, wall_s, n_alerts, n_flagged):
+    workers = {}
+    for r in results:
+        w = workers.setdefault(r["pid"], {"shards": 0, "frames": 0, "busy_s": 0.0, "seg_s": 0.0, "od_s": 0.0,
+                                          "decode_s": 0.0})
+        w["shards"] += 1
+        for key in ("frames", "busy_s", "seg_s", "od_s", "decode_s"):
+            w[key] += r[key]
+
+    seg_batched, od_batched = results[0]["batched"]
+    print("=" * 92)
+    print(f"Offline batch: {N_WORKERS} workers x {THREADS_PER_WORKER} thread(s), batch {BATCH_SIZE} "
+          f"(seg {'batched' if seg_batched else 'per frame'}, od {'batched' if od_batched else 'per frame'})")
+    print(f"{'worker':>8}{'shards':>8}{'frames':>8}{'busy s':>9}{'FPS':>8}"
+          f"{'seg ms/frame':>14}{'od ms/frame':>13}{'decode ms/frame':>17}")
+    for i, pid in enumerate(sorted(workers)):
+        w = workers[pid]
+        n = max(w["frames"], 1)
+        print(f"{i:>8}{w['shards']:>8}{w['frames']:>8}{w['busy_s']:>9.1f}{w['frames'] / w['busy_s']:>8.1f}"
+              f"{w['seg_s'] / n * 1000:>14.1f}{w['od_s'] / n * 1000:>13.1f}{w['decode_s'] / n * 1000:>17.1f}")
+    total = sum(w["frames"] for w in workers.values())
+    print("=" * 92)
+    print(f"[batch] {total} frames in {wall_s:.1f}s -> {total / wall_s:.1f} FPS aggregate "
+          f"(x{total / wall_s / online.TARGET_FPS:.0f} the {online.TARGET_FPS} FPS of online mode) | "
+          f"{n_alerts} alert frames, {n_flagged} flagged after the {online.ALERT_COOLDOWN:.0f}s cooldown")
+
+
+def main():
+    files = sorted(glob(SOURCE))
+    if not files:
+        print(f"⚠️ No frames match {SOURCE}")
+        return
+    shards = make_shards(files, N_WORKERS * SHARDS_PER_WORKER)
+    print(f"Processing {len(files)} images in {len(shards)} shards on {N_WORKERS} worker processes...")
+
+    # Per-shard mask archives of the alert frames, until the cooldown is applied in frame order
+    results_dir = os.path.dirname(online.MASK_OUTPUT_DIR) or "."
+    os.makedirs(results_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix="offline_batch_", dir=results_dir)
+    results = []
+    try:
+        t_start = time.perf_counter()
+        with ProcessPoolExecutor(N_WORKERS, initializer=init_worker) as pool:
+            futures = [pool.submit(run_shard, i, offset, chunk, tmp_dir) for i, (offset, chunk) in enumerate(shards)]
+            for future in as_completed(futures):
+                r = future.result()
+                results.append(r)
+                print(f"  shard {r['shard']} done: {r['frames']} frames, {len(r['alerts'])} alerts "
+                      f"({len(results)}/{len(shards)})")
+        wall_s = time.perf_counter() - t_start
+        n_alerts, n_flagged = write_flagged(results)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    print_report(results, wall_s, n_alerts, n_flagged)
+
+
+if __name__ == "__main__":
+    main()
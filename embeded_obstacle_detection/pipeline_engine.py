@@ -0,0 +1,267 @@
+import threading
+import time
+from collections import deque
+
+# Overload policies for the inter-stage queues
+DROP_OLDEST = "drop_oldest"  # Evict the stalest queued item, keep the new one (lowest latency)
+DROP_NEWEST = "drop_newest"  # Reject the incoming item, keep what is queued
+BLOCK       = "block"        # Wait for room (no loss, but backpressure reaches the camera)
+POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+# End-of-stream marker passed from stage to stage
+STOP = object()
+
+
+class BoundedQueue:
+    """
+    Small FIFO between two stages with an explicit overload policy.
+    Keeps counters (puts, drops, high water mark, time-weighted occupancy)
+    so the bottleneck of the pipeline can be read off the stats.
+    """
+    def __init__(self, name, maxsize=2, policy=DROP_OLDEST):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overload policy '{policy}', expected one of {POLICIES}")
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self.policy = policy
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+
+        # Counters
+        self.puts = 0
+        self.gets = 0
+        self.dropped = 0
+        self.high_water = 0
+        self.blocked_s = 0.0
+        self.t_start = time.perf_counter()
+        self.t_last = self.t_start
+        self.depth_area = 0.0  # Integral of depth over time
+
+    def _account(self):
+        now = time.perf_counter()
+        self.depth_area += len(self.items) * (now - self.t_last)
+        self.t_last = now
+
+    def put(self, item, stop_event=None):
+        """
+        Returns True if the item was queued, False if it was dropped.
+        """
+        with self.cond:
+            if self.closed:
+                return False
+            if len(self.items) >= self.maxsize:
+                if self.policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                if self.policy == DROP_OLDEST:
+                    self._account()
+                    self.items.popleft()
+                    self.dropped += 1
+                else:
+                    t_wait = time.perf_counter()
+                    while len(self.items) >= self.maxsize and not self.closed:
+                        if stop_event is not None and stop_event.is_set():
+                            return False
+                        self.cond.wait(0.1)
+                    self.blocked_s += time.perf_counter() - t_wait
+                    if self.closed:
+                        return False
+
+            self._account()
+            self.items.append(item)
+            self.puts += 1
+            self.high_water = max(self.high_water, len(self.items))
+            self.cond.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """
+        Returns the next item, STOP once the queue is closed and empty,
+        or None on timeout.
+        """
+        with self.cond:
+            deadline = None if timeout is None else time.perf_counter() + timeout
+            while not self.items:
+                if self.closed:
+                    return STOP
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+
+            self._account()
+            item = self.items.popleft()
+            self.gets += 1
+            self.cond.notify_all()
+            return item
+
+    def full(self):
+        with self.cond:
+            return len(self.items) >= self.maxsize
+
+    def close(self):
+        # Items already queued are still delivered, then consumers get STOP
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            self._account()
+            elapsed = max(1e-9, self.t_last - self.t_start)
+            return {
+                "depth": len(self.items),
+                "maxsize": self.maxsize,
+                "policy": self.policy,
+                "puts": self.puts,
+                "gets": self.gets,
+                "dropped": self.dropped,
+                "high_water": self.high_water,
+                "occupancy": self.depth_area / (elapsed * self.maxsize),
+                "blocked_s": self.blocked_s,
+            }
+
+
+class Stage(threading.Thread):
+    """
+    Worker thread: takes an item from `inq`, applies `fn`, pushes the result
+    to `outq`. If `fn` returns None the item is consumed (filtered out).
+    A stage without `inq` is a source: `fn` is then an iterable of items.
+    """
+    def __init__(self, name, fn, inq, outq, stop_event):
+        super().__init__(name=f"stage-{name}", daemon=True)
+        self.stage_name = name
+        self.fn = fn
+        self.inq = inq
+        self.outq = outq
+        self.stop_event = stop_event
+        self.processed = 0
+        self.busy_s = 0.0
+        self.error = None
+        self.t_start = None
+
+    def run(self):
+        self.t_start = time.perf_counter()
+        try:
+            if self.inq is None:
+                self.run_source()
+            else:
+                self.run_worker()
+        except Exception as e:
+            self.error = e
+            print(f"Stage '{self.stage_name}' failed: {e}")
+            self.stop_event.set()
+        finally:
+            self.outq.close()
+
+    def run_source(self):
+        iterator = iter(self.fn)
+        while not self.stop_event.is_set():
+            t0 = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                break
+            self.busy_s += time.perf_counter() - t0
+            self.processed += 1
+            self.outq.put(item, self.stop_event)
+
+    def run_worker(self):
+        while not self.stop_event.is_set():
+            item = self.inq.get(timeout=0.1)
+            if item is None:
+                continue
+            if item is STOP:
+                break
+            t0 = time.perf_counter()
+            result = self.fn(item)
+            self.busy_s += time.perf_counter() - t0
+            self.processed += 1
+            if result is not None:
+                self.outq.put(result, self.stop_event)
+
+    def stats(self):
+        elapsed = max(1e-9, time.perf_counter() - (self.t_start or time.perf_counter()))
+        return {
+            "processed": self.processed,
+            "busy": self.busy_s / elapsed,
+            "avg_ms": (self.busy_s / self.processed * 1000) if self.processed else 0.0,
+        }
+
+
+class StreamingPipeline:
+    """
+    Chain of stages connected by bounded queues:
+
+        source -> q -> stage_1 -> q -> ... -> stage_n -> q -> consumer (caller thread)
+
+    The last queue is drained by the caller through `results()`, so that
+    GUI calls (imshow / waitKey) stay on the main thread.
+    """
+    def __init__(self, source, stages, queue_size=2, policy=DROP_OLDEST, source_policy=None):
+        """
+        source: (name, iterable)
+        stages: list of (name, fn)
+        source_policy: policy of the source's output queue (default: `policy`). BLOCK lets a
+                       source that drops on its own (frame_source.FrameSource) see the backpressure
+                       and skip frames before decoding them.
+        """
+        self.stop_event = threading.Event()
+        self.queues = []
+        self.stages = []
+
+        src_name, src_iter = source
+        outq = BoundedQueue(f"{src_name}->", queue_size, source_policy or policy)
+        self.queues.append(outq)
+        self.stages.append(Stage(src_name, src_iter, None, outq, self.stop_event))
+
+        for name, fn in stages:
+            inq = outq
+            outq = BoundedQueue(f"{name}->", queue_size, policy)
+            self.queues.append(outq)
+            self.stages.append(Stage(name, fn, inq, outq, self.stop_event))
+
+        self.output = outq
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def results(self):
+        """
+        Yields finished items until the source is exhausted or stop() is called.
+        """
+        while not self.stop_event.is_set():
+            item = self.output.get(timeout=0.1)
+            if item is None:
+                continue
+            if item is STOP:
+                break
+            yield item
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        for q in self.queues:
+            q.close()
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def stats(self):
+        """
+        Per stage: work counters plus the depth/occupancy of its output queue.
+        A stage whose input queue sits near 100% occupancy is the bottleneck.
+        """
+        report = {}
+        for stage, q in zip(self.stages, self.queues):
+            report[stage.stage_name] = {**stage.stats(), "out_queue": q.stats()}
+        return report
+
+    def print_stats(self):
+        print("[pipeline] stage        done   busy   avg_ms | out_q depth  hw  occ%  dropped  blocked_s")
+        for name, s in self.stats().items():
+            q = s["out_queue"]
+            print(f"[pipeline] {name:<11} {s['processed']:>5} {s['busy']*100:>5.0f}% {s['avg_ms']:>8.1f} | "
+                  f"{q['depth']:>5}/{q['maxsize']:<2} {q['high_water']:>3} {q['occupancy']*100:>5.0f} "
+                  f"{q['dropped']:>8} {q['blocked_s']:>10.2f}")
@@ -0,0 +1,215 @@
+import cv2
+import numpy as np
+
+# ImageNet statistics used to train STDC (RGB order)
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD  = (0.229, 0.224, 0.225)
+LETTERBOX_COLOR = 114
+
+
+def letterbox_params(frame_shape, new_shape):
+    """
+    Same geometry as Ultralytics' letterbox.
+    frame_shape: (h, w), new_shape: (h, w)
+    Returns (ratio, (dw, dh), new_unpad (w, h), (top, bottom, left, right)).
+    """
+    shape = frame_shape[:2]
+    r = min(new_shape[0] / shape[0], new_shape[1] / shape[1])
+    ratio = r, r
+    new_unpad = int(round(shape[1] * r)), int(round(shape[0] * r))
+    dw, dh = new_shape[1] - new_unpad[0], new_shape[0] - new_unpad[1]
+    dw, dh = dw / 2, dh / 2
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    return ratio, (dw, dh), new_unpad, (top, bottom, left, right)
+
+
+def make_lut(mean, std):
+    """
+    uint8 -> normalized float32 lookup table, one column per BGR channel.
+    mean/std are given in RGB order like torchvision.
+    """
+    values = np.arange(256, dtype=np.float32) / 255.0
+    lut = np.empty((1, 256, 3), dtype=np.float32)
+    for c_bgr in range(3):
+        c_rgb = 2 - c_bgr
+        lut[0, :, c_bgr] = (values - mean[c_rgb]) / std[c_rgb]
+    return lut
+
+
+class FramePreprocessor:
+    """
+    Builds both model inputs from one decoded BGR frame:
+
+      seg: resize -> LUT(BGR uint8 -> ImageNet-normalized float) -> RGB CHW
+      od : letterbox into a persistent grey canvas -> LUT(/255) -> RGB CHW
+
+    With seg_uint8=True (segmentation exported with in-graph normalization, see
+    export_stdc.py --mode mask) the seg input is just the resized uint8 BGR frame, NHWC.
+
+    Every intermediate and output array is allocated once and reused, so the
+    steady state does no large allocation per frame. Output tensors come from a
+    ring of `n_buffers` sets, so a tensor is not overwritten while a previous
+    frame is still queued for inference (streaming mode needs queue_size + 2).
+    """
+    def __init__(self, seg_size=(1024, 512), od_shape=(640, 640), n_buffers=1, seg_uint8=False):
+        """
+        seg_size: (w, h) like cv2.resize, od_shape: (h, w) like the YOLO input
+        """
+        self.seg_w, self.seg_h = seg_size
+        self.seg_uint8 = seg_uint8
+        self.od_h, self.od_w = od_shape
+        self.n_buffers = max(1, n_buffers)
+        self.slot = 0
+
+        # Lookup tables
+        self.seg_lut = make_lut(IMAGENET_MEAN, IMAGENET_STD)
+        self.od_lut = make_lut((0.0, 0.0, 0.0), (1.0, 1.0, 1.0))
+
+        # Scratch buffers (only used inside process())
+        self.seg_resized = np.empty((self.seg_h, self.seg_w, 3), dtype=np.uint8)
+        self.seg_hwc = np.empty((self.seg_h, self.seg_w, 3), dtype=np.float32)
+        self.od_canvas = np.full((self.od_h, self.od_w, 3), LETTERBOX_COLOR, dtype=np.uint8)
+        self.od_hwc = np.empty((self.od_h, self.od_w, 3), dtype=np.float32)
+
+        # Output tensors (ring)
+        if seg_uint8:
+            self.seg_tensors = [np.empty((1, self.seg_h, self.seg_w, 3), dtype=np.uint8)
+                                for _ in range(self.n_buffers)]
+        else:
+            self.seg_tensors = [np.empty((1, 3, self.seg_h, self.seg_w), dtype=np.float32)
+                                for _ in range(self.n_buffers)]
+        self.od_tensors = [np.empty((1, 3, self.od_h, self.od_w), dtype=np.float32)
+                           for _ in range(self.n_buffers)]
+
+        # Letterbox geometry, recomputed only when the frame size changes
+        self.frame_shape = None
+        self.od_params = None
+        self.od_view = None
+
+    def update_geometry(self, frame_shape):
+        ratio, dwdh, new_unpad, (top, bottom, left, right) = letterbox_params(frame_shape, (self.od_h, self.od_w))
+        self.od_canvas[:] = LETTERBOX_COLOR
+        self.od_view = self.od_canvas[top:top + new_unpad[1], left:left + new_unpad[0]]
+        self.od_params = (ratio, dwdh)
+        self.frame_shape = frame_shape[:2]
+
+    def process_seg(self, frame, out):
+        if self.seg_uint8:
+            # Normalization happens inside the model
+            cv2.resize(frame, (self.seg_w, self.seg_h), dst=out[0])
+            return out
+        cv2.resize(frame, (self.seg_w, self.seg_h), dst=self.seg_resized)
+        cv2.LUT(self.seg_resized, self.seg_lut, dst=self.seg_hwc)
+        # HWC (BGR) -> CHW (RGB), written straight into the input tensor
+        np.copyto(out[0], self.seg_hwc[:, :, ::-1].transpose(2, 0, 1))
+        return out
+
+    def process_od(self, frame, out):
+        if self.frame_shape != frame.shape[:2]:
+            self.update_geometry(frame.shape)
+        cv2.resize(frame, (self.od_view.shape[1], self.od_view.shape[0]), dst=self.od_view,
+                   interpolation=cv2.INTER_LINEAR)
+        cv2.LUT(self.od_canvas, self.od_lut, dst=self.od_hwc)
+        np.copyto(out[0], self.od_hwc[:, :, ::-1].transpose(2, 0, 1))
+        return out, self.od_params
+
+    def process(self, frame, seg=True):
+        """
+        Returns (seg_tensor, od_tensor, (ratio, (dw, dh))).
+        seg=False skips the segmentation input (seg_tensor is None), e.g. when the cached mask is reused.
+        """
+        slot = self.slot
+        self.slot = (self.slot + 1) % self.n_buffers
+        seg_tensor = self.process_seg(frame, self.seg_tensors[slot]) if seg else None
+        od_tensor, od_params = self.process_od(frame, self.od_tensors[slot])
+        return seg_tensor, od_tensor, od_params
+
+
+def reference_preprocess_seg(frame, seg_size=(1024, 512)):
+    # Previous implementation, kept to check the LUT path
+    img = cv2.resize(frame, seg_size)
+    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0
+    mean = np.array(IMAGENET_MEAN, dtype=np.float32)
+    std = np.array(IMAGENET_STD, dtype=np.float32)
+    img = (img - mean) / std
+    return img.transpose(2, 0, 1)[np.newaxis, :]
+
+
+def reference_preprocess_od(frame, od_shape=(640, 640)):
+    # Previous implementation, kept to check the letterbox path
+    ratio, dwdh, new_unpad, (top, bottom, left, right) = letterbox_params(frame.shape, od_shape)
+    img = frame
+    if frame.shape[1::-1] != new_unpad:
+        img = cv2.resize(frame, new_unpad, interpolation=cv2.INTER_LINEAR)
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT,
+                             value=(LETTERBOX_COLOR,) * 3)
+    input_tensor = np.ascontiguousarray(img.transpose((2, 0, 1))[::-1]).astype(np.float32) / 255.0
+    return input_tensor[None], (ratio, dwdh)
+
+
+def count_steady_state_allocations(preprocessor, frame, n_frames=20, large_bytes=64 * 1024):
+    """
+    Allocation counter: runs the preprocessor on `frame` after a warm-up and returns
+    (number of blocks >= large_bytes retained afterwards, peak bytes allocated during the run).
+    A transient full-frame temporary shows up in the peak even if it is freed right away.
+    Uses tracemalloc, which sees NumPy buffers and OpenCV outputs (allocated through NumPy).
+    """
+    import tracemalloc
+
+    preprocessor.process(frame)  # warm-up: geometry + ring slots
+    for _ in range(preprocessor.n_buffers):
+        preprocessor.process(frame)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    before = tracemalloc.take_snapshot()
+    for _ in range(n_frames):
+        preprocessor.process(frame)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    large = [s for s in after.compare_to(before, "traceback") if s.size_diff >= large_bytes]
+    return len(large), peak - base
+
+
+def self_check(frame_shape=(1024, 2048, 3)):
+    """
+    Checks LUT output against the reference path and that the steady state
+    does not allocate any large buffer (peak under one 64 KB block).
+    """
+    import time
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, frame_shape, dtype=np.uint8)
+    pre = FramePreprocessor()
+
+    seg, od, params = pre.process(frame)
+    seg_ref = reference_preprocess_seg(frame)
+    od_ref, params_ref = reference_preprocess_od(frame)
+    print(f"seg max abs diff: {np.abs(seg - seg_ref).max():.2e}")
+    print(f"od  max abs diff: {np.abs(od - od_ref).max():.2e}")
+    assert np.allclose(seg, seg_ref, atol=1e-5) and np.allclose(od, od_ref, atol=1e-6)
+    assert params == params_ref
+
+    n_large, peak = count_steady_state_allocations(pre, frame)
+    print(f"steady state: {n_large} large allocations, peak traced {peak / 1024:.1f} KB over 20 frames")
+    assert n_large == 0 and peak < 64 * 1024
+
+    t0 = time.perf_counter()
+    for _ in range(20):
+        reference_preprocess_seg(frame)
+        reference_preprocess_od(frame)
+    t_ref = (time.perf_counter() - t0) / 20 * 1000
+    t0 = time.perf_counter()
+    for _ in range(20):
+        pre.process(frame)
+    t_new = (time.perf_counter() - t0) / 20 * 1000
+    print(f"preprocess both models: reference {t_ref:.1f} ms | engine {t_new:.1f} ms")
+    print("✅ Preprocessing engine OK")
+
+
+if __name__ == "__main__":
+    self_check()
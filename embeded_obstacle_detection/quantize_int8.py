@@ -0,0 +1,301 @@
+import cv2
+import multiprocessing
+import numpy as np
+import onnx
+import os
+import psutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                      quantize_static)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+from preprocess_engine import FramePreprocessor
+from yolo_postprocess import postprocess_yolo
+from detection_metrics import load_yolo_labels, evaluate_map
+from session_config import create_session
+
+# --- CONFIGURATION ---
+# FP32 exports (export_stdc.py / export_yolo.py). The INT8 QDQ models are written next to them as <name>_int8.onnx
+SEG_MODEL_PATH = "massyl/seg_models/stdc813m_maxmiou_4.onnx"
+OD_MODEL_PATH  = "massyl/od_models/yolov8s_best_2.onnx"
+INT8_SUFFIX = "_int8"
+REQUANTIZE = False     # False = keep an existing <name>_int8.onnx and only evaluate it
+
+# Calibration folders sampled by dataset_scripts/create_calibration_data_stdc_conversion.py
+SEG_CALIB_DIR = "massyl/data/calib_imgs"
+OD_CALIB_DIR  = "massyl/data/yolo_calib_imgs"
+N_CALIB = 256          # Images per model (None = the whole folder, 1024 by default)
+CALIB_METHOD = "minmax"  # "minmax" | "entropy" | "percentile"
+PER_CHANNEL = True     # One weight scale per conv output channel (per-tensor scales lose more accuracy)
+# YOLO head: the final concat mixes box coordinates (pixels) and 0-1 class scores in one
+# tensor, a single int8 scale cannot cover both (the scores collapse to 0). Keep it in float.
+OD_FLOAT_OUTPUT = True  # Exclude the nodes writing the detection output from quantization
+OD_NODES_TO_EXCLUDE = []  # More node names kept in float (as shown by Netron), e.g. ["/model.22/Mul_2"]
+
+# Evaluation sets
+SEG_VAL_IMAGES = "massyl/data/cityscapes/leftImg8bit/val/*/*_leftImg8bit.png"  # labels: gtFine/..._gtFine_labelIds.png
+OD_VAL_DIR = "massyl/data/lost_and_found_left_od_optimized/valid"             # images/ + labels/ (YOLO txt)
+N_EVAL = 200           # Images per set (None = all)
+EVAL_CONF = 0.001      # Low threshold for mAP (like `yolo val`)
+IOU_THRESHOLD = 0.45
+N_THREADS = 4
+N_MEMORY_RUNS = 10     # Inferences in the fresh process that measures memory
+
+CALIB_METHODS = {
+    "minmax": CalibrationMethod.MinMax,
+    "entropy": CalibrationMethod.Entropy,
+    "percentile": CalibrationMethod.Percentile,
+}
+ROAD_LABEL_ID = 7      # Cityscapes labelIds road, mapped like cityscapes.py convert_labels
+IGNORE_LABEL = 255
+
+
+def int8_path(path):
+    root, ext = os.path.splitext(path)
+    return f"{root}{INT8_SUFFIX}{ext}"
+
+
+def list_images(pattern_or_dir, limit):
+    if os.path.isdir(pattern_or_dir):
+        files = sorted(glob(os.path.join(pattern_or_dir, "*.png")) + glob(os.path.join(pattern_or_dir, "*.jpg")))
+    else:
+        files = sorted(glob(pattern_or_dir))
+    return files[:limit] if limit else files
+
+
+def model_preprocessor(sess, role):
+    # FramePreprocessor matching the session's input ("seg": logits or uint8 mask export, "od": YOLO)
+    inp = sess.get_inputs()[0]
+    if role == "od":
+        return FramePreprocessor(od_shape=tuple(inp.shape[2:4]))
+    if inp.type == 'tensor(uint8)':
+        h, w = inp.shape[1:3]
+        return FramePreprocessor(seg_size=(w, h), seg_uint8=True)
+    h, w = inp.shape[2:4]
+    return FramePreprocessor(seg_size=(w, h))
+
+
+def model_input(preprocessor, role, frame):
+    # Fresh array per image: calibration keeps references to what get_next() returned
+    if role == "seg":
+        return preprocessor.process_seg(frame, preprocessor.seg_tensors[0]).copy(), None
+    tensor, params = preprocessor.process_od(frame, preprocessor.od_tensors[0])
+    return tensor.copy(), params
+
+
+class FrameCalibrationReader(CalibrationDataReader):
+    """
+    Calibration images through the same preprocessing as the pipeline, one
+    {input_name: tensor} per get_next() call.
+    """
+    def __init__(self, files, sess, role):
+        self.files = iter(files)
+        self.input_name = sess.get_inputs()[0].name
+        self.role = role
+        self.preprocessor = model_preprocessor(sess, role)
+        self.count = 0
+
+    def get_next(self):
+        for path in self.files:
+            frame = cv2.imread(path)
+            if frame is None: continue
+            self.count += 1
+            return {self.input_name: model_input(self.preprocessor, self.role, frame)[0]}
+        return None
+
+
+def output_nodes(path):
+    model = onnx.load(path, load_external_data=False)
+    outputs = {o.name for o in model.graph.output}
+    return [n.name for n in model.graph.node if n.name and set(n.output) & outputs]
+
+
+def quantize(role, fp32_path, calib_dir, nodes_to_exclude):
+    out_path = int8_path(fp32_path)
+    if os.path.exists(out_path) and not REQUANTIZE:
+        print(f"-> {out_path} exists (REQUANTIZE = False), evaluating it")
+        return out_path
+    files = list_images(calib_dir, N_CALIB)
+    if not files:
+        raise FileNotFoundError(f"No calibration images in {calib_dir}")
+
+    # Shape inference + graph cleanup first, as recommended for static quantization
+    root, ext = os.path.splitext(fp32_path)
+    prep_path = f"{root}_prep{ext}"
+    quant_pre_process(fp32_path, prep_path)
+    if role == "od" and OD_FLOAT_OUTPUT:
+        # Names taken from the preprocessed graph, the one being quantized
+        nodes_to_exclude = nodes_to_exclude + output_nodes(prep_path)
+        print(f"   kept in float: {', '.join(nodes_to_exclude) or 'none (unnamed output nodes)'}")
+    reader = FrameCalibrationReader(files, create_session(fp32_path, {}, ['CPUExecutionProvider']), role)
+    t0 = time.perf_counter()
+    # U8 activations / S8 weights: the combination the CPU int8 kernels (VNNI, ARM dot product) are built for
+    quantize_static(prep_path, out_path, reader, quant_format=QuantFormat.QDQ, per_channel=PER_CHANNEL,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    calibrate_method=CALIB_METHODS[CALIB_METHOD], nodes_to_exclude=nodes_to_exclude or None)
+    os.remove(prep_path)
+    print(f"✅ {out_path}: {reader.count} calibration images ({CALIB_METHOD}), {time.perf_counter() - t0:.0f}s")
+    return out_path
+
+
+def road_label(label_path, shape_hw):
+    label = cv2.imread(label_path, cv2.IMREAD_GRAYSCALE)
+    if label is None:
+        return None
+    label = cv2.resize(label, shape_hw[::-1], interpolation=cv2.INTER_NEAREST)
+    road = (label == ROAD_LABEL_ID).astype(np.uint8)
+    road[label == IGNORE_LABEL] = IGNORE_LABEL
+    return road
+
+
+def run_model(role, model_path, files):
+    """
+    Predictions (road masks at model resolution, or detections) and mean
+    inference latency of one model on the evaluation images.
+    """
+    sess = create_session(model_path, {"intra_op_threads": N_THREADS}, ['CPUExecutionProvider'])
+    input_name = sess.get_inputs()[0].name
+    preprocessor = model_preprocessor(sess, role)
+    predictions, infer_ms = [], []
+    for path in files:
+        frame = cv2.imread(path)
+        if frame is None: continue
+        x, params = model_input(preprocessor, role, frame)
+        t0 = time.perf_counter()
+        out = sess.run(None, {input_name: x})
+        infer_ms.append((time.perf_counter() - t0) * 1000)
+        if role == "seg":
+            mask = out[0][0] if out[0].dtype == np.uint8 else np.argmax(out[0][0], axis=0).astype(np.uint8)
+            predictions.append(mask)
+        else:
+            predictions.append(postprocess_yolo(out[:1], params[0], params[1], frame.shape[:2], EVAL_CONF,
+                                                IOU_THRESHOLD, top_k=300, max_det=300))
+    # Skip the first (warm-up) run in the latency figure
+    return predictions, float(np.mean(infer_ms[1:] or infer_ms))
+
+
+def seg_metrics(masks, files):
+    """
+    mIoU (background, road) against the Cityscapes labels, when they exist.
+    """
+    confusion = np.zeros((2, 2), dtype=np.int64)
+    n_labelled = 0
+    for mask, path in zip(masks, files):
+        label_path = path.replace("leftImg8bit", "gtFine").replace("_gtFine.png", "_gtFine_labelIds.png")
+        label = road_label(label_path, mask.shape)
+        if label is None: continue
+        n_labelled += 1
+        valid = label != IGNORE_LABEL
+        confusion += np.bincount(label[valid].astype(np.int64) * 2 + mask[valid], minlength=4).reshape(2, 2)
+    if not n_labelled:
+        return {"miou": None, "road_iou": None, "n_labelled": 0}
+    iou = np.diag(confusion) / np.maximum(confusion.sum(0) + confusion.sum(1) - np.diag(confusion), 1)
+    return {"miou": float(iou.mean()), "road_iou": float(iou[1]), "n_labelled": n_labelled}
+
+
+def od_metrics(detections, files):
+    ground_truths = []
+    for dets, path in zip(detections, files):
+        h, w = cv2.imread(path).shape[:2]
+        label_path = os.path.join(OD_VAL_DIR, "labels", os.path.splitext(os.path.basename(path))[0] + ".txt")
+        ground_truths.append(load_yolo_labels(label_path, w, h))
+    return evaluate_map(detections, ground_truths)
+
+
+def measure_memory(model_path):
+    """
+    Runs in a fresh process: RSS growth of loading the session and peak RSS
+    over a few inferences, in MB.
+    """
+    proc = psutil.Process()
+    rss_start = proc.memory_info().rss
+    sess = create_session(model_path, {"intra_op_threads": N_THREADS}, ['CPUExecutionProvider'])
+    rss_loaded = proc.memory_info().rss
+    inp = sess.get_inputs()[0]
+    dtype = np.uint8 if inp.type == 'tensor(uint8)' else np.float32
+    x = np.zeros([d if isinstance(d, int) else 1 for d in inp.shape], dtype=dtype)
+    peak = rss_loaded
+    for _ in range(N_MEMORY_RUNS):
+        sess.run(None, {inp.name: x})
+        peak = max(peak, proc.memory_info().rss)
+    mb = 1024 * 1024
+    return {"load_mb": (rss_loaded - rss_start) / mb, "peak_mb": (peak - rss_start) / mb}
+
+
+def evaluate(name, fp32_path, q_path, files):
+    results = {}
+    for precision, path in (("fp32", fp32_path), ("int8", q_path)):
+        predictions, infer_ms = run_model(name, path, files)
+        # Spawned, not forked: a clean interpreter without this process' sessions and thread pools
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            memory = pool.submit(measure_memory, path).result()
+        results[precision] = dict(memory, infer_ms=infer_ms, size_mb=os.path.getsize(path) / 1024 / 1024,
+                                  predictions=predictions)
+
+    fp32, int8 = results["fp32"], results["int8"]
+    if name == "seg":
+        for r in results.values():
+            r.update(seg_metrics(r["predictions"], files))
+        # Road mask agreement needs no labels
+        agree = [np.mean(a == b) for a, b in zip(fp32["predictions"], int8["predictions"])]
+        int8["agreement"] = float(np.mean(agree))
+    else:
+        for r in results.values():
+            r.update(od_metrics(r["predictions"], files))
+    return results
+
+
+def print_report(name, results, n_images):
+    fp32, int8 = results["fp32"], results["int8"]
+    print("=" * 90)
+    if name == "seg":
+        header, keys = f"{'mIoU':>9}{'road IoU':>10}", ("miou", "road_iou")
+    else:
+        header, keys = f"{'mAP50':>9}{'mAP50-95':>10}", ("map50", "map50_95")
+    print(f"{name.upper()} ({n_images} images){'':<4}{'size MB':>9}{'load MB':>9}{'peak MB':>9}{'infer ms':>10}{header}")
+
+    def fmt(v, width):
+        return f"{v:>{width}.3f}" if v is not None else f"{'n/a':>{width}}"
+
+    for precision in ("fp32", "int8"):
+        r = results[precision]
+        print(f"  {precision:<16}{r['size_mb']:>9.1f}{r['load_mb']:>9.1f}{r['peak_mb']:>9.1f}{r['infer_ms']:>10.1f}"
+              f"{fmt(r[keys[0]], 9)}{fmt(r[keys[1]], 10)}")
+    deltas = [f"size x{int8['size_mb'] / fp32['size_mb']:.2f}",
+              f"peak memory {int8['peak_mb'] - fp32['peak_mb']:+.0f}MB",
+              f"latency {(int8['infer_ms'] / fp32['infer_ms'] - 1) * 100:+.0f}%"]
+    for key in keys:
+        if fp32[key] is not None:
+            deltas.append(f"{key} {int8[key] - fp32[key]:+.3f}")
+    if name == "seg":
+        deltas.append(f"mask agreement with fp32 {int8['agreement'] * 100:.2f}%")
+        if not fp32["n_labelled"]:
+            deltas.append("no labels found for mIoU")
+    print(f"  int8 vs fp32: {', '.join(deltas)}")
+
+
+def main():
+    jobs = (("seg", SEG_MODEL_PATH, SEG_CALIB_DIR, [], list_images(SEG_VAL_IMAGES, N_EVAL)),
+            ("od", OD_MODEL_PATH, OD_CALIB_DIR, OD_NODES_TO_EXCLUDE,
+             list_images(os.path.join(OD_VAL_DIR, "images"), N_EVAL)))
+    reports = []
+    for name, fp32_path, calib_dir, exclude, files in jobs:
+        if not os.path.exists(fp32_path):
+            print(f"⚠️ Skipping {name}: {fp32_path} not found")
+            continue
+        if not files:
+            print(f"⚠️ Skipping {name}: no evaluation images")
+            continue
+        print(f"[{name}] quantizing {fp32_path} ({'per-channel' if PER_CHANNEL else 'per-tensor'} weights)")
+        q_path = quantize(name, fp32_path, calib_dir, exclude)
+        print(f"[{name}] evaluating fp32 vs int8 on {len(files)} images ({N_THREADS} CPU threads)...")
+        reports.append((name, evaluate(name, fp32_path, q_path, files), len(files)))
+
+    for name, results, n_images in reports:
+        print_report(name, results, n_images)
+    print("=" * 90)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import cv2
+import numpy as np
+
+THUMB_SIZE = (64, 32)  # (w, h) grey thumbnail used for the scene-change signal
+
+
+def scene_thumbnail(frame):
+    """
+    Cheap scene signature: area-averaged grey thumbnail (float32, 0-255).
+    """
+    small = cv2.resize(frame, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+
+def heading_delta(a, b):
+    # Smallest absolute angle between two headings in degrees
+    d = abs(a - b) % 360.0
+    return min(d, 360.0 - d)
+
+
+class SegScheduler:
+    """
+    Decides, frame by frame, whether segmentation must run or whether the
+    cached road mask of the last segmented frame can be reused.
+
+    Segmentation runs when one of these fires:
+      first     : no mask yet
+      interval  : `every_n` frames since the last run
+      scene     : mean abs difference of the grey thumbnails (0-255) against the
+                  last segmented frame above `diff_threshold`
+      heading   : GPS heading moved more than `heading_threshold` degrees since
+                  the last run (only for frames that carry a heading)
+      refresh   : requested by the caller (e.g. the scheduled frame was dropped)
+
+    Comparisons are always made against the last *segmented* frame, so slow
+    drifts add up until they trigger a run.
+    """
+    REASONS = ("first", "interval", "scene", "heading", "refresh")
+
+    def __init__(self, every_n=5, diff_threshold=12.0, heading_threshold=10.0):
+        self.every_n = max(1, every_n)
+        self.diff_threshold = diff_threshold
+        self.heading_threshold = heading_threshold
+
+        self.ref_thumb = None
+        self.ref_heading = None
+        self.since_run = 0
+        self.refresh = False
+
+        # Metrics
+        self.frames = 0
+        self.runs = 0
+        self.reasons = {r: 0 for r in self.REASONS}
+        self.staleness_sum = 0
+        self.staleness_max = 0
+        self.reused = 0
+
+    def decide(self, thumb, heading=None):
+        """
+        Returns the trigger reason (str) if segmentation must run on this frame, else None.
+        """
+        self.frames += 1
+        reason = None
+        if self.ref_thumb is None:
+            reason = "first"
+        elif self.refresh:
+            reason = "refresh"
+        elif self.since_run + 1 >= self.every_n:
+            reason = "interval"
+        elif (heading is not None and self.ref_heading is not None
+              and heading_delta(heading, self.ref_heading) > self.heading_threshold):
+            reason = "heading"
+        elif float(np.mean(cv2.absdiff(thumb, self.ref_thumb))) > self.diff_threshold:
+            reason = "scene"
+
+        if reason is None:
+            self.since_run += 1
+            return None
+        self.ref_thumb = thumb
+        if heading is not None:
+            self.ref_heading = heading
+        self.since_run = 0
+        self.refresh = False
+        self.runs += 1
+        self.reasons[reason] += 1
+        return reason
+
+    def request_refresh(self):
+        self.refresh = True
+
+    def record_reuse(self, staleness):
+        """
+        Called when a frame uses a cached mask `staleness` frames old.
+        """
+        self.reused += 1
+        self.staleness_sum += staleness
+        self.staleness_max = max(self.staleness_max, staleness)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "seg_runs": self.runs,
+            "skip_ratio": 1 - self.runs / self.frames if self.frames else 0.0,
+            "staleness_mean": self.staleness_sum / self.reused if self.reused else 0.0,
+            "staleness_max": self.staleness_max,
+            "reasons": dict(self.reasons),
+        }
+
+    def summary(self):
+        s = self.stats()
+        reasons = ", ".join(f"{k} {v}" for k, v in s["reasons"].items() if v)
+        return (f"{s['seg_runs']}/{s['frames']} frames segmented (skip {s['skip_ratio']*100:.0f}%) | "
+                f"mask staleness avg {s['staleness_mean']:.1f}, max {s['staleness_max']} frames | {reasons}")
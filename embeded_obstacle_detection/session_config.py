@@ -0,0 +1,234 @@
+import hashlib
+import json
+import numpy as np
+import onnxruntime as ort
+import os
+import platform
+
+# Per-model session settings. A profile file (JSON, written by tune_session_profile.py)
+# overrides any of these keys, per model.
+DEFAULT_SETTINGS = {
+    "intra_op_threads": 2,
+    "inter_op_threads": 1,
+    "execution_mode": "sequential",  # "sequential" | "parallel" (inter-op parallelism between graph branches)
+    "graph_optimization": "all",     # "disable" | "basic" | "extended" | "all"
+    "cpu_mem_arena": True,           # Reuse a growing arena instead of malloc/free per tensor
+    "mem_pattern": True,             # Plan the intermediate tensors once for a fixed input shape
+    "allow_spinning": True,          # Idle intra-op threads busy-wait: fastest alone, steals cores from the other session
+}
+DEFAULT_PROVIDERS = ['CUDAExecutionProvider', 'CPUExecutionProvider']
+
+EXECUTION_MODES = {
+    "sequential": "ORT_SEQUENTIAL",
+    "parallel": "ORT_PARALLEL",
+}
+GRAPH_OPTIMIZATIONS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+ONNX_DTYPES = {
+    'tensor(float)': np.float32,
+    'tensor(float16)': np.float16,
+    'tensor(uint8)': np.uint8,
+    'tensor(int64)': np.int64,
+    'tensor(int32)': np.int32,
+}
+
+
+def machine_info():
+    return {"cpu_count": os.cpu_count(), "machine": platform.machine(), "ort": ort.__version__}
+
+
+def default_profile(seg_threads=2, od_threads=2):
+    return {
+        "providers": list(DEFAULT_PROVIDERS),
+        "seg": dict(DEFAULT_SETTINGS, intra_op_threads=seg_threads),
+        "od": dict(DEFAULT_SETTINGS, intra_op_threads=od_threads),
+    }
+
+
+def load_profile(path, seg_threads=2, od_threads=2):
+    """
+    Session profile: {"providers": [...], "seg": {settings}, "od": {settings}}.
+    Keys missing from the file (or a missing file) keep the defaults, with
+    seg_threads/od_threads as the intra-op thread budgets.
+    """
+    profile = default_profile(seg_threads, od_threads)
+    if not path or not os.path.exists(path):
+        return profile
+    with open(path) as f:
+        loaded = json.load(f)
+    for model in ("seg", "od"):
+        unknown = set(loaded.get(model, {})) - set(DEFAULT_SETTINGS)
+        if unknown:
+            raise ValueError(f"{path}: unknown {model} session settings {sorted(unknown)}")
+        profile[model].update(loaded.get(model, {}))
+    profile["providers"] = loaded.get("providers", profile["providers"])
+    profile["machine"] = loaded.get("machine")
+    profile["source"] = path
+    cpu_count = (profile["machine"] or {}).get("cpu_count")
+    if cpu_count and cpu_count != os.cpu_count():
+        print(f"⚠️ Session profile {path} was tuned on {cpu_count} cores, this machine has {os.cpu_count()}")
+    return profile
+
+
+def save_profile(profile, path):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(profile, f, indent=2)
+
+
+def available_providers(providers):
+    # Keeps the requested order, drops what this onnxruntime build does not have
+    available = set(ort.get_available_providers())
+    return [p for p in providers if p in available] or ['CPUExecutionProvider']
+
+
+def make_session_options(settings):
+    settings = dict(DEFAULT_SETTINGS, **settings)
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = settings["intra_op_threads"]
+    opts.inter_op_num_threads = settings["inter_op_threads"]
+    opts.execution_mode = getattr(ort.ExecutionMode, EXECUTION_MODES[settings["execution_mode"]])
+    opts.graph_optimization_level = getattr(ort.GraphOptimizationLevel, GRAPH_OPTIMIZATIONS[settings["graph_optimization"]])
+    opts.enable_cpu_mem_arena = settings["cpu_mem_arena"]
+    opts.enable_mem_pattern = settings["mem_pattern"]
+    opts.add_session_config_entry("session.intra_op.allow_spinning", "1" if settings["allow_spinning"] else "0")
+    return opts
+
+
+def create_session(path, settings, providers=DEFAULT_PROVIDERS):
+    opts = make_session_options(settings)
+    return ort.InferenceSession(path, sess_options=opts, providers=available_providers(providers))
+
+
+def model_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def indexed_model_hash(path, cache_dir):
+    """
+    model_hash() remembered in <cache_dir>/hashes.json by (size, mtime), so an
+    unchanged model is not read and hashed again at every start.
+    """
+    index_path = os.path.join(cache_dir, "hashes.json")
+    index = {}
+    if os.path.exists(index_path):
+        try:
+            with open(index_path) as f:
+                index = json.load(f)
+        except ValueError:
+            index = {}
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    stamp = [st.st_size, st.st_mtime_ns]
+    entry = index.get(key)
+    if entry is not None and entry[:2] == stamp:
+        return entry[2]
+    digest = model_hash(path)
+    index[key] = stamp + [digest]
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, index_path)
+    return digest
+
+
+def cached_model_path(path, settings, providers, cache_dir):
+    """
+    <cache_dir>/<model>_<hash>_<provider>_<level>_<arch>_ort<version>.onnx
+    Optimized graphs can hold provider- and CPU-specific fused kernels and
+    layouts, hence the provider, the machine and the onnxruntime version in the key.
+    """
+    provider = available_providers(providers)[0].replace("ExecutionProvider", "").lower()
+    level = dict(DEFAULT_SETTINGS, **settings)["graph_optimization"]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    key = f"{indexed_model_hash(path, cache_dir)}_{provider}_{level}_{platform.machine()}_ort{ort.__version__}"
+    return os.path.join(cache_dir, f"{stem}_{key}.onnx")
+
+
+def create_cached_session(path, settings, providers=DEFAULT_PROVIDERS, cache_dir=None):
+    """
+    Session built from the ORT-optimized model of a previous start when there is
+    one (graph optimization skipped), else from `path`, saving the optimized model
+    for the next start. Returns (session, cache status: "hit" | "miss" | "off").
+    """
+    if not cache_dir:
+        return create_session(path, settings, providers), "off"
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = cached_model_path(path, settings, providers, cache_dir)
+    if os.path.exists(cache_path):
+        try:
+            return create_session(cache_path, dict(settings, graph_optimization="disable"), providers), "hit"
+        except Exception as e:
+            print(f"⚠️ Unreadable cached model {cache_path} ({e}), rebuilding it")
+            os.remove(cache_path)
+
+    # Written under a temporary name: a power cut during the write must not leave a truncated cache entry
+    tmp_path = cache_path + ".tmp"
+    opts = make_session_options(settings)
+    opts.optimized_model_filepath = tmp_path
+    sess = ort.InferenceSession(path, sess_options=opts, providers=available_providers(providers))
+    if os.path.exists(tmp_path):
+        with open(tmp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, cache_path)
+    return sess, "miss"
+
+
+def describe(settings):
+    s = dict(DEFAULT_SETTINGS, **settings)
+    return (f"{s['intra_op_threads']}+{s['inter_op_threads']} threads, {s['execution_mode']}, "
+            f"opt {s['graph_optimization']}, arena {'on' if s['cpu_mem_arena'] else 'off'}, "
+            f"mem pattern {'on' if s['mem_pattern'] else 'off'}, spinning {'on' if s['allow_spinning'] else 'off'}")
+
+
+class BoundSession:
+    """
+    Single-input session run through IO binding.
+
+    Outputs with a static shape are bound once to buffers allocated here, so
+    run() allocates no output array: the returned arrays are those buffers and
+    are overwritten by the next run() (copy what must outlive it). Outputs with
+    a dynamic dimension are allocated by ONNX Runtime and copied out as usual.
+    The input is bound per call, without a copy on CPU (must be C-contiguous).
+
+        seg = BoundSession(create_session(path, profile["seg"], profile["providers"]))
+        mask = seg.run(seg_in)[0]
+    """
+    def __init__(self, sess, output_names=None, io_binding=True):
+        self.sess = sess
+        self.input_name = sess.get_inputs()[0].name
+        outputs = [o for o in sess.get_outputs() if output_names is None or o.name in output_names]
+        self.output_names = [o.name for o in outputs]
+        self.bound = io_binding
+        self.buffers = None
+        if not io_binding:
+            return
+
+        self.binding = sess.io_binding()
+        static = all(all(isinstance(d, int) for d in o.shape) and o.type in ONNX_DTYPES for o in outputs)
+        if static:
+            self.buffers = [np.empty(o.shape, dtype=ONNX_DTYPES[o.type]) for o in outputs]
+            for o, buf in zip(outputs, self.buffers):
+                self.binding.bind_output(o.name, 'cpu', 0, buf.dtype, buf.shape, buf.ctypes.data)
+        else:
+            for o in outputs:
+                self.binding.bind_output(o.name, 'cpu')
+
+    def run(self, x):
+        if not self.bound:
+            return self.sess.run(self.output_names, {self.input_name: x})
+        self.binding.bind_cpu_input(self.input_name, x)
+        self.sess.run_with_iobinding(self.binding)
+        if self.buffers is not None:
+            return self.buffers
+        return self.binding.copy_outputs_to_cpu()
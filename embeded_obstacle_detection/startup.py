@@ -0,0 +1,39 @@
+import time
+
+
+class StartupTimer:
+    """
+    Cold start phases, from t0 (taken before the heavy imports) to the first detection.
+
+        timer = StartupTimer(t0)
+        timer.mark("sessions", "seg cache hit")   # duration since the previous mark
+        ...
+        timer.first_detection()                   # time-to-first-detection, printed once
+    """
+    def __init__(self, t0):
+        self.t0 = t0
+        self.t_last = t0
+        self.phases = []
+        self.ttfd = None
+
+    def mark(self, phase, note=None):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.t_last, note))
+        self.t_last = now
+
+    def first_detection(self):
+        """
+        Closes the timeline at the first fused frame. Returns True only the first time.
+        """
+        if self.ttfd is not None:
+            return False
+        self.mark("first frame")
+        self.ttfd = self.t_last - self.t0
+        return True
+
+    def summary(self):
+        phases = " | ".join(f"{name} {s * 1000:.0f}ms" + (f" ({note})" if note else "")
+                            for name, s, note in self.phases)
+        if self.ttfd is None:
+            return f"{phases} | no detection yet"
+        return f"time to first detection {self.ttfd:.2f}s: {phases}"
@@ -0,0 +1,106 @@
+import numpy as np
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import main_embeded_obstacle_delection as online
+from session_config import ONNX_DTYPES, BoundSession, create_session, load_profile, machine_info, save_profile
+
+# --- CONFIGURATION ---
+# Models, profile path and providers are the pipeline's (main_embeded_obstacle_delection.py)
+CORE_BUDGET = os.cpu_count()  # Cores shared by both sessions (leave some for decode/writer threads if needed)
+SPINNING = [True, False]      # allow_spinning values tried for every split
+N_WARMUP = 3
+N_FRAMES = 30
+
+
+def random_input(sess, rng):
+    inp = sess.get_inputs()[0]
+    shape = [d if isinstance(d, int) else 1 for d in inp.shape]
+    dtype = ONNX_DTYPES[inp.type]
+    if dtype == np.uint8:
+        return rng.integers(0, 256, shape, dtype=np.uint8)
+    return rng.standard_normal(shape).astype(dtype)
+
+
+def time_split(seg_path, od_path, base, seg_threads, od_threads, spinning):
+    """
+    Both models on the same input, concurrently like FusionPipeline.run_models
+    (segmentation on a worker thread, detection on the calling thread).
+    Returns the mean frame, seg and od wall times in ms.
+    """
+    seg_settings = dict(base["seg"], intra_op_threads=seg_threads, allow_spinning=spinning)
+    od_settings = dict(base["od"], intra_op_threads=od_threads, allow_spinning=spinning)
+    seg = BoundSession(create_session(seg_path, seg_settings, base["providers"]))
+    od = BoundSession(create_session(od_path, od_settings, base["providers"]))
+    rng = np.random.default_rng(0)
+    seg_in, od_in = random_input(seg.sess, rng), random_input(od.sess, rng)
+
+    def timed(runner, x):
+        t0 = time.perf_counter()
+        runner.run(x)
+        return time.perf_counter() - t0
+
+    frame_s, seg_s, od_s = [], [], []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for i in range(N_WARMUP + N_FRAMES):
+            t0 = time.perf_counter()
+            seg_future = executor.submit(timed, seg, seg_in)
+            od_t = timed(od, od_in)
+            seg_t = seg_future.result()
+            if i >= N_WARMUP:
+                frame_s.append(time.perf_counter() - t0)
+                seg_s.append(seg_t)
+                od_s.append(od_t)
+    return tuple(float(np.mean(t)) * 1000 for t in (frame_s, seg_s, od_s))
+
+
+def candidate_splits(budget):
+    if budget < 2:
+        return [(1, 1)]  # Oversubscribed, but still compares spinning on/off
+    return [(s, budget - s) for s in range(1, budget)]
+
+
+def main():
+    profile_path = online.SESSION_PROFILE
+    # Settings other than the thread split and spinning are kept from the current profile
+    base = load_profile(profile_path, online.SEG_THREADS, online.OD_THREADS)
+    seg_path = online.ROI_SEG_MODEL_PATH if online.ROI_MODE and online.ROI_SEG_MODEL_PATH else online.SEG_MODEL_PATH
+    od_path = online.ROI_OD_MODEL_PATH if online.ROI_MODE and online.ROI_OD_MODEL_PATH else online.OD_MODEL_PATH
+    print(f"Thread split sweep: {CORE_BUDGET} cores, {N_FRAMES} frames per setting")
+    print(f"  seg: {seg_path}\n  od : {od_path}")
+
+    results = []
+    print("=" * 64)
+    print(f"{'seg thr':>8}{'od thr':>8}{'spinning':>10}{'frame ms':>11}{'seg ms':>9}{'od ms':>9}{'FPS':>9}")
+    for seg_threads, od_threads in candidate_splits(CORE_BUDGET):
+        for spinning in SPINNING:
+            frame_ms, seg_ms, od_ms = time_split(seg_path, od_path, base, seg_threads, od_threads, spinning)
+            results.append({"seg_threads": seg_threads, "od_threads": od_threads, "allow_spinning": spinning,
+                            "frame_ms": frame_ms, "seg_ms": seg_ms, "od_ms": od_ms})
+            print(f"{seg_threads:>8}{od_threads:>8}{'on' if spinning else 'off':>10}{frame_ms:>11.1f}"
+                  f"{seg_ms:>9.1f}{od_ms:>9.1f}{1000 / frame_ms:>9.1f}")
+    print("=" * 64)
+
+    best = min(results, key=lambda r: r["frame_ms"])
+    current = (base["seg"]["intra_op_threads"], base["od"]["intra_op_threads"], base["seg"]["allow_spinning"])
+    current_result = next((r for r in results
+                           if (r["seg_threads"], r["od_threads"], r["allow_spinning"]) == current), None)
+    profile = {
+        "machine": machine_info(),
+        "providers": base["providers"],
+        "seg": dict(base["seg"], intra_op_threads=best["seg_threads"], allow_spinning=best["allow_spinning"]),
+        "od": dict(base["od"], intra_op_threads=best["od_threads"], allow_spinning=best["allow_spinning"]),
+        "sweep": results,
+    }
+    save_profile(profile, profile_path)
+    print(f"Best: seg {best['seg_threads']} + od {best['od_threads']} threads, "
+          f"spinning {'on' if best['allow_spinning'] else 'off'} -> {best['frame_ms']:.1f} ms/frame")
+    if current_result is not None:
+        print(f"Previous settings ({current[0]}+{current[1]}, spinning {'on' if current[2] else 'off'}): "
+              f"{current_result['frame_ms']:.1f} ms/frame "
+              f"({(1 - best['frame_ms'] / current_result['frame_ms'])*100:.0f}% saved)")
+    print(f"✅ Session profile written to {profile_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import cv2
+import numpy as np
+
+# One row per kept detection, boxes in original image pixels [x1, y1, x2, y2]
+DETECTION_DTYPE = np.dtype([
+    ("box", np.int32, (4,)),
+    ("score", np.float32),
+    ("class_id", np.int32),
+])
+
+# Offset added per class so that boxes of different classes never overlap (class-aware NMS)
+CLASS_OFFSET = 8192.0
+
+# Above this many candidates the K x K IoU matrix costs more than OpenCV's NMS: nms() hands over to it
+MATRIX_NMS_MAX = 512
+
+
+def empty_detections():
+    return np.zeros(0, dtype=DETECTION_DTYPE)
+
+
+def decode(prediction, conf_threshold, top_k=300):
+    """
+    Raw YOLOv8 head (4 + n_classes, n_anchors) -> candidates above threshold.
+    Keeps at most `top_k` candidates, sorted by decreasing score.
+    Returns boxes (K, 4) as [x1, y1, x2, y2] in model input pixels, scores (K,), class ids (K,).
+    """
+    class_scores = prediction[4:]
+    if class_scores.shape[0] == 1:
+        scores = class_scores[0]
+        class_ids = np.zeros(scores.shape, dtype=np.int32)
+    else:
+        class_ids = np.argmax(class_scores, axis=0).astype(np.int32)
+        scores = np.take_along_axis(class_scores, class_ids[None], axis=0)[0]
+
+    idx = np.flatnonzero(scores >= conf_threshold)
+    if len(idx) > top_k:
+        idx = idx[np.argpartition(scores[idx], -top_k)[-top_k:]]
+    idx = idx[np.argsort(-scores[idx], kind="stable")]
+
+    cx, cy, w, h = prediction[:4, idx]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    return boxes, scores[idx], class_ids[idx]
+
+
+def iou_matrix(boxes):
+    """
+    Pairwise IoU of (K, 4) [x1, y1, x2, y2] boxes.
+    """
+    x1, y1, x2, y2 = boxes.T
+    area = np.maximum(0, x2 - x1) * np.maximum(0, y2 - y1)
+    iw = np.clip(np.minimum(x2[:, None], x2[None]) - np.maximum(x1[:, None], x1[None]), 0, None)
+    ih = np.clip(np.minimum(y2[:, None], y2[None]) - np.maximum(y1[:, None], y1[None]), 0, None)
+    inter = iw * ih
+    union = area[:, None] + area[None] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def nms(boxes, scores, class_ids, iou_threshold, max_det=100):
+    """
+    Greedy class-aware NMS on score-sorted candidates. Returns the indices of kept boxes.
+    Up to MATRIX_NMS_MAX candidates the IoU matrix is computed once and the loop only
+    visits survivors; above that (top_k > MATRIX_NMS_MAX), cv2.dnn.NMSBoxes does the
+    same greedy suppression in C++.
+    """
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    shifted = boxes + (class_ids[:, None] * CLASS_OFFSET)
+    if len(boxes) > MATRIX_NMS_MAX:
+        xywh = np.concatenate([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]], axis=1)
+        # No top_k: OpenCV applies it to the candidates before suppression, not to the kept boxes
+        keep = cv2.dnn.NMSBoxes(xywh, scores, 0.0, iou_threshold)
+        return np.asarray(keep, dtype=np.int64).reshape(-1)[:max_det]
+
+    suppress = np.triu(iou_matrix(shifted) > iou_threshold, k=1)
+
+    alive = np.ones(len(boxes), dtype=bool)
+    keep = []
+    i = 0
+    while i < len(boxes) and len(keep) < max_det:
+        keep.append(i)
+        alive &= ~suppress[i]
+        remaining = np.flatnonzero(alive[i + 1:])
+        if len(remaining) == 0:
+            break
+        i = i + 1 + remaining[0]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def scale_boxes(boxes, ratio, dwdh, orig_shape):
+    """
+    Undo the letterbox: model input pixels -> original image pixels (int, clipped).
+    """
+    pad_w, pad_h = dwdh
+    scale_w, scale_h = ratio
+    out = np.empty(boxes.shape, dtype=np.float32)
+    out[:, 0::2] = (boxes[:, 0::2] - pad_w) / scale_w
+    out[:, 1::2] = (boxes[:, 1::2] - pad_h) / scale_h
+    out = out.astype(np.int32)  # Truncation, like int()
+    np.clip(out[:, 0::2], 0, orig_shape[1], out=out[:, 0::2])
+    np.clip(out[:, 1::2], 0, orig_shape[0], out=out[:, 1::2])
+    return out
+
+
+def postprocess_yolo(output, ratio, dwdh, orig_shape, conf_threshold=0.5, iou_threshold=0.45,
+                     top_k=300, max_det=100):
+    """
+    Full YOLOv8 postprocessing with array operations only:
+    decode -> threshold -> top-k -> class-aware NMS -> undo letterbox.
+
+    output: session outputs, output[0] has shape (1, 4 + n_classes, n_anchors)
+    Returns a DETECTION_DTYPE structured array (use dets["box"], dets["score"], dets["class_id"]).
+    """
+    prediction = output[0][0]
+    boxes, scores, class_ids = decode(prediction, conf_threshold, top_k)
+    if len(boxes) == 0:
+        return empty_detections()
+
+    keep = nms(boxes, scores, class_ids, iou_threshold, max_det)
+
+    dets = np.zeros(len(keep), dtype=DETECTION_DTYPE)
+    dets["box"] = scale_boxes(boxes[keep], ratio, dwdh, orig_shape)
+    dets["score"] = scores[keep]
+    dets["class_id"] = class_ids[keep]
+    return dets
@@ -1,52 +1,185 @@
 import serial
-from util import nmea_to_decimal
+import threading
+import time
+from collections import namedtuple
+from nmea_parser import GGA, GSA, GSV, RMC, NMEAStream
 import config
 
+HISTORY_SIZE = 600     # Fixes kept in the ring buffer (10 minutes at 1 Hz)
+RATE_WINDOW_S = 5.0    # Window of the lines-per-second counter
+KNOTS_TO_MPS = 0.514444
+
+# One RMC epoch. t = time.monotonic() when its first byte was read from the port,
+# utc = the receiver's time of the fix (seconds since UTC midnight).
+Fix = namedtuple("Fix", ["t", "lat", "lon", "valid", "speed_mps", "course", "used", "detected", "fix_type", "utc"])
+
+
 class GPSModule:
-    def __init__(self, port=config.SERIAL_PORT, baud=config.BAUD_RATE):
+    """
+    NMEA receiver on a serial port.
+
+    start() drains the port on a background thread: every sentence is parsed
+    and each RMC epoch is stored as a Fix in a ring buffer. latest() and
+    history() never block: the reader thread is the only writer, it fills a
+    slot with an immutable Fix and only then publishes it by bumping the
+    counter, so readers need no lock.
+
+        gps = GPSModule()
+        gps.start()
+        fix = gps.latest()   # None until the first RMC
+        gps.stop()
+
+    update() keeps the old polling API: it returns the status dict, and drains
+    whatever is waiting on the port itself when the thread is not running.
+    """
+    def __init__(self, port=config.SERIAL_PORT, baud=config.BAUD_RATE, history_size=HISTORY_SIZE):
+        self.ser = None
+        # We add satellite counters here
+        self.last_status = {
+            "lat": 0.0,
+            "lon": 0.0,
+            "valid": False,
+            "detected": 0,
+            "used": 0
+        }
+        self._fixes = [None] * history_size
+        self._count = 0        # Fixes published so far (next slot = _count % history_size)
+        self._in_view = {}     # Talker -> satellites in view
+        self._used = 0
+        self._fix_type = 1
+        self._stream = NMEAStream()
+        self._line_times = []  # (monotonic time, lines) of each chunk over the last RATE_WINDOW_S
+        self.lines = 0
+        self.parse_errors = 0
+        self._thread = None
+        self._running = False
         try:
             self.ser = serial.Serial(port, baud, timeout=1)
-            # We add satellite counters here
-            self.last_status = {
-                "lat": 0.0, 
-                "lon": 0.0, 
-                "valid": False,
-                "detected": 0,
-                "used": 0
-            }
         except Exception as e:
             print(f"Hardware Error: {e}")
 
+    def start(self):
+        if self.ser is None:
+            print("⚠️ GPS reader not started: no serial port")
+            return self
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._reader, name="gps-reader", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.ser is not None:
+            self.ser.close()
+
+    def _reader(self):
+        while self._running:
+            try:
+                # Blocks up to the port timeout for the first byte, then takes everything waiting
+                chunk = self.ser.read(max(1, self.ser.in_waiting))
+            except serial.SerialException as e:
+                print(f"⚠️ GPS read error: {e}")
+                time.sleep(1.0)
+                continue
+            if chunk:
+                self._feed(chunk, time.monotonic())
+
+    def _feed(self, chunk, t):
+        records = self._stream.feed(chunk)
+        n_lines = self._stream.lines - self.lines
+        self.lines = self._stream.lines
+        self.parse_errors = self._stream.errors
+        if n_lines:
+            self._line_times.append((t, n_lines))
+        for record in records:
+            self._apply(record, t)
+        # Drop the chunks that left the rate window
+        cutoff = t - RATE_WINDOW_S
+        if self._line_times and self._line_times[0][0] < cutoff:
+            self._line_times = [x for x in self._line_times if x[0] >= cutoff]
+
+    def _apply(self, record, t):
+        # 1. Position, validity, speed and course: one Fix per RMC epoch (GPRMC or GNRMC)
+        if isinstance(record, RMC):
+            valid = record.valid and record.lat is not None and record.lon is not None
+            self._publish(Fix(t, record.lat if valid else 0.0, record.lon if valid else 0.0, valid,
+                              (record.speed_kn or 0.0) * KNOTS_TO_MPS, record.course or 0.0,
+                              self._used, sum(self._in_view.values()), self._fix_type, record.time))
+
+        # 2. Satellites detected, per constellation (GPGSV, GLGSV, GAGSV...)
+        elif isinstance(record, GSV):
+            self._in_view[record.talker] = record.in_view
+
+        # 3. Satellites used (all constellations on a GNGGA)
+        elif isinstance(record, GGA):
+            if record.used is not None:
+                self._used = record.used
+
+        # 4. Fix type: 1 = none, 2 = 2D, 3 = 3D
+        elif isinstance(record, GSA):
+            if record.fix_type is not None:
+                self._fix_type = record.fix_type
+
+    def _publish(self, fix):
+        self._fixes[self._count % len(self._fixes)] = fix
+        self._count += 1  # Publishes the slot written above
+        status = {"lat": self.last_status["lat"], "lon": self.last_status["lon"], "valid": fix.valid,
+                  "detected": fix.detected, "used": fix.used}
+        if fix.valid:
+            status["lat"], status["lon"] = fix.lat, fix.lon
+        self.last_status = status  # Replaced, never mutated: readers always see a whole dict
+
+    def latest(self):
+        """
+        Most recent Fix (valid or not), None before the first RMC.
+        """
+        count = self._count
+        if not count:
+            return None
+        return self._fixes[(count - 1) % len(self._fixes)]
+
+    def history(self, n=None, since=None):
+        """
+        Buffered fixes, oldest first: the last n, and/or those with t >= since
+        (a time.monotonic() value).
+        """
+        count = self._count
+        size = len(self._fixes)
+        start = max(0, count - size)
+        if n is not None:
+            start = max(start, count - n)
+        fixes = [self._fixes[i % size] for i in range(start, count)]
+        # Slots the writer wrapped around to while copying hold newer fixes: drop them
+        overwritten = self._count - size - start
+        if overwritten > 0:
+            fixes = fixes[overwritten:]
+        # The slot being filled is written before _count is bumped: newer than the rest, it is lost
+        if len(fixes) > 1 and fixes[0].t > fixes[-1].t:
+            fixes = fixes[1:]
+        if since is not None:
+            fixes = [f for f in fixes if f.t >= since]
+        return fixes
+
+    def stats(self):
+        times = self._line_times
+        window = min(RATE_WINDOW_S, time.monotonic() - times[0][0]) if times else 0.0
+        return {
+            "lines": self.lines,
+            "lines_per_second": sum(n for _, n in times) / window if window > 0 else 0.0,
+            "parse_errors": self.parse_errors,
+            "fixes": self._count,
+            "running": self._thread is not None,
+        }
+
     def update(self):
         """
-        Reads the serial port and updates the internal status.
-        Call this frequently in your main loop.
+        Returns the internal status. Without the reader thread, first reads
+        everything waiting on the serial port (call this frequently then).
         """
-        if self.ser.in_waiting > 0:
-            try:
-                line = self.ser.readline().decode('ascii', errors='replace').strip()
-                
-                # 1. Update Position and Validity
-                if "$GPRMC" in line:
-                    data = line.split(',')
-                    if len(data) > 6:
-                        self.last_status["valid"] = (data[2] == 'A')
-                        if self.last_status["valid"]:
-                            self.last_status["lat"] = nmea_to_decimal(data[3], data[4])
-                            self.last_status["lon"] = nmea_to_decimal(data[5], data[6])
-
-                # 2. Update Satellites Detected
-                elif "$GPGSV" in line:
-                    parts = line.split(',')
-                    if len(parts) > 3:
-                        self.last_status["detected"] = int(parts[3])
-
-                # 3. Update Satellites Used
-                elif "$GPGGA" in line:
-                    parts = line.split(',')
-                    if len(parts) > 7 and parts[7] != "":
-                        self.last_status["used"] = int(parts[7])
-            except:
-                pass # Ignore malformed serial lines
-                
+        if self._thread is None and self.ser is not None and self.ser.in_waiting > 0:
+            self._feed(self.ser.read(self.ser.in_waiting), time.monotonic())
         return self.last_status
@@ -0,0 +1,292 @@
+import argparse
+import math
+import os
+import pty
+import random
+import select
+import threading
+import time
+import tty
+from nmea_parser import GGA, RMC, NMEAError, checksum, parse_sentence
+
+# --- CONFIGURATION ---
+LOG_PATH = "gps_log.nmea"   # Recorded NMEA log (raw bytes from the receiver)
+LINK_PATH = "/tmp/ttyGPS"   # Stable name of the pseudo-terminal: set config.SERIAL_PORT to it
+SPEED = 1.0                 # Replay speed (1 = real time, 10 = ten times faster)
+BAUD = 9600                 # Emulated line rate in bits/s (0 = unlimited, only the epoch timing paces the replay)
+FALLBACK_RATE_HZ = 1.0      # Epoch rate for logs without RMC/GGA times
+DROPOUT_RATE = 0.0          # Chance per epoch that a signal dropout starts
+DROPOUT_S = 5.0             # Length of a dropout (log time)
+CORRUPT_RATE = 0.0          # Share of the lines sent corrupted (flipped byte or cut line)
+
+
+def sentence(body):
+    return f"${body}*{checksum(body.encode()):02X}\r\n"
+
+
+def nmea_coord(value, pos, neg, width):
+    hemi = pos if value >= 0 else neg
+    value = abs(value)
+    deg = int(value)
+    return f"{deg:0{width}d}{(value - deg) * 60:08.5f}", hemi
+
+
+def corrupt(line, rng):
+    # Flipped bit (bad checksum) or line cut short (lost bytes), CR LF kept
+    pos = rng.randrange(1, max(2, len(line) - 5))
+    if rng.random() < 0.5:
+        return line[:pos] + bytes([line[pos] ^ 0x01]) + line[pos + 1:]
+    return line[:pos] + b"\r\n"
+
+
+def write_synthetic_log(path, seconds, corrupt_rate=0.0, seed=0):
+    """
+    A 1 Hz multi-GNSS drive as a u-blox receiver prints it: GNRMC, GNVTG,
+    GNGGA, two GNGSA, GPGSV and GLGSV groups and GNGLL per epoch, with a
+    share of corrupted lines.
+    """
+    rng = random.Random(seed)
+    lat, lon, course, speed = 48.8473, 2.3580, 90.0, 0.0
+    with open(path, "wb") as f:
+        for k in range(seconds):
+            speed = min(max(speed + rng.uniform(-1.5, 1.5), 0.0), 36.0)  # m/s
+            course = (course + rng.uniform(-4.0, 4.0)) % 360
+            lat += speed * math.cos(math.radians(course)) / 111320.0
+            lon += speed * math.sin(math.radians(course)) / (111320.0 * math.cos(math.radians(lat)))
+            hms = f"{(k // 3600) % 24:02d}{(k // 60) % 60:02d}{k % 60:02d}.00"
+            la, ns = nmea_coord(lat, "N", "S", 2)
+            lo, ew = nmea_coord(lon, "E", "W", 3)
+            kn = speed / 0.514444
+            lines = [
+                sentence(f"GNRMC,{hms},A,{la},{ns},{lo},{ew},{kn:.3f},{course:.2f},010125,,,A,V"),
+                sentence(f"GNVTG,{course:.2f},T,,M,{kn:.3f},N,{speed * 3.6:.3f},K,A"),
+                sentence(f"GNGGA,{hms},{la},{ns},{lo},{ew},1,12,0.80,45.2,M,46.9,M,,"),
+                sentence("GNGSA,A,3,02,05,12,13,15,18,20,25,29,,,,1.40,0.80,1.15,1"),
+                sentence("GNGSA,A,3,65,66,72,74,,,,,,,,,1.40,0.80,1.15,2"),
+            ]
+            for i in range(3):
+                sats = ",".join(f"{prn:02d},{rng.randint(5, 85):02d},{rng.randint(0, 359):03d},{rng.randint(15, 48)}"
+                                for prn in range(1 + 4 * i, 5 + 4 * i))
+                lines.append(sentence(f"GPGSV,3,{i + 1},11,{sats},1"))
+            for i in range(2):
+                sats = ",".join(f"{prn},{rng.randint(5, 85):02d},{rng.randint(0, 359):03d},{rng.randint(15, 48)}"
+                                for prn in range(65 + 4 * i, 69 + 4 * i))
+                lines.append(sentence(f"GLGSV,2,{i + 1},07,{sats},1"))
+            lines.append(sentence(f"GNGLL,{la},{ns},{lo},{ew},{hms},A,A"))
+            for line in lines:
+                line = line.encode("ascii")
+                f.write(corrupt(line, rng) if rng.random() < corrupt_rate else line)
+
+
+def load_epochs(path):
+    """
+    Log lines grouped per fix epoch: [(utc seconds or None, [lines])].
+    A new epoch starts at each RMC or GGA carrying a new time; times going
+    back (midnight) are unwrapped so they keep increasing.
+    """
+    with open(path, "rb") as f:
+        lines = [line.rstrip(b"\r\n") + b"\r\n" for line in f if line.strip()]
+    epochs = []
+    current, utc, offset = [], None, 0.0
+    for line in lines:
+        try:
+            record = parse_sentence(line)
+        except NMEAError:
+            record = None
+        t = record.time if isinstance(record, (RMC, GGA)) else None
+        if t is not None:
+            if utc is not None and t + offset < utc - 43200:
+                offset += 86400.0
+            t += offset
+            if t != utc:
+                if current:
+                    epochs.append((utc, current))
+                current, utc = [], t
+        current.append(line)
+    if current:
+        epochs.append((utc, current))
+    return epochs
+
+
+class NMEAReplay:
+    """
+    Pseudo-terminal fed with a recorded NMEA log, in place of the receiver's
+    serial port: open `port` (or the `link` symlink) with pyserial like
+    /dev/ttyAMA0. Epochs are sent at their log times / speed, each line at
+    the emulated baud rate, with optional dropouts and corrupted lines.
+
+        with NMEAReplay("drive.nmea", speed=10) as sim:
+            gps = GPSModule(sim.port).start()
+
+    sent_rmc maps the utc of each RMC sent to the monotonic time its last
+    byte was written (end-to-end latency = Fix.t - sent_rmc[Fix.utc]).
+    """
+    def __init__(self, log_path, speed=SPEED, baud=BAUD, link=None, loop=False, dropout_rate=DROPOUT_RATE,
+                 dropout_s=DROPOUT_S, corrupt_rate=CORRUPT_RATE, seed=0):
+        self.epochs = load_epochs(log_path)
+        if not self.epochs:
+            raise ValueError(f"{log_path}: no NMEA lines")
+        self.speed = speed
+        self.baud = baud
+        self.loop = loop
+        self.dropout_rate = dropout_rate
+        self.dropout_s = dropout_s
+        self.corrupt_rate = corrupt_rate
+        self.rng = random.Random(seed)
+        self.master, self.slave = pty.openpty()
+        tty.setraw(self.slave)  # No echo, no CR LF translation
+        os.set_blocking(self.master, False)
+        self.port = os.ttyname(self.slave)
+        self.link = link
+        if link:
+            if os.path.islink(link):
+                os.remove(link)
+            os.symlink(self.port, link)
+            self.port = link
+        self.sent_rmc = {}
+        self.counts = {"epochs": 0, "lines": 0, "bytes": 0, "dropped_epochs": 0, "corrupted": 0}
+        self.max_lag_s = 0.0
+        self.t_start = None
+        self.t_end = None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self.run, name="nmea-replay", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        os.close(self.master)
+        os.close(self.slave)
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def done(self):
+        return self.t_end is not None
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def write(self, data):
+        # Non-blocking master: a reader that stops reading stalls the replay, not stop()
+        while data and self._running:
+            try:
+                n = os.write(self.master, data)
+                data = data[n:]
+            except BlockingIOError:
+                select.select([], [self.master], [], 0.1)
+
+    def run(self):
+        self.t_start = time.monotonic()
+        line_free = self.t_start   # When the emulated line has sent the previous bytes
+        byte_s = 10.0 / self.baud if self.baud else 0.0  # 8N1: 10 bits per byte
+        log_t0 = self.epochs[0][0] or 0.0
+        log_offset = 0.0           # Log time added by each loop
+        dropout_until = -math.inf
+        while self._running:
+            for k, (utc, lines) in enumerate(self.epochs):
+                log_t = (utc - log_t0 if utc is not None else k / FALLBACK_RATE_HZ) + log_offset
+                target = self.t_start + log_t / self.speed
+                delay = target - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self.max_lag_s = max(self.max_lag_s, -delay)
+                if not self._running:
+                    break
+                if log_t < dropout_until:
+                    self.counts["dropped_epochs"] += 1
+                    continue
+                if self.rng.random() < self.dropout_rate:
+                    dropout_until = log_t + self.dropout_s
+                    self.counts["dropped_epochs"] += 1
+                    continue
+                for line in lines:
+                    if self.rng.random() < self.corrupt_rate:
+                        line = corrupt(line, self.rng)
+                        self.counts["corrupted"] += 1
+                    if byte_s:
+                        # Bytes leave at the baud rate: wait until the line would be fully sent
+                        line_free = max(line_free, time.monotonic()) + len(line) * byte_s
+                        delay = line_free - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                    self.write(line)
+                    if line[3:6] == b"RMC" and utc is not None:
+                        self.sent_rmc[utc % 86400.0] = time.monotonic()
+                    self.counts["lines"] += 1
+                    self.counts["bytes"] += len(line)
+                self.counts["epochs"] += 1
+            if not self.loop:
+                break
+            last = self.epochs[-1][0]
+            log_offset += (last - log_t0 if last is not None else len(self.epochs) / FALLBACK_RATE_HZ) + 1.0
+        self.t_end = time.monotonic()
+
+    def stats(self):
+        elapsed = (self.t_end or time.monotonic()) - (self.t_start or time.monotonic())
+        s = dict(self.counts, elapsed_s=elapsed, max_lag_s=self.max_lag_s)
+        s["lines_per_second"] = self.counts["lines"] / elapsed if elapsed > 0 else 0.0
+        return s
+
+    def summary(self):
+        s = self.stats()
+        return (f"{s['epochs']} epochs, {s['lines']} lines ({s['lines_per_second']:.0f}/s), "
+                f"{s['bytes'] / 1024:.0f} KB in {s['elapsed_s']:.1f}s | {s['dropped_epochs']} epochs dropped, "
+                f"{s['corrupted']} lines corrupted | max lag {s['max_lag_s'] * 1000:.0f}ms")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay an NMEA log on a pseudo-terminal (virtual GPS serial port)")
+    parser.add_argument("log", nargs="?", default=LOG_PATH, help="Recorded NMEA log")
+    parser.add_argument("--link", default=LINK_PATH, help="Symlink to the pty, for config.SERIAL_PORT ('' = none)")
+    parser.add_argument("--speed", type=float, default=SPEED, help="Replay speed factor")
+    parser.add_argument("--baud", type=int, default=BAUD, help="Emulated baud rate (0 = unlimited)")
+    parser.add_argument("--loop", action="store_true", help="Replay the log forever")
+    parser.add_argument("--dropout_rate", type=float, default=DROPOUT_RATE)
+    parser.add_argument("--dropout_s", type=float, default=DROPOUT_S)
+    parser.add_argument("--corrupt_rate", type=float, default=CORRUPT_RATE)
+    parser.add_argument("--synthetic", type=int, default=0, metavar="SECONDS",
+                        help="Write a synthetic drive of this length to the log path first")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.synthetic or not os.path.exists(args.log):
+        seconds = args.synthetic or 600
+        print(f"Writing a synthetic {seconds}s drive to {args.log}")
+        write_synthetic_log(args.log, seconds)
+    sim = NMEAReplay(args.log, args.speed, args.baud, args.link or None, args.loop, args.dropout_rate,
+                     args.dropout_s, args.corrupt_rate)
+    print(f"✅ Replaying {args.log} ({len(sim.epochs)} epochs) on {sim.port} at x{args.speed}, "
+          f"{args.baud or 'unlimited'} baud")
+    print(f"   Set SERIAL_PORT = \"{sim.port}\" in config. Ctrl+C to stop.")
+    sim.start()
+    try:
+        while not sim.done():
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.close()
+    print(sim.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,57 @@
 import time
 import os
 import config
-import utils
+import util
 from gps_handler import GPSModule
+from time_sync import FrameAligner
+from track_log import FRAME_DTYPE, TrackWriter, fix_record, frame_record
 
 # Note: You will import your camera library here (e.g., import cv2)
 
+def log_aligned_frames(aligned, frames):
+    # One buffered record per capture instead of a sidecar CSV per image
+    # (sidecars on demand: python track_log.py data/frames.trk --sidecars <folder>)
+    for (path_L, path_R, sats, t_capture), position in aligned:
+        if position["mode"] == "no_fix":
+            print(f"No GPS fix around {os.path.basename(path_L)}, location not logged")
+            continue
+        frames.append(frame_record(path_L, t_capture, position, sats))
+        frames.append(frame_record(path_R, t_capture, position, sats))
+
+
+def log_new_fixes(gps, fixes, last_t):
+    for fix in gps.history(since=last_t):
+        if fix.t > last_t:
+            fixes.append(fix_record(fix))
+            last_t = fix.t
+    return last_t
+
+
 def main():
     print(" PFE Capture System - Production Mode")
     
-    # Initialize GPS
-    gps = GPSModule()
+    # Initialize GPS: the port is drained on a background thread
+    gps = GPSModule().start()
+    # Captures wait for the next fix, their location is interpolated to the capture time
+    aligner = FrameAligner(gps)
     
     # Ensure data directory exists
     if not os.path.exists(config.DATA_LOG_PATH):
         os.makedirs(config.DATA_LOG_PATH)
+    # Append-only binary track logs (track_log.py exports them to CSV)
+    fix_log = TrackWriter(os.path.join(config.DATA_LOG_PATH, "fixes.trk"))
+    frame_log = TrackWriter(os.path.join(config.DATA_LOG_PATH, "frames.trk"), FRAME_DTYPE)
+    last_fix_t = float("-inf")
 
     print(" System standby. Waiting for GPS fix...")
 
     try:
         while True:
-            # 1. Update Sensors
+            # 1. Update Sensors (latest fix, non-blocking)
             gps_status = gps.update()
 
             if gps_status["valid"]:
                 # 2. Get Metadata
-                lat, lon = gps_status["lat"], gps_status["lon"]
                 sats = gps_status["used"]
                 timestamp = time.strftime("%H%M%S")
 
@@ -34,9 +60,10 @@ def main():
                 should_capture = True 
 
                 if should_capture:
-                    # A. Generate filenames
-                    name_L = utils.generate_filename("L", timestamp, lat, lon)
-                    name_R = utils.generate_filename("R", timestamp, lat, lon)
+                    # A. Generate filenames. No coordinates: the fix polled here predates the
+                    # capture, the aligned position is in frames.trk (and its --sidecars export)
+                    name_L = util.format_filename("L", timestamp)
+                    name_R = util.format_filename("R", timestamp)
                     path_L = os.path.join(config.DATA_LOG_PATH, name_L)
                     path_R = os.path.join(config.DATA_LOG_PATH, name_R)
 
@@ -44,19 +71,29 @@ def main():
                     # Example for OpenCV:
                     # cv2.imwrite(path_L, frame_left)
                     # cv2.imwrite(path_R, frame_right)
+                    t_capture = time.monotonic()  # Read right when the frames are grabbed
                     print(f"Saved: {name_L} and {name_R}")
-
-                    # C. Save Metadata Sidecar
-                    utils.save_metadata(path_L, lat, lon, timestamp, sats)
-                    utils.save_metadata(path_R, lat, lon, timestamp, sats)
+                    aligner.add(t_capture, (path_L, path_R, sats, t_capture))
 
             else:
                 print(f"Searching Satellites... (Visible: {gps_status['detected']})", end="\r")
-            
+
+            # C. Log the captures' location, once aligned with the fixes around them
+            log_aligned_frames(aligner.ready(), frame_log)
+            last_fix_t = log_new_fixes(gps, fix_log, last_fix_t)
+
             time.sleep(0.1) # Loop frequency (10Hz)
 
     except KeyboardInterrupt:
-        print("\n System Shut Down.")
+        stats = gps.stats()
+        print(f"\n GPS: {stats['lines']} lines, {stats['fixes']} fixes, {stats['parse_errors']} parse errors")
+        print(" System Shut Down.")
+    finally:
+        log_aligned_frames(aligner.ready(flush=True), frame_log)
+        gps.stop()
+        log_new_fixes(gps, fix_log, last_fix_t)
+        fix_log.close()
+        frame_log.close()
 
 if __name__ == "__main__":
     main()
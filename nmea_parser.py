@@ -0,0 +1,241 @@
+import numpy as np
+from collections import namedtuple
+
+# Sentences parsed, any talker: GP (GPS), GN (multi-GNSS), GL (GLONASS), GA (Galileo), GB/BD (BeiDou)...
+# time = seconds since UTC midnight, lat/lon = signed decimal degrees, speeds in knots (VTG also km/h).
+# Empty fields are None.
+RMC = namedtuple("RMC", ["talker", "time", "valid", "lat", "lon", "speed_kn", "course", "date"])
+GGA = namedtuple("GGA", ["talker", "time", "lat", "lon", "quality", "used", "hdop", "altitude"])
+GSA = namedtuple("GSA", ["talker", "mode", "fix_type", "prns", "pdop", "hdop", "vdop"])
+GSV = namedtuple("GSV", ["talker", "n_messages", "message", "in_view", "fields"])  # fields: raw, see gsv_satellites()
+VTG = namedtuple("VTG", ["talker", "course", "speed_kn", "speed_kmh"])
+
+MAX_PENDING = 1024  # Bytes kept without a newline before the partial line is dropped (a sentence is <= 82)
+VECTOR_MIN_BYTES = 2048  # parse_chunk(): NumPy pays off from this chunk size, smaller reads go line by line
+
+
+class NMEAError(ValueError):
+    pass
+
+
+# Hex digit value of every byte, -1 for non-hex bytes (checksums are read through it)
+HEX = np.full(256, -1, dtype=np.int16)
+for _i, _c in enumerate(b"0123456789ABCDEF"):
+    HEX[_c] = _i
+for _i, _c in enumerate(b"abcdef"):
+    HEX[_c] = 10 + _i
+
+
+def _float(field):
+    return float(field) if field else None
+
+
+def _int(field):
+    return int(field) if field else None
+
+
+def _coord(value, hemisphere):
+    # (d)ddmm.mmmm -> decimal degrees, with arithmetic instead of slicing around the dot
+    if not value:
+        return None
+    v = float(value)
+    deg = v // 100
+    decimal = deg + (v - deg * 100) / 60.0
+    return -decimal if hemisphere in (b'S', b'W') else decimal
+
+
+def _time(field):
+    # hhmmss.ss -> seconds since midnight
+    if not field:
+        return None
+    v = float(field)
+    return (v // 10000) * 3600 + (v // 100 % 100) * 60 + v % 100
+
+
+def _rmc(talker, f):
+    return RMC(talker, _time(f[1]), f[2] == b'A', _coord(f[3], f[4]), _coord(f[5], f[6]),
+               _float(f[7]), _float(f[8]), f[9].decode() if f[9] else None)
+
+
+def _gga(talker, f):
+    return GGA(talker, _time(f[1]), _coord(f[2], f[3]), _coord(f[4], f[5]), _int(f[6]), _int(f[7]),
+               _float(f[8]), _float(f[9]))
+
+
+def _gsa(talker, f):
+    return GSA(talker, f[1].decode(), _int(f[2]), tuple(int(p) for p in f[3:15] if p),
+               _float(f[15]), _float(f[16]), _float(f[17]))
+
+
+def _gsv(talker, f):
+    # The satellite blocks are most of a GSV and rarely read: kept raw, decoded by gsv_satellites()
+    return GSV(talker, int(f[1]), int(f[2]), int(f[3]), f[4:])
+
+
+def gsv_satellites(record):
+    """
+    (prn, elevation, azimuth, snr) of each satellite block of a GSV record.
+    """
+    f = record.fields
+    return [(int(f[i]), _int(f[i + 1]), _int(f[i + 2]), _int(f[i + 3])) for i in range(0, len(f) - 3, 4) if f[i]]
+
+
+def _vtg(talker, f):
+    return VTG(talker, _float(f[1]), _float(f[5]), _float(f[7]))
+
+
+# Sentence type -> (parser, minimum field count including the address field)
+PARSERS = {
+    b"RMC": (_rmc, 10),
+    b"GGA": (_gga, 10),
+    b"GSA": (_gsa, 18),
+    b"GSV": (_gsv, 4),
+    b"VTG": (_vtg, 8),
+}
+
+
+def checksum(body):
+    """
+    XOR of the bytes between '$' and '*'.
+    """
+    c = 0
+    for b in body:
+        c ^= b
+    return c
+
+
+def parse_fields(fields):
+    """
+    Record from the comma-split fields of a checksum-valid sentence
+    (address field first, without '$'). None for other sentence types.
+    Raises NMEAError on a malformed sentence.
+    """
+    address = fields[0]
+    entry = PARSERS.get(address[2:])
+    if entry is None or len(address) != 5:
+        return None
+    parser, n_fields = entry
+    if len(fields) < n_fields:
+        raise NMEAError(f"{address.decode(errors='replace')}: {len(fields)} fields, {n_fields} expected")
+    try:
+        return parser(address[:2].decode(), fields)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise NMEAError(f"{address.decode(errors='replace')}: {e}") from None
+
+
+def parse_sentence(line):
+    """
+    One sentence (bytes, with or without the trailing CR LF) -> record, or None
+    for a valid sentence of another type. Raises NMEAError on a missing '$',
+    a bad checksum or a malformed field.
+    """
+    line = line.rstrip(b"\r\n")
+    star = line.rfind(b"*")
+    if not line.startswith(b"$") or star < 0 or len(line) != star + 3:
+        raise NMEAError(f"not a sentence: {line[:20]!r}")
+    try:
+        expected = int(line[star + 1:], 16)
+    except ValueError:
+        raise NMEAError(f"bad checksum field: {line[:20]!r}") from None
+    if checksum(line[1:star]) != expected:
+        raise NMEAError(f"bad checksum: {line[:20]!r}")
+    return parse_fields(line[1:star].split(b","))
+
+
+def parse_chunk(chunk):
+    """
+    Every complete line of a bytes chunk -> (records, rest, n_lines, n_errors).
+
+    rest = the bytes after the last newline, to prepend to the next chunk.
+    Chunks under VECTOR_MIN_BYTES (a serial read at 9600 baud) are parsed line
+    by line with parse_sentence(): the NumPy set-up costs more than it saves
+    on a few sentences. In larger chunks, line boundaries, '$' and '*'
+    positions and checksums are found for the whole chunk at once with NumPy
+    (running XOR, so a sentence's checksum is two lookups); only the
+    checksum-valid sentences are then split into fields.
+    n_errors counts the lines that are not a valid sentence (corrupted, cut,
+    bad checksum, malformed field). Empty lines and other sentence types are
+    neither records nor errors.
+    """
+    if len(chunk) < VECTOR_MIN_BYTES:
+        return _parse_lines(chunk)
+    arr = np.frombuffer(chunk, dtype=np.uint8)
+    ends = np.flatnonzero(arr == 10)
+    if not ends.size:
+        return [], chunk, 0, 0
+    rest = chunk[ends[-1] + 1:]
+    begins = np.empty_like(ends)
+    begins[0] = 0
+    begins[1:] = ends[:-1] + 1
+    # Strip the CR of CR LF endings
+    stops = ends - (arr[np.maximum(ends - 1, 0)] == 13)
+    lines = stops > begins
+    begins, stops = begins[lines], stops[lines]
+    n_lines = int(begins.size)
+    if not n_lines:
+        return [], rest, 0, 0
+
+    # Sentence = $<body>*hh: the '*' three bytes before the end of the line
+    star = stops - 3
+    ok = (star > begins) & (arr[begins] == 36)
+    star = np.where(ok, star, begins)
+    ok &= arr[star] == 42
+    expected = HEX[arr[star + 1 * ok]] * 16 + HEX[arr[star + 2 * ok]]
+    running = np.bitwise_xor.accumulate(arr)
+    ok &= (expected >= 0) & ((running[star - 1] ^ running[begins]) == expected)
+
+    records = []
+    n_errors = n_lines - int(ok.sum())
+    for b, s in zip(begins[ok].tolist(), star[ok].tolist()):
+        try:
+            record = parse_fields(chunk[b + 1:s].split(b","))
+        except NMEAError:
+            n_errors += 1
+            continue
+        if record is not None:
+            records.append(record)
+    return records, rest, n_lines, n_errors
+
+
+def _parse_lines(chunk):
+    # parse_chunk() for small chunks, same counts
+    *lines, rest = chunk.split(b"\n")
+    records = []
+    n_lines = n_errors = 0
+    for line in lines:
+        if not line or line == b"\r":
+            continue
+        n_lines += 1
+        try:
+            record = parse_sentence(line)
+        except NMEAError:
+            n_errors += 1
+            continue
+        if record is not None:
+            records.append(record)
+    return records, rest, n_lines, n_errors
+
+
+class NMEAStream:
+    """
+    Incremental parser for a byte stream (serial port, log file): keeps the
+    partial line between chunks and counts lines and errors.
+
+        stream = NMEAStream()
+        for record in stream.feed(ser.read(ser.in_waiting)):
+            ...
+    """
+    def __init__(self):
+        self.pending = b""
+        self.lines = 0
+        self.errors = 0
+
+    def feed(self, chunk):
+        records, self.pending, n_lines, n_errors = parse_chunk(self.pending + chunk if self.pending else chunk)
+        if len(self.pending) > MAX_PENDING:
+            # No newline for too long: noise or a wrong baud rate
+            self.pending = b""
+            n_errors += 1
+        self.lines += n_lines
+        self.errors += n_errors
+        return records
@@ -0,0 +1,129 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gps_simulator import write_synthetic_log
+from nmea_parser import GGA, RMC, NMEAError, NMEAStream, parse_sentence
+
+try:
+    import pynmea2
+except ImportError:
+    pynmea2 = None
+
+LOG_PATH = "gps_log.nmea"   # Recorded NMEA log (raw bytes from the receiver)
+CHUNK_SIZE = 4096           # Bytes per read for the stream parser (a log file, or a backlog on a fast port)
+SERIAL_CHUNK_SIZE = 256     # ... and a live read at 9600 baud (parsed line by line below VECTOR_MIN_BYTES)
+REPEAT = 5                  # Best of REPEAT runs, the parsers taking turns (load changes hit all of them)
+SYNTHETIC_SECONDS = 3600    # Length of the drive generated when LOG_PATH does not exist
+CORRUPT_RATE = 0.002        # Share of corrupted lines in the synthetic drive
+
+
+def best_of(runs, repeat):
+    # name -> (best seconds, result), running every fn once per round
+    best = {}
+    for _ in range(repeat):
+        for name, fn in runs.items():
+            t0 = time.perf_counter()
+            result = fn()
+            seconds = time.perf_counter() - t0
+            if name not in best or seconds < best[name][0]:
+                best[name] = (seconds, result)
+    return best
+
+
+def run_pynmea2(lines):
+    # Same work as the old scripts: decode each line, parse with checksum check, convert the position
+    positions, errors = [], 0
+    for raw in lines:
+        line = raw.decode("ascii", errors="replace").strip()
+        if not line:
+            continue
+        try:
+            msg = pynmea2.parse(line, check=True)
+        except (pynmea2.ParseError, pynmea2.ChecksumError, ValueError, AttributeError, TypeError):
+            errors += 1
+            continue
+        if isinstance(msg, (pynmea2.types.talker.RMC, pynmea2.types.talker.GGA)):
+            positions.append((msg.latitude, msg.longitude))
+    return positions, errors
+
+
+def run_per_line(lines):
+    positions, errors = [], 0
+    for raw in lines:
+        if not raw.strip():
+            continue
+        try:
+            msg = parse_sentence(raw)
+        except NMEAError:
+            errors += 1
+            continue
+        if isinstance(msg, (RMC, GGA)):
+            positions.append((msg.lat, msg.lon))
+    return positions, errors
+
+
+def run_stream(data, chunk_size=CHUNK_SIZE):
+    stream = NMEAStream()
+    positions = []
+    for i in range(0, len(data), chunk_size):
+        for msg in stream.feed(data[i:i + chunk_size]):
+            if isinstance(msg, (RMC, GGA)):
+                positions.append((msg.lat, msg.lon))
+    return positions, stream.errors
+
+
+def same_positions(a, b, tol=1e-9):
+    return len(a) == len(b) and all(
+        (p[0] is None and q[0] is None) or (abs(p[0] - q[0]) < tol and abs(p[1] - q[1]) < tol) for p, q in zip(a, b))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NMEA parser throughput: nmea_parser vs pynmea2")
+    parser.add_argument("--log", default=LOG_PATH, help="Recorded NMEA log")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        print(f"No log at {args.log}: writing a synthetic {SYNTHETIC_SECONDS}s multi-GNSS drive there")
+        write_synthetic_log(args.log, SYNTHETIC_SECONDS, CORRUPT_RATE)
+    with open(args.log, "rb") as f:
+        data = f.read()
+    lines = data.splitlines(keepends=True)
+    print(f"Log: {args.log}, {len(lines)} lines, {len(data) / 1024:.0f} KB, best of {args.repeat}")
+
+    runs = {
+        "nmea_parser chunks": lambda: run_stream(data),
+        "nmea_parser serial": lambda: run_stream(data, SERIAL_CHUNK_SIZE),
+        "nmea_parser lines": lambda: run_per_line(lines),
+    }
+    if pynmea2 is not None:
+        runs["pynmea2"] = lambda: run_pynmea2(lines)
+    else:
+        print("⚠️ pynmea2 not installed (pip install pynmea2), comparison skipped")
+
+    results = {}
+    print(f"{'parser':<22}{'lines/s':>12}{'us/line':>10}{'positions':>11}{'rejected':>10}")
+    for name, (seconds, (positions, errors)) in best_of(runs, args.repeat).items():
+        results[name] = (seconds, positions, errors)
+        print(f"{name:<22}{len(lines) / seconds:>12,.0f}{seconds / len(lines) * 1e6:>10.2f}"
+              f"{len(positions):>11}{errors:>10}")
+
+    reference = results["nmea_parser chunks"]
+    if not all(same_positions(reference[1], results[name][1]) for name in ("nmea_parser serial", "nmea_parser lines")):
+        print("⚠️ Chunk and per-line parsing disagree")
+    if "pynmea2" in results:
+        base = results["pynmea2"]
+        print(f"Speedup vs pynmea2: chunks x{base[0] / reference[0]:.1f}, "
+              f"serial x{base[0] / results['nmea_parser serial'][0]:.1f}, "
+              f"lines x{base[0] / results['nmea_parser lines'][0]:.1f}")
+        if same_positions(reference[1], base[1]):
+            print("✅ Same positions as pynmea2")
+        else:
+            print(f"⚠️ Positions differ from pynmea2 ({len(reference[1])} vs {len(base[1])})")
+
+
+if __name__ == "__main__":
+    main()
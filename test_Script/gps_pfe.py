@@ -1,29 +1,31 @@
 import serial
-import pynmea2
 import time
-import csv
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from nmea_parser import GGA, GSA, GSV, NMEAStream
+from track_log import TrackReader, TrackWriter, export_csv
 
 PORT = "/dev/ttyAMA0"
 BAUD = 9600
-CSV_FILE = "gps_positions.csv"
-
-def append_to_csv(timestamp, lat, lon, num_sats, fix_type):
-    file_exists = os.path.isfile(CSV_FILE)
-    with open(CSV_FILE, mode="a", newline="") as f:
-        writer = csv.writer(f)
-        if not file_exists:
-            writer.writerow(["timestamp", "latitude", "longitude", "num_sats", "fix_type", "google_maps"])
+TRACK_FILE = "gps_positions.trk"  # Append-only binary log, buffered
+CSV_FILE = "gps_positions.csv"    # Exported from TRACK_FILE when the script stops
 
-        maps_url = f"https://www.google.com/maps?q={lat},{lon}"
-        writer.writerow([timestamp, lat, lon, num_sats, fix_type, maps_url])
+def append_to_track(track, lat, lon, num_sats, sats_visible, fix_type):
+    # GGA positions: no receiver time, speed or course
+    track.append((time.time(), time.monotonic(), float("nan"), lat, lon, float("nan"), float("nan"),
+                  num_sats, sats_visible, fix_type, True))
 
 def run_gps_analysis():
     lat, lon = None, None
     num_sats = 0      # Satellites used for Fix
     sats_visible = 0  # Satellites seen in sky
+    in_view = {}      # Per constellation: GPGSV, GLGSV, GAGSV...
     fix_type = 1
     last_lat, last_lon = None, None
+    stream = NMEAStream()
+    track = TrackWriter(TRACK_FILE)
 
     try:
         ser = serial.Serial(PORT, baudrate=BAUD, timeout=1)
@@ -33,44 +35,38 @@ def run_gps_analysis():
             start_time = time.time()
 
             while time.time() < start_time + 2:
-                try:
-                    line = ser.readline().decode("ascii", errors="replace").strip()
-                    if not line or not line.startswith('$'):
-                        continue
-
+                # Every complete sentence waiting on the port, checksums checked
+                for msg in stream.feed(ser.read(max(1, ser.in_waiting))):
                     # GSV: Shows how many satellites are visible in the sky
-                    if "GSV" in line:
-                        msg = pynmea2.parse(line)
-                        sats_visible = int(msg.num_svs) if msg.num_svs else 0
+                    if isinstance(msg, GSV):
+                        in_view[msg.talker] = msg.in_view
+                        sats_visible = sum(in_view.values())
 
                     # GGA: Shows how many satellites are actually being USED for coordinates
-                    if "GGA" in line:
-                        msg = pynmea2.parse(line)
-                        num_sats = int(msg.num_sats) if msg.num_sats else 0
-                        if msg.gps_qual > 0:
-                            lat, lon = msg.latitude, msg.longitude
+                    elif isinstance(msg, GGA):
+                        num_sats = msg.used or 0
+                        if msg.quality and msg.lat is not None and msg.lon is not None:
+                            lat, lon = msg.lat, msg.lon
 
                     # GSA: Shows the Fix type (1=No Fix, 2=2D, 3=3D)
-                    if "GSA" in line:
-                        msg = pynmea2.parse(line)
-                        fix_type = int(msg.mode_fix_type) if msg.mode_fix_type else 1
-
-                except Exception:
-                    continue
+                    elif isinstance(msg, GSA):
+                        fix_type = msg.fix_type or 1
 
             timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
             print("\n" + "-"*30)
             print(f"Temps: {timestamp}")
             print(f"Ciel: {sats_visible} satellites visibles")
             print(f"Utilisés: {num_sats} satellites | Fix: {fix_type}D")
+            if stream.errors:
+                print(f"Phrases rejetées: {stream.errors}/{stream.lines}")
 
             if lat is not None and lon is not None:
                 lat_r, lon_r = round(lat, 6), round(lon, 6)
                 print(f"Position: {lat_r}, {lon_r}")
 
                 if (lat_r != last_lat) or (lon_r != last_lon):
-                    append_to_csv(timestamp, lat_r, lon_r, num_sats, fix_type)
-                    print(f"Enregistré dans {CSV_FILE}")
+                    append_to_track(track, lat_r, lon_r, num_sats, sats_visible, fix_type)
+                    print(f"Enregistré dans {TRACK_FILE}")
                     last_lat, last_lon = lat_r, lon_r
                 else:
                     print("Position stable (pas d'écriture)")
@@ -85,6 +81,9 @@ def run_gps_analysis():
     finally:
         if 'ser' in locals():
             ser.close()
+        track.close()
+        n = export_csv(TrackReader(TRACK_FILE).records, CSV_FILE)
+        print(f"{n} positions exportées dans {CSV_FILE}")
 
 if __name__ == "__main__":
     run_gps_analysis()
@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gps_handler import GPSModule
+from gps_simulator import NMEAReplay, write_synthetic_log
+
+# --- CONFIGURATION ---
+LOG_PATH = "gps_log.nmea"   # Recorded NMEA log (a synthetic drive is written there when missing)
+# (replay speed, baud rate): real time on the receiver's 9600 baud, then sentence rates a real port never reaches
+SCENARIOS = [(1, 9600), (10, 115200), (50, 921600), (200, 0)]
+MAX_SECONDS = 15.0          # Log time replayed per scenario is cut to fit in this many seconds
+# Synthetic drive long enough for the fastest scenario to run MAX_SECONDS (3000 s at 200x)
+SYNTHETIC_SECONDS = int(max(speed for speed, _ in SCENARIOS) * MAX_SECONDS)
+DROPOUT_RATE = 0.01
+CORRUPT_RATE = 0.005
+
+
+def run_scenario(log_path, speed, baud, n_epochs):
+    sim = NMEAReplay(log_path, speed=speed, baud=baud, dropout_rate=DROPOUT_RATE, corrupt_rate=CORRUPT_RATE)
+    if len(sim.epochs) < n_epochs:
+        print(f"⚠️ {log_path} has {len(sim.epochs)} epochs, x{speed} needs {n_epochs}: this scenario ends early")
+    sim.epochs = sim.epochs[:n_epochs]
+    gps = GPSModule(sim.port, baud or 921600, history_size=n_epochs)
+    sim.start()
+    gps.start()
+    sim.wait()
+    time.sleep(0.3)  # Let the reader drain the tail
+    gps.stop()
+    sim.close()
+
+    fixes = gps.history()
+    latency = np.array([f.t - sim.sent_rmc[f.utc] for f in fixes if f.utc in sim.sent_rmc]) * 1000
+    s, g = sim.stats(), gps.stats()
+    return {
+        "speed": speed, "baud": baud, "sent_lines": s["lines"], "read_lines": g["lines"],
+        "lines_per_second": g["lines"] / s["elapsed_s"], "corrupted": s["corrupted"],
+        "parse_errors": g["parse_errors"], "rmc_sent": len(sim.sent_rmc), "fixes": g["fixes"],
+        "latency_p50": float(np.percentile(latency, 50)) if latency.size else float("nan"),
+        "latency_p95": float(np.percentile(latency, 95)) if latency.size else float("nan"),
+        "latency_max": float(latency.max()) if latency.size else float("nan"),
+        "max_lag_ms": s["max_lag_s"] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPS ingestion load test on a virtual serial port")
+    parser.add_argument("--log", default=LOG_PATH)
+    args = parser.parse_args()
+    if not os.path.exists(args.log):
+        print(f"No log at {args.log}: writing a synthetic {SYNTHETIC_SECONDS}s drive there")
+        write_synthetic_log(args.log, SYNTHETIC_SECONDS)
+
+    print(f"GPS load test on {args.log}: {DROPOUT_RATE:.0%} dropouts/epoch, {CORRUPT_RATE:.1%} corrupted lines")
+    print(f"{'speed':>6}{'baud':>8}{'lines/s':>10}{'lines':>13}{'corrupt':>9}{'errors':>8}{'fixes':>11}"
+          f"{'lat p50':>9}{'p95':>7}{'max ms':>8}{'lag ms':>8}")
+    for speed, baud in SCENARIOS:
+        r = run_scenario(args.log, speed, baud, int(MAX_SECONDS * speed))
+        print(f"{speed:>6}{baud or '-':>8}{r['lines_per_second']:>10.0f}{r['read_lines']:>6}/{r['sent_lines']:<6}"
+              f"{r['corrupted']:>9}{r['parse_errors']:>8}{r['fixes']:>5}/{r['rmc_sent']:<5}"
+              f"{r['latency_p50']:>9.1f}{r['latency_p95']:>7.1f}{r['latency_max']:>8.1f}{r['max_lag_ms']:>8.0f}")
+    print("lines = read/sent, fixes = published/RMC sent, latency = last RMC byte written -> Fix available, "
+          "lag = replay behind schedule")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import numpy as np
+import time
+
+FIX_LATENCY_S = 0.08        # RMC end of reception after the fix epoch (first sentence of the burst at 9600 baud)
+MAX_EXTRAPOLATION_S = 2.0   # Dead reckoning past the last fix beyond this is "stale"
+MAX_GAP_S = 3.0             # Interpolation across a longer dropout is "stale"
+MAX_WAIT_S = 1.5            # FrameAligner: a frame waits this long for the next fix before being extrapolated
+EARTH_RADIUS_M = 6371008.8
+
+# Alignment of each frame (the "mode" array)
+NO_FIX, INTERPOLATED, EXTRAPOLATED, STALE = 0, 1, 2, 3
+MODES = ("no_fix", "interpolated", "extrapolated", "stale")
+
+
+def fix_arrays(fixes, latency_s=FIX_LATENCY_S):
+    """
+    Valid gps_handler.Fix records -> dict of float64 arrays (t, lat, lon, speed, course),
+    t moved back by the reception latency to the fix epoch.
+    """
+    valid = [f for f in fixes if f.valid]
+    a = np.array([(f.t, f.lat, f.lon, f.speed_mps, f.course) for f in valid], dtype=np.float64).reshape(-1, 5)
+    return {"t": a[:, 0] - latency_s, "lat": a[:, 1], "lon": a[:, 2], "speed": a[:, 3], "course": a[:, 4]}
+
+
+def velocity_deg(lat, speed, course):
+    # Ground velocity (m/s, course over ground) -> (dlat/dt, dlon/dt) in degrees per second
+    c = np.radians(course)
+    vlat = np.degrees(speed * np.cos(c) / EARTH_RADIUS_M)
+    vlon = np.degrees(speed * np.sin(c) / (EARTH_RADIUS_M * np.cos(np.radians(lat))))
+    return vlat, vlon
+
+
+def align(frame_t, fixes, max_extrapolation_s=MAX_EXTRAPOLATION_S, max_gap_s=MAX_GAP_S):
+    """
+    Position and heading of the vehicle at each frame time (time.monotonic(), any shape).
+
+    Between two fixes: cubic Hermite interpolation of lat/lon, with the speed
+    and course over ground of both fixes as end tangents (follows a turn
+    instead of cutting it), heading interpolated along the shortest arc.
+    Past the last fix (or before the first): dead reckoning from the nearest
+    fix's speed and course, clamped to max_extrapolation_s.
+
+    `fixes` = Fix records (GPSModule.history()) or fix_arrays() output.
+    Returns a dict of arrays shaped like frame_t: lat, lon, heading, speed,
+    age (seconds to the nearest fix) and mode (NO_FIX / INTERPOLATED /
+    EXTRAPOLATED / STALE, names in MODES). lat/lon are NaN when mode is NO_FIX.
+    """
+    if not isinstance(fixes, dict):
+        fixes = fix_arrays(fixes)
+    frame_t = np.asarray(frame_t, dtype=np.float64)
+    shape = frame_t.shape
+    t = frame_t.ravel()
+    ft = fixes["t"]
+    n = ft.size
+    out = {key: np.full(t.size, np.nan) for key in ("lat", "lon", "heading", "speed", "age")}
+    out["mode"] = np.full(t.size, NO_FIX, dtype=np.int8)
+    if not n:
+        return {key: value.reshape(shape) for key, value in out.items()}
+
+    vlat, vlon = velocity_deg(fixes["lat"], fixes["speed"], fixes["course"])
+    i1 = np.searchsorted(ft, t, side="right")  # First fix after the frame
+    i0 = i1 - 1                                # Last fix at or before it
+
+    # --- Interpolation between fixes i0 and i1 ---
+    inside = (i0 >= 0) & (i1 < n)
+    a, b = i0[inside], i1[inside]
+    dt = ft[b] - ft[a]
+    w = (t[inside] - ft[a]) / dt
+    h00 = (1 + 2 * w) * (1 - w) ** 2
+    h10 = w * (1 - w) ** 2
+    h01 = w * w * (3 - 2 * w)
+    h11 = w * w * (w - 1)
+    out["lat"][inside] = h00 * fixes["lat"][a] + h10 * dt * vlat[a] + h01 * fixes["lat"][b] + h11 * dt * vlat[b]
+    out["lon"][inside] = h00 * fixes["lon"][a] + h10 * dt * vlon[a] + h01 * fixes["lon"][b] + h11 * dt * vlon[b]
+    turn = (fixes["course"][b] - fixes["course"][a] + 180.0) % 360.0 - 180.0
+    out["heading"][inside] = (fixes["course"][a] + w * turn) % 360.0
+    out["speed"][inside] = fixes["speed"][a] + w * (fixes["speed"][b] - fixes["speed"][a])
+    out["age"][inside] = np.minimum(t[inside] - ft[a], ft[b] - t[inside])
+    out["mode"][inside] = np.where(dt > max_gap_s, STALE, INTERPOLATED)
+
+    # --- Dead reckoning from the nearest end fix ---
+    outside = ~inside
+    k = np.where(i0[outside] < 0, 0, n - 1)
+    dt = t[outside] - ft[k]
+    step = np.clip(dt, -max_extrapolation_s, max_extrapolation_s)
+    out["lat"][outside] = fixes["lat"][k] + vlat[k] * step
+    out["lon"][outside] = fixes["lon"][k] + vlon[k] * step
+    out["heading"][outside] = fixes["course"][k]
+    out["speed"][outside] = fixes["speed"][k]
+    out["age"][outside] = np.abs(dt)
+    out["mode"][outside] = np.where(np.abs(dt) > max_extrapolation_s, STALE, EXTRAPOLATED)
+    return {key: value.reshape(shape) for key, value in out.items()}
+
+
+def as_dict(aligned, i=0):
+    """
+    One frame of an align() result as plain Python values.
+    """
+    d = {key: float(value.flat[i]) for key, value in aligned.items() if key != "mode"}
+    d["mode"] = MODES[int(aligned["mode"].flat[i])]
+    return d
+
+
+class FrameAligner:
+    """
+    Frames waiting for the fix that follows them, so that their position is
+    interpolated rather than extrapolated from the fix before.
+
+        aligner = FrameAligner(gps)
+        aligner.add(time.monotonic(), item)   # at capture
+        for item, position in aligner.ready():
+            ...                                # position = as_dict() of the frame
+
+    ready() aligns every frame older than the last valid fix in one
+    vectorized align() call; a frame still without a later fix after
+    max_wait_s is extrapolated instead.
+    """
+    def __init__(self, gps, max_wait_s=MAX_WAIT_S):
+        self.gps = gps
+        self.max_wait_s = max_wait_s
+        self.pending = []  # (t, item), in capture order
+
+    def add(self, t, item):
+        self.pending.append((t, item))
+
+    def ready(self, now=None, flush=False):
+        if not self.pending:
+            return []
+        now = time.monotonic() if now is None else now
+        oldest = self.pending[0][0]
+        # Valid fixes around the waiting frames, or at least the last valid one (stale position
+        # after a long dropout, when the window only holds V-status fixes)
+        fixes = [f for f in self.gps.history(since=oldest - MAX_GAP_S) if f.valid]
+        if not fixes:
+            fixes = [f for f in self.gps.history() if f.valid][-1:]
+        fixes = fix_arrays(fixes)
+        last_fix = fixes["t"][-1] if fixes["t"].size else -np.inf
+        n_ready = 0
+        for t, _ in self.pending:
+            if t > last_fix and now - t < self.max_wait_s and not flush:
+                break
+            n_ready += 1
+        if not n_ready:
+            return []
+        batch, self.pending = self.pending[:n_ready], self.pending[n_ready:]
+        aligned = align([t for t, _ in batch], fixes)
+        return [(item, as_dict(aligned, i)) for i, (_, item) in enumerate(batch)]
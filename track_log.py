@@ -0,0 +1,250 @@
+import argparse
+import csv
+import json
+import numpy as np
+import os
+import time
+from time_sync import MODES
+from util import save_metadata
+
+MAGIC = b"GPSTRACK1\n"
+HEADER_SIZE = 512          # Magic + JSON record layout, padded: records start at a fixed offset
+BATCH = 256                # Records buffered before a write
+FLUSH_EVERY_S = 30.0       # ... or after this long (bounds what a power cut loses)
+
+# Fixed-width little-endian records. wall = time.time(), t = time.monotonic() (resets at boot),
+# utc = receiver time of day (NaN if none), mode = time_sync alignment code.
+FIX_DTYPE = np.dtype([
+    ("wall", "<f8"), ("t", "<f8"), ("utc", "<f8"), ("lat", "<f8"), ("lon", "<f8"),
+    ("speed", "<f4"), ("course", "<f4"), ("used", "u1"), ("detected", "u1"), ("fix_type", "u1"), ("valid", "u1"),
+])
+FRAME_DTYPE = np.dtype([
+    ("wall", "<f8"), ("t", "<f8"), ("lat", "<f8"), ("lon", "<f8"),
+    ("heading", "<f4"), ("speed", "<f4"), ("age", "<f4"), ("mode", "u1"), ("sats", "u1"), ("name", "S64"),
+])
+
+CSV_HEADER = ["timestamp", "latitude", "longitude", "num_sats", "fix_type", "google_maps"]  # gps_pfe.py's
+
+
+def wall_time(t):
+    # time.monotonic() value of this boot -> time.time()
+    return time.time() - (time.monotonic() - t)
+
+
+def fix_record(fix):
+    """
+    gps_handler.Fix -> FIX_DTYPE field tuple.
+    """
+    return (wall_time(fix.t), fix.t, np.nan if fix.utc is None else fix.utc, fix.lat, fix.lon, fix.speed_mps,
+            fix.course, fix.used, fix.detected, fix.fix_type, fix.valid)
+
+
+def frame_record(name, t, position, sats):
+    """
+    Capture name, time.monotonic() at capture, time_sync.as_dict() position -> FRAME_DTYPE field tuple.
+    """
+    return (wall_time(t), t, position["lat"], position["lon"], position["heading"], position["speed"],
+            position["age"], MODES.index(position["mode"]), sats, os.path.basename(name).encode()[:64])
+
+
+class TrackWriter:
+    """
+    Append-only track log: a 512-byte header (record layout as JSON) then
+    fixed-width binary records back to back. Records are buffered and written
+    BATCH at a time (or every FLUSH_EVERY_S), so a day of driving is a few
+    thousand writes to one open file instead of one open/write/close per row.
+    An existing log is continued (its layout must match).
+
+        track = TrackWriter("data/fixes.trk")
+        track.append(fix_record(fix))
+        track.close()
+    """
+    def __init__(self, path, dtype=FIX_DTYPE, batch=BATCH, flush_every_s=FLUSH_EVERY_S):
+        self.path = path
+        self.dtype = dtype
+        self.flush_every_s = flush_every_s
+        self.buffer = np.zeros(batch, dtype=dtype)
+        self.n = 0
+        self.written = 0
+        self.t_flush = time.monotonic()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path):
+            stored = read_header(path)
+            if stored != dtype:
+                raise ValueError(f"{path}: record layout {stored} differs from {dtype}")
+            self.f = open(path, "r+b")
+            # A record cut by a power cut is overwritten by the next one
+            size = os.path.getsize(path)
+            self.f.seek(size - (size - HEADER_SIZE) % dtype.itemsize)
+            self.f.truncate()
+        else:
+            self.f = open(path, "wb")
+            self.f.write(make_header(dtype))
+
+    def append(self, record):
+        self.buffer[self.n] = record
+        self.n += 1
+        if self.n == len(self.buffer) or time.monotonic() - self.t_flush > self.flush_every_s:
+            self.flush()
+
+    def flush(self):
+        if self.n:
+            self.f.write(self.buffer[:self.n].tobytes())
+            self.written += self.n
+            self.n = 0
+        self.f.flush()
+        self.t_flush = time.monotonic()
+
+    def fsync(self):
+        self.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        self.fsync()
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def make_header(dtype):
+    layout = json.dumps(dtype.descr).encode()
+    if len(MAGIC) + len(layout) + 1 > HEADER_SIZE:
+        raise ValueError("record layout too long for the header")
+    return (MAGIC + layout + b"\n").ljust(HEADER_SIZE, b" ")
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if not header.startswith(MAGIC):
+        raise ValueError(f"{path}: not a GPS track log")
+    descr = json.loads(header[len(MAGIC):].split(b"\n", 1)[0])
+    return np.dtype([tuple(field) for field in descr])
+
+
+class TrackReader:
+    """
+    Memory-mapped view of a track log: opening it reads the header only.
+    Records are assumed appended in time order (wall clock), so time ranges
+    are two binary searches; bounding boxes are one vectorized test.
+
+        track = TrackReader("data/fixes.trk")
+        rows = track.select(t0=time.time() - 3600, bbox=(48.80, 2.25, 48.90, 2.42))
+        export_csv(rows, "gps_positions.csv")
+    """
+    def __init__(self, path):
+        self.path = path
+        self.dtype = read_header(path)
+        n = (os.path.getsize(path) - HEADER_SIZE) // self.dtype.itemsize  # Drops a cut last record
+        self.records = (np.memmap(path, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(n,)) if n
+                        else np.zeros(0, dtype=self.dtype))
+
+    def __len__(self):
+        return len(self.records)
+
+    def time_range(self, t0=None, t1=None):
+        """
+        Records with t0 <= wall < t1 (time.time() values), as a memmap slice.
+        """
+        wall = self.records["wall"]
+        i0 = 0 if t0 is None else int(np.searchsorted(wall, t0, side="left"))
+        i1 = len(wall) if t1 is None else int(np.searchsorted(wall, t1, side="left"))
+        return self.records[i0:i1]
+
+    def select(self, t0=None, t1=None, bbox=None, valid_only=False):
+        """
+        time_range() records inside bbox = (lat_min, lon_min, lat_max, lon_max).
+        """
+        rows = self.time_range(t0, t1)
+        keep = np.ones(len(rows), dtype=bool)
+        if bbox is not None:
+            lat_min, lon_min, lat_max, lon_max = bbox
+            lat, lon = rows["lat"], rows["lon"]
+            keep &= (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        if valid_only and "valid" in rows.dtype.names:
+            keep &= rows["valid"].astype(bool)
+        return rows if keep.all() else rows[keep]
+
+    def close(self):
+        self.records = None
+
+
+def export_csv(rows, path, changes_only=True):
+    """
+    Fix records -> the CSV of test_Script/gps_pfe.py (same header and columns).
+    changes_only keeps a row only when the rounded position moved, like gps_pfe.
+    """
+    if "valid" not in rows.dtype.names:
+        raise ValueError("export_csv() takes fix records (frame records: export_metadata())")
+    rows = rows[rows["valid"].astype(bool)]
+    lat, lon = np.round(rows["lat"], 6), np.round(rows["lon"], 6)
+    if changes_only and len(rows):
+        moved = np.ones(len(rows), dtype=bool)
+        moved[1:] = (lat[1:] != lat[:-1]) | (lon[1:] != lon[:-1])
+        rows, lat, lon = rows[moved], lat[moved], lon[moved]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for r, la, lo in zip(rows, lat.tolist(), lon.tolist()):
+            writer.writerow([time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r["wall"])), la, lo,
+                             int(r["used"]), int(r["fix_type"]), f"https://www.google.com/maps?q={la},{lo}"])
+    return len(rows)
+
+
+def export_metadata(rows, folder):
+    """
+    Frame records -> one util.save_metadata() sidecar CSV per capture in `folder`.
+    """
+    n = 0
+    for r in rows:
+        if MODES[r["mode"]] == "no_fix":
+            continue
+        position = {"heading": float(r["heading"]), "speed": float(r["speed"]), "age": float(r["age"]),
+                    "mode": MODES[r["mode"]]}
+        lat, lon = round(float(r["lat"]), 6), round(float(r["lon"]), 6)
+        save_metadata(os.path.join(folder, r["name"].decode()), lat, lon,
+                      time.strftime("%H%M%S", time.localtime(r["wall"])), int(r["sats"]), position)
+        n += 1
+    return n
+
+
+def parse_time(value):
+    # "YYYY-mm-dd HH:MM:SS" (local time) or seconds since the epoch
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return time.mktime(time.strptime(value, "%Y-%m-%d %H:%M:%S"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slice and export a GPS track log")
+    parser.add_argument("track", help="Track log (.trk)")
+    parser.add_argument("--start", help="'YYYY-mm-dd HH:MM:SS' or epoch seconds")
+    parser.add_argument("--end", help="'YYYY-mm-dd HH:MM:SS' or epoch seconds")
+    parser.add_argument("--bbox", type=float, nargs=4, metavar=("LAT_MIN", "LON_MIN", "LAT_MAX", "LON_MAX"))
+    parser.add_argument("--csv", help="Export fixes to this CSV (gps_pfe.py format)")
+    parser.add_argument("--all_rows", action="store_true", help="CSV: keep the rows where the position did not move")
+    parser.add_argument("--sidecars", help="Export frame records as save_metadata() CSVs into this folder")
+    args = parser.parse_args()
+
+    track = TrackReader(args.track)
+    rows = track.select(parse_time(args.start), parse_time(args.end), args.bbox)
+    print(f"{args.track}: {len(track)} records, {len(rows)} selected")
+    if args.csv:
+        n = export_csv(rows, args.csv, changes_only=not args.all_rows)
+        print(f"✅ {n} rows written to {args.csv}")
+    if args.sidecars:
+        n = export_metadata(rows, args.sidecars)
+        print(f"✅ {n} metadata files written to {args.sidecars}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,426 @@
+import argparse
+import os
+import time
+from glob import glob
+
+import cv2
+import numpy as np
 import torch
+import torch.nn as nn
 import torch.onnx
 from models.model_stages import BiSeNet  # We need this just once for export
 
 # --- CONFIG ---
 MODEL_PATH = 'pths/stdc813m_maxmiou_4.pth'
 OUTPUT_ONNX = 'onnxs/stdc813m_maxmiou_4.onnx'
+OUTPUT_MASK_ONNX = 'onnxs/stdc813m_maxmiou_4_mask.onnx'
+SLIM_SUFFIX = '_slim'  # --slim writes e.g. onnxs/stdc813m_maxmiou_4_slim.onnx
+BATCH_SUFFIX = '_batch'  # --dynamic_batch writes e.g. onnxs/stdc813m_maxmiou_4_mask_batch.onnx
 INPUT_SHAPE = (1, 3, 512, 1024)  # (Batch, Channels, Height, Width) - Fixed size is best for NPUs
+# --verify fails above this fraction of mask pixels differing from PyTorch. In-graph normalization
+# only changes float rounding, i.e. a few pixels where both logits are nearly tied.
+MAX_PARITY_MISMATCH = 1e-4
+# --slim fails above this fraction of mask pixels differing from the as-is graph (BN folding
+# reorders float operations, so only near-tied logits may flip)
+MAX_SLIM_MISMATCH = 1e-4
+
+# ImageNet statistics used during training (RGB order)
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+
+
+def load_model():
+    # 1. Load the PyTorch Model as usual
+    print("Loading PyTorch model...")
+    model = BiSeNet(backbone='STDCNet813', n_classes=2, use_boundary_8=True)
+    state_dict = torch.load(MODEL_PATH, map_location='cpu')
+
+    # Clean keys (same as your inference script)
+    new_state_dict = {}
+    for k, v in state_dict.items():
+        k = k.replace("module.", "").replace(".bn.bn.", ".bn.")
+        new_state_dict[k] = v
+    model.load_state_dict(new_state_dict, strict=False)
+    model.eval()
+    return model
+
+
+class InferenceOnly(nn.Module):
+    """
+    Returns only the main segmentation output. The auxiliary heads (out16 / out32)
+    and the detail branch are then unused by the traced graph and dropped by the exporter.
+    """
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x):
+        return self.model(x)[0]
+
+
+def fold_batchnorm(model):
+    """
+    Folds every eval-mode BatchNorm2d into the Conv2d that feeds it, using the
+    naming of the STDC code: (conv, bn) in ConvX / ConvBNReLU and
+    (conv_atten, bn_atten) in the attention modules. The BN is replaced by Identity.
+    Returns the number of folded pairs.
+    """
+    from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+    n_folded = 0
+    for module in model.modules():
+        for name, child in list(module.named_children()):
+            if not isinstance(child, nn.BatchNorm2d):
+                continue
+            conv_name = 'conv' if name == 'bn' else ('conv_' + name[3:] if name.startswith('bn_') else None)
+            conv = getattr(module, conv_name, None) if conv_name else None
+            if isinstance(conv, nn.Conv2d) and conv.out_channels == child.num_features:
+                setattr(module, conv_name, fuse_conv_bn_eval(conv, child))
+                setattr(module, name, nn.Identity())
+                n_folded += 1
+    return n_folded
+
+
+def slim_model(model):
+    """
+    Inference-only copy of the model: no detail branch, BN folded into convs.
+    """
+    if hasattr(model, 'use_boundary_8'):
+        # The boundary-8 detail head is only there for the training loss
+        model.use_boundary_8 = False
+    n_folded = fold_batchnorm(model)
+    print(f"Folded {n_folded} BatchNorm layers into convolutions")
+    return model.eval()
+
+
+def simplify_onnx(path):
+    try:
+        import onnx
+        import onnxsim
+    except ImportError:
+        print("onnxsim not installed, skipping graph simplification (pip install onnxsim)")
+        return path
+
+    simplified, ok = onnxsim.simplify(onnx.load(path))
+    if ok:
+        onnx.save(simplified, path)
+        print(f"Simplified graph saved to {path}")
+    else:
+        print("onnxsim could not validate the simplified graph, keeping the original")
+    return path
+
+
+class RoadMaskExport(nn.Module):
+    """
+    Deployment wrapper: uint8 BGR frame (N, H, W, 3) as decoded by OpenCV
+    -> uint8 road mask (N, H, W).
+    BGR->RGB, HWC->CHW and mean/std normalization run inside the graph, and
+    the 2-class argmax becomes a single logit comparison.
+    """
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+        self.register_buffer('mean', torch.tensor(MEAN).view(1, 3, 1, 1) * 255.0)
+        self.register_buffer('std', torch.tensor(STD).view(1, 3, 1, 1) * 255.0)
+
+    def forward(self, x):
+        x = x.permute(0, 3, 1, 2)[:, [2, 1, 0]].float()
+        x = (x - self.mean) / self.std
+        logits = self.model(x)[0]
+        if logits.shape[1] == 2:
+            # argmax picks class 0 on ties, so does a strict comparison
+            mask = logits[:, 1] > logits[:, 0]
+        else:
+            mask = logits.argmax(dim=1)
+        return mask.to(torch.uint8)
+
+
+def band_path(path, h, w):
+    # --height writes e.g. onnxs/stdc813m_maxmiou_4_mask_1024x256.onnx
+    root, ext = os.path.splitext(path)
+    return f"{root}_{w}x{h}{ext}"
+
+
+def batch_path(path):
+    root, ext = os.path.splitext(path)
+    return root + BATCH_SUFFIX + ext
+
+
+def slim_path(path):
+    root, ext = os.path.splitext(path)
+    return root + SLIM_SUFFIX + ext
+
+
+def batch_axes(output_name, dynamic_batch):
+    # Dynamic batch axis for the offline batch mode (NPU flows need the fixed shape)
+    if not dynamic_batch:
+        return None
+    return {'input': {0: 'batch'}, output_name: {0: 'batch'}}
+
+
+def export_logits(model, output_path=OUTPUT_ONNX, dynamic_batch=False):
+    # Create a dummy input
+    # This helps ONNX "trace" the execution flow to understand the architecture
+    dummy_input = torch.randn(*INPUT_SHAPE)
+
+    print(f"Exporting to {output_path}...")
+    torch.onnx.export(
+        model,
+        dummy_input,
+        output_path,
+        opset_version=11,          # Opset 11 is widely supported by AI HATs
+        input_names=['input'],     # Name of the input layer
+        output_names=['output'],   # Name of the output layer
+        dynamic_axes=batch_axes('output', dynamic_batch),
+        do_constant_folding=True   # Optimizes constants
+    )
+    return output_path
+
+
+def export_mask(model, output_path=OUTPUT_MASK_ONNX, dynamic_batch=False):
+    _, _, h, w = INPUT_SHAPE
+    dummy_input = torch.randint(0, 256, (1, h, w, 3), dtype=torch.uint8)
+
+    print(f"Exporting uint8 mask model to {output_path}...")
+    torch.onnx.export(
+        RoadMaskExport(model).eval(),
+        dummy_input,
+        output_path,
+        opset_version=11,
+        input_names=['input'],     # uint8 NHWC, BGR
+        output_names=['mask'],     # uint8 NHW, 1 = road
+        dynamic_axes=batch_axes('mask', dynamic_batch),
+        do_constant_folding=True
+    )
+    return output_path
+
+
+def load_test_frames(pattern, n_frames):
+    """
+    uint8 BGR frames at model resolution: real images if a glob is given, random otherwise.
+    """
+    _, _, h, w = INPUT_SHAPE
+    files = sorted(glob(pattern))[:n_frames] if pattern else []
+    frames = [cv2.resize(cv2.imread(f), (w, h)) for f in files]
+    rng = np.random.default_rng(0)
+    while len(frames) < n_frames:
+        frames.append(rng.integers(0, 256, (h, w, 3), dtype=np.uint8))
+    return frames
+
+
+def numpy_normalize(frame_bgr):
+    # Same float path as the runtime pipeline before the mask export
+    img = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2RGB).astype(np.float32) / 255.0
+    img = (img - np.array(MEAN, dtype=np.float32)) / np.array(STD, dtype=np.float32)
+    return img.transpose(2, 0, 1)[np.newaxis].astype(np.float32)
+
+
+def verify_mask_export(model, mask_onnx, frames):
+    """
+    Parity test: PyTorch reference (float input, argmax) vs the exported uint8 mask graph.
+    Returns the fraction of pixels that disagree, raises above MAX_PARITY_MISMATCH.
+    """
+    import onnxruntime as ort
+    sess = ort.InferenceSession(mask_onnx, providers=['CPUExecutionProvider'])
+    input_name = sess.get_inputs()[0].name
+
+    mismatched, total = 0, 0
+    for frame in frames:
+        with torch.no_grad():
+            ref = model(torch.from_numpy(numpy_normalize(frame)))[0].argmax(dim=1)[0].numpy().astype(np.uint8)
+        mask = sess.run(None, {input_name: frame[np.newaxis]})[0][0]
+        mismatched += np.count_nonzero(mask != ref)
+        total += ref.size
+
+    ratio = mismatched / total
+    print(f"Parity vs PyTorch: {mismatched} / {total} pixels differ ({ratio * 100:.4f}%)")
+    if ratio > MAX_PARITY_MISMATCH:
+        raise RuntimeError(f"{mask_onnx}: {ratio * 100:.4f}% of the mask pixels differ from PyTorch "
+                           f"(max {MAX_PARITY_MISMATCH * 100:.4f}%), check the in-graph normalization and argmax")
+    return ratio
+
+
+def benchmark_cpu(logits_onnx, mask_onnx, frames, n_runs=20):
+    """
+    CPU ONNX Runtime latency, input already resized:
+    float graph + numpy normalization + numpy argmax vs uint8 mask graph.
+    """
+    import onnxruntime as ort
+    providers = ['CPUExecutionProvider']
+    logits_sess = ort.InferenceSession(logits_onnx, providers=providers)
+    mask_sess = ort.InferenceSession(mask_onnx, providers=providers)
+    logits_in = logits_sess.get_inputs()[0].name
+    mask_in = mask_sess.get_inputs()[0].name
+
+    def run_logits(frame):
+        out = logits_sess.run(None, {logits_in: numpy_normalize(frame)})
+        return np.argmax(out[0][0], axis=0).astype(np.uint8)
+
+    def run_mask(frame):
+        return mask_sess.run(None, {mask_in: frame[np.newaxis]})[0][0]
+
+    results = {}
+    for name, fn in (("logits + numpy argmax", run_logits), ("uint8 mask graph", run_mask)):
+        fn(frames[0])  # warm-up
+        t0 = time.perf_counter()
+        for i in range(n_runs):
+            fn(frames[i % len(frames)])
+        results[name] = (time.perf_counter() - t0) / n_runs * 1000
+        print(f"{name:<24}: {results[name]:.1f} ms/frame")
+    return results
+
+
+def graph_stats(onnx_path):
+    """
+    Parameter count (initializer elements) and FLOPs (2 x MACs of Conv / Gemm / MatMul)
+    of an ONNX graph, using ONNX shape inference for the output sizes.
+    """
+    import onnx
+    from onnx import numpy_helper, shape_inference
+
+    model = shape_inference.infer_shapes(onnx.load(onnx_path))
+    graph = model.graph
+    inits = {init.name: numpy_helper.to_array(init).shape for init in graph.initializer}
+    n_params = int(sum(np.prod(shape) for shape in inits.values()))
+
+    shapes = {}
+    for vi in list(graph.value_info) + list(graph.output) + list(graph.input):
+        dims = vi.type.tensor_type.shape.dim
+        shapes[vi.name] = [d.dim_value for d in dims]
+
+    macs = 0
+    for node in graph.node:
+        if node.op_type == 'Conv' and node.input[1] in inits and node.output[0] in shapes:
+            c_out, c_in_per_group, kh, kw = inits[node.input[1]]
+            macs += int(np.prod(shapes[node.output[0]])) * c_in_per_group * kh * kw
+        elif node.op_type in ('Gemm', 'MatMul') and node.input[1] in inits and node.output[0] in shapes:
+            macs += int(np.prod(shapes[node.output[0]])) * inits[node.input[1]][0]
+
+    return {
+        "params": n_params,
+        "gflops": 2 * macs / 1e9,
+        "size_mb": os.path.getsize(onnx_path) / 1e6,
+        "nodes": len(graph.node),
+        "outputs": len(graph.output),
+    }
+
+
+def run_masks(onnx_path, frames, n_runs=20):
+    """
+    Road masks of an exported graph (logits or mask mode) and its CPU latency.
+    """
+    import onnxruntime as ort
+    sess = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+    input_name = sess.get_inputs()[0].name
+    uint8_input = sess.get_inputs()[0].type == 'tensor(uint8)'
+
+    def infer(frame):
+        if uint8_input:
+            return sess.run(None, {input_name: frame[np.newaxis]})[0][0]
+        out = sess.run(None, {input_name: numpy_normalize(frame)})[0]
+        return np.argmax(out[0], axis=0).astype(np.uint8)
+
+    masks = [infer(frame) for frame in frames]
+    t0 = time.perf_counter()
+    for i in range(n_runs):
+        infer(frames[i % len(frames)])
+    latency_ms = (time.perf_counter() - t0) / n_runs * 1000
+    return masks, latency_ms
+
+
+def compare_slim(base_onnx, slim_onnx, frames):
+    """
+    Checks that the slim graph gives the same masks (raises above MAX_SLIM_MISMATCH)
+    and prints before/after figures.
+    """
+    base_masks, base_ms = run_masks(base_onnx, frames)
+    slim_masks, slim_ms = run_masks(slim_onnx, frames)
+    differing = sum(int(np.count_nonzero(a != b)) for a, b in zip(base_masks, slim_masks))
+    total = sum(m.size for m in base_masks)
+
+    before, after = graph_stats(base_onnx), graph_stats(slim_onnx)
+    before["latency_ms"], after["latency_ms"] = base_ms, slim_ms
+
+    print("\n" + "=" * 60)
+    print(f"{'':<14}{'as-is':>14}{'slim':>14}{'change':>14}")
+    for key, fmt in (("params", "{:,.0f}"), ("gflops", "{:.2f}"), ("size_mb", "{:.2f}"),
+                     ("latency_ms", "{:.1f}"), ("nodes", "{:.0f}"), ("outputs", "{:.0f}")):
+        change = (after[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+        print(f"{key:<14}{fmt.format(before[key]):>14}{fmt.format(after[key]):>14}{change:>13.1f}%")
+    print("=" * 60)
+    print(f"Mask agreement: {total - differing} / {total} pixels identical ({differing} differ)")
+    if differing / total > MAX_SLIM_MISMATCH:
+        raise RuntimeError(f"{slim_onnx}: {differing / total * 100:.4f}% of the mask pixels differ from {base_onnx} "
+                           f"(max {MAX_SLIM_MISMATCH * 100:.4f}%), do not deploy the slim graph")
+    if differing:
+        print(f"✅ Masks within float rounding of the as-is graph (max {MAX_SLIM_MISMATCH * 100:.4f}% differing).")
+    else:
+        print("✅ Slim graph produces identical masks.")
+    return differing
+
+
+def parse_args():
+    parse = argparse.ArgumentParser()
+    parse.add_argument('--mode', dest='mode', type=str, default='logits', choices=['logits', 'mask'],
+                       help="logits: float NCHW -> 2-ch logits (Hailo flow) | mask: uint8 NHWC -> uint8 mask")
+    parse.add_argument('--verify', dest='verify', action='store_true',
+                       help="Parity test of the mask graph against PyTorch")
+    parse.add_argument('--benchmark', dest='benchmark', action='store_true',
+                       help="CPU ONNX Runtime latency of the logits graph vs the mask graph")
+    parse.add_argument('--images', dest='images', type=str, default='',
+                       help="Glob of test images for --verify/--benchmark (random frames if empty)")
+    parse.add_argument('--n_frames', dest='n_frames', type=int, default=8)
+    parse.add_argument('--slim', dest='slim', action='store_true',
+                       help="Inference-only graph: drop aux/detail heads, fold BN, simplify, then compare with the as-is graph")
+    parse.add_argument('--height', dest='height', type=int, default=0,
+                       help="Input height for a band export (ROI mode of the obstacle pipeline: the 40%%..85%% band "
+                            "of a 2:1 frame at 1024 wide is ~230 rows -> 256). Multiple of 32. 0 = INPUT_SHAPE")
+    parse.add_argument('--dynamic_batch', dest='dynamic_batch', action='store_true',
+                       help="Dynamic batch axis, for offline_batch.py (CPU/GPU ONNX Runtime only)")
+    return parse.parse_args()
+
+
+def main():
+    global INPUT_SHAPE, OUTPUT_ONNX, OUTPUT_MASK_ONNX
+    args = parse_args()
+    if args.height:
+        if args.height % 32:
+            raise ValueError(f"--height must be a multiple of 32 (STDC output stride), got {args.height}")
+        INPUT_SHAPE = (*INPUT_SHAPE[:2], args.height, INPUT_SHAPE[3])
+        OUTPUT_ONNX = band_path(OUTPUT_ONNX, *INPUT_SHAPE[2:])
+        OUTPUT_MASK_ONNX = band_path(OUTPUT_MASK_ONNX, *INPUT_SHAPE[2:])
+    if args.dynamic_batch:
+        OUTPUT_ONNX = batch_path(OUTPUT_ONNX)
+        OUTPUT_MASK_ONNX = batch_path(OUTPUT_MASK_ONNX)
+    model = load_model()
+    os.makedirs(os.path.dirname(OUTPUT_ONNX), exist_ok=True)
+
+    export_fn = export_mask if args.mode == 'mask' else export_logits
+    base_path = OUTPUT_MASK_ONNX if args.mode == 'mask' else OUTPUT_ONNX
+    export_fn(model, base_path, args.dynamic_batch)
+
+    if args.slim:
+        # Separate copy: folding BN modifies the modules in place
+        slim = slim_model(load_model())
+        path = export_fn(InferenceOnly(slim) if args.mode == 'logits' else slim, slim_path(base_path),
+                         args.dynamic_batch)
+        simplify_onnx(path)
+        compare_slim(base_path, path, load_test_frames(args.images, args.n_frames))
+
+    if args.verify or args.benchmark:
+        # Both graphs must come from the checkpoint being exported now
+        if args.mode != 'mask':
+            export_mask(model, OUTPUT_MASK_ONNX, args.dynamic_batch)
+        elif args.benchmark:
+            export_logits(model, OUTPUT_ONNX, args.dynamic_batch)
+
+        frames = load_test_frames(args.images, args.n_frames)
+        if args.verify:
+            verify_mask_export(model, OUTPUT_MASK_ONNX, frames)
+        if args.benchmark:
+            benchmark_cpu(OUTPUT_ONNX, OUTPUT_MASK_ONNX, frames)
+    print("✅ Export success! You can now delete the 'models' folder for deployment.")
+
 
-# 1. Load the PyTorch Model as usual
-print("Loading PyTorch model...")
-model = BiSeNet(backbone='STDCNet813', n_classes=2, use_boundary_8=True)
-state_dict = torch.load(MODEL_PATH, map_location='cpu')
-
-# Clean keys (same as your inference script)
-new_state_dict = {}
-for k, v in state_dict.items():
-    k = k.replace("module.", "").replace(".bn.bn.", ".bn.")
-    new_state_dict[k] = v
-model.load_state_dict(new_state_dict, strict=False)
-model.eval()
-
-# 2. Create a dummy input
-# This helps ONNX "trace" the execution flow to understand the architecture
-dummy_input = torch.randn(*INPUT_SHAPE)
-
-# 3. Export to ONNX
-print(f"Exporting to {OUTPUT_ONNX}...")
-torch.onnx.export(
-    model,
-    dummy_input,
-    OUTPUT_ONNX,
-    opset_version=11,          # Opset 11 is widely supported by AI HATs
-    input_names=['input'],     # Name of the input layer
-    output_names=['output'],   # Name of the output layer
-    do_constant_folding=True   # Optimizes constants
-)
-
-print("✅ Export success! You can now delete the 'models' folder for deployment.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
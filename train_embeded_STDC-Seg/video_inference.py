@@ -2,11 +2,16 @@ import torch
 import cv2
 import numpy as np
 import os
+import sys
 import time
-from glob import glob
 from torchvision import transforms
 from models.model_stages import BiSeNet
 
+# Shared frame source of the embedded pipeline (background decode + read-ahead)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "embeded_obstacle_detection"))
+from frame_source import FrameSource
+from backends import TorchBackend
+
 # --- CONFIGURATION ---
 MODEL_PATH = 'pths/stdc813m_maxmiou_4.pth'
 MODEL_NAME = os.path.basename(MODEL_PATH)
@@ -15,6 +20,7 @@ VIDEO_SOURCE = 'data/lost_and_found_formatted/images/train/*.png'
 # VIDEO_SOURCE = 'my_drive_video.mp4'
 
 INPUT_SIZE = (1024, 512)
+READ_AHEAD = 4
 
 class InferenceDemo:
     def __init__(self):
@@ -41,6 +47,8 @@ class InferenceDemo:
 
         self.model.to(self.device)
         self.model.eval()
+        # Same interface as the ONNX backends of the embedded pipeline (first output only)
+        self.backend = TorchBackend(self.model, [1, 3, INPUT_SIZE[1], INPUT_SIZE[0]], device=self.device)
 
         # 2. Preprocessing
         self.transform = transforms.Compose([
@@ -116,45 +124,33 @@ class InferenceDemo:
             y += line_height
 
     def run(self):
-        if '*' in VIDEO_SOURCE:
-            files = sorted(glob(VIDEO_SOURCE))
-            print(f"Found {len(files)} images. Press 'q' to quit.")
-            is_video = False
-        else:
-            cap = cv2.VideoCapture(VIDEO_SOURCE)
-            is_video = True
+        source = FrameSource(VIDEO_SOURCE, INPUT_SIZE, READ_AHEAD)
+        is_video = source.kind != "images"
+        if is_video:
             print("Starting video. Press 'q' to quit.")
+        else:
+            print(f"Found {len(source)} images. Press 'q' to quit.")
 
-        idx = 0
-        while True:
+        for packet in source:
             start_time = time.time()
-
-            if is_video:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-            else:
-                if idx >= len(files):
-                    break
-                frame = cv2.imread(files[idx])
-                idx += 1
+            frame = packet["frame"]
+            idx = packet["idx"] + 1
 
             input_tensor, frame_resized = self.preprocess(frame)
 
-            with torch.no_grad():
-                output = self.model(input_tensor)[0]
-                prediction = output.argmax(dim=1).squeeze().cpu().numpy().astype(np.uint8)
+            output = self.backend.run(input_tensor)[0]
+            prediction = output.argmax(axis=1).squeeze().astype(np.uint8)
 
-                # Debug info
-                unique_classes = np.unique(prediction)
-                print(f"Frame {idx}: Classes found = {unique_classes}")
+            # Debug info
+            unique_classes = np.unique(prediction)
+            print(f"Frame {idx}: Classes found = {unique_classes} (decode {packet['decode_ms']:.1f} ms)")
 
-                total_pixels = prediction.size
-                for c in unique_classes:
-                    count = np.count_nonzero(prediction == c)
-                    percent = (count / total_pixels) * 100
-                    print(f"   {self.class_names[c]} ({c}): {percent:.1f}%")
-                print("-" * 20)
+            total_pixels = prediction.size
+            for c in unique_classes:
+                count = np.count_nonzero(prediction == c)
+                percent = (count / total_pixels) * 100
+                print(f"   {self.class_names[c]} ({c}): {percent:.1f}%")
+            print("-" * 20)
 
             # Visualization
             seg_img = self.colors[prediction]
@@ -181,8 +177,8 @@ class InferenceDemo:
             if cv2.waitKey(wait_time) & 0xFF == ord('q'):
                 break
 
-        if is_video:
-            cap.release()
+        source.close()
+        print(f"Frames: {source.summary()}")
         cv2.destroyAllWindows()
 
 if __name__ == "__main__":
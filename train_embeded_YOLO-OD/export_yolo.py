@@ -5,6 +5,16 @@ import os
 # Path from your provided script
 MODEL_PATH = "od_models/yolov8s_best_2.pt" 
 IMG_SIZE = 640
+# Rectangular input matched to the camera aspect ratio (h, w). Lost&Found frames are
+# 2:1 (2048x1024 -> 640x320), so a 640x640 input is half grey letterbox padding.
+# None = the square IMG_SIZE export (the model the pipeline deploys).
+# Written next to it as <name>_<h>x<w>.onnx, e.g. (320, 640) -> yolov8s_best_2_320x640.onnx
+# ROI band mode of the obstacle pipeline (rows 40%..85% of a 2:1 frame -> 640x144): (160, 640)
+RECT_IMG_SIZE = None
+# Dynamic batch axis for offline_batch.py (CPU ONNX Runtime, never for the AI HAT).
+# Ultralytics makes height/width dynamic as well: offline_batch.py feeds RECT_IMG_SIZE.
+# Written next to the fixed export as <name>_batch.onnx (<name>_<h>x<w>_batch.onnx with RECT_IMG_SIZE).
+DYNAMIC_BATCH = False
 
 def export_model():
     if not os.path.exists(MODEL_PATH):
@@ -17,18 +27,31 @@ def export_model():
     print("Starting ONNX export...")
     # Key arguments for Embedded/NPU deployment:
     # format='onnx'    : The target format
-    # imgsz=IMG_SIZE   : Fixes the input size (Dynamic shapes are bad for AI HATs)
+    # imgsz            : Fixes the input size (Dynamic shapes are bad for AI HATs),
+    #                    [h, w] for a rectangular input (both multiples of the 32 px stride)
     # opset=11         : Version 11 is the most stable for Hailo/RPI AI HAT compilers
     # simplify=True    : Removes redundant operations to speed up inference
     path = model.export(
         format='onnx',
-        imgsz=IMG_SIZE,
+        imgsz=list(RECT_IMG_SIZE) if RECT_IMG_SIZE else IMG_SIZE,
         opset=11,
-        simplify=True
+        simplify=True,
+        dynamic=DYNAMIC_BATCH
     )
-    
+    if RECT_IMG_SIZE:
+        # Keep the square export the pipeline uses
+        root, ext = os.path.splitext(path)
+        h, w = RECT_IMG_SIZE
+        os.replace(path, f"{root}_{h}x{w}{ext}")
+        path = f"{root}_{h}x{w}{ext}"
+    if DYNAMIC_BATCH:
+        # Keep the fixed-shape export the pipeline uses
+        root, ext = os.path.splitext(path)
+        os.replace(path, root + "_batch" + ext)
+        path = root + "_batch" + ext
+
     print(f"\n✅ Export success! Model saved to: {path}")
     print("You can now move this .onnx file to your Raspberry Pi.")
 
 if __name__ == "__main__":
-    export_model()
\ No newline at end of file
+    export_model()
\ No newline at end of file
@@ -1,6 +1,12 @@
-def format_filename(side, timestamp, lat, lon):
+import csv
+import os
+
+
+def format_filename(side, timestamp, lat=None, lon=None):
     # On remplace les points par des tirets pour éviter les erreurs de fichier
-    # Exemple: frame_G_143005_48-847_2-358.jpg
+    # Exemple: frame_G_143005_48-847_2-358.jpg (sans coordonnées: frame_G_143005.jpg)
+    if lat is None or lon is None:
+        return f"frame_{side}_{timestamp}.jpg"
     s_lat = str(lat).replace('.', '-')
     s_lon = str(lon).replace('.', '-')
     return f"frame_{side}_{timestamp}_{s_lat}_{s_lon}.jpg"
@@ -32,10 +38,12 @@ def nmea_to_decimal(value, direction):
 
 
 
-def save_metadata(image_path, lat, lon, timestamp, sats_used):
+def save_metadata(image_path, lat, lon, timestamp, sats_used, position=None):
     """
     Creates a CSV file with the same name as the image to store GPS info.
     Example: frame_L_123.jpg -> frame_L_123.csv
+    `position` (time_sync.as_dict() of the frame) adds the heading, speed and
+    how the location was aligned to the capture time.
     """
     # Replace .jpg with .csv
     csv_path = image_path.rsplit('.', 1)[0] + '.csv'
@@ -51,6 +59,11 @@ def save_metadata(image_path, lat, lon, timestamp, sats_used):
             writer.writerow(["Longitude", lon])
             writer.writerow(["Satellites_Used", sats_used])
             writer.writerow(["Google_Maps_Link", f"https://www.google.com/maps?q={lat},{lon}"])
+            if position is not None:
+                writer.writerow(["Heading_Deg", round(position["heading"], 1)])
+                writer.writerow(["Speed_Mps", round(position["speed"], 2)])
+                writer.writerow(["Fix_Age_S", round(position["age"], 3)])
+                writer.writerow(["Alignment", position["mode"]])
         print(f" Metadata saved: {os.path.basename(csv_path)}")
     except Exception as e:
         print(f"Error saving metadata CSV: {e}")